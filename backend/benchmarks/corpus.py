@@ -0,0 +1,91 @@
+"""
+Synthetic rule corpora and record sets for benchmarks.
+
+Rules are generated as rule strings, nesting `width` sub-rules joined by AND
+or OR up to `depth` levels, over a pool of numeric and string fields. All
+generation is seeded, so a corpus is identical from one run to the next.
+"""
+
+import random
+from typing import Dict, List, NamedTuple
+
+STRING_VALUES = ('Sales', 'Marketing', 'Engineering', 'Support', 'Finance')
+
+
+class CorpusSpec(NamedTuple):
+    """Shape of a synthetic corpus."""
+    name: str
+    depth: int
+    width: int
+    num_fields: int
+    num_rules: int = 50
+    num_records: int = 1000
+
+
+# The corpora measured by the benchmark suite.
+CORPORA = (
+    CorpusSpec('small', depth=1, width=2, num_fields=4),
+    CorpusSpec('wide', depth=1, width=32, num_fields=32),
+    CorpusSpec('nested', depth=3, width=3, num_fields=16),
+    CorpusSpec('deep', depth=8, width=2, num_fields=64, num_rules=10),
+)
+
+
+def field_name(index: int) -> str:
+    """Name of a field, even fields are numeric and odd ones strings."""
+    return f"f{index}"
+
+
+def generate_condition(rng: random.Random, num_fields: int) -> str:
+    """Generate a random condition over one of the fields."""
+    index = rng.randrange(num_fields)
+    if index % 2:
+        return f"{field_name(index)} = '{rng.choice(STRING_VALUES)}'"
+    return f"{field_name(index)} {rng.choice('<>')} {rng.randrange(100)}"
+
+
+def generate_rule(rng: random.Random, depth: int, width: int, num_fields: int) -> str:
+    """
+    Generate a random rule string.
+
+    Args:
+        rng (random.Random): The random generator.
+        depth (int): The number of nesting levels.
+        width (int): The number of sub-rules joined at each level.
+        num_fields (int): The number of distinct fields.
+
+    Returns:
+        str: The rule string, with width ** depth conditions.
+    """
+    if depth == 0:
+        return generate_condition(rng, num_fields)
+    operator = rng.choice((' AND ', ' OR '))
+    parts = [generate_rule(rng, depth - 1, width, num_fields) for _ in range(width)]
+    return '(' + operator.join(parts) + ')'
+
+
+def generate_record(rng: random.Random, num_fields: int) -> Dict:
+    """Generate a random record holding every field."""
+    return {
+        field_name(index): rng.choice(STRING_VALUES) if index % 2 else rng.randrange(100)
+        for index in range(num_fields)
+    }
+
+
+def generate_corpus(spec: CorpusSpec, seed: int = 0) -> Dict[str, List]:
+    """
+    Generate the rules and records of a corpus.
+
+    Args:
+        spec (CorpusSpec): The shape of the corpus.
+        seed (int): The random seed.
+
+    Returns:
+        Dict[str, List]: The rule strings under 'rules' and the records
+            under 'records'.
+    """
+    rng = random.Random(f"{spec.name}:{seed}")
+    return {
+        'rules': [generate_rule(rng, spec.depth, spec.width, spec.num_fields) for _ in range(spec.num_rules)],
+        'records': [generate_record(rng, spec.num_fields) for _ in range(spec.num_records)],
+    }
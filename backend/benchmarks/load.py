@@ -0,0 +1,190 @@
+"""
+Load test of the API under increasing concurrency.
+
+Requests are sent through httpx's ASGI transport, straight to the app in
+this process, by a number of concurrent clients sharing a fixed number of
+requests per concurrency level. Each level reports the throughput, the
+p50 and p99 latency of the requests served and the number of requests
+rejected with 429 by admission control, so the effect of
+ADMISSION_MAX_IN_FLIGHT and ADMISSION_QUEUE_TIMEOUT on latency can be seen
+as concurrency grows. The clients share the event loop, and the CPU, with
+the app, so absolute numbers are lower than against a separate server.
+
+The database is set up when rule_engine.models is first imported, so one
+load test is run per process.
+"""
+
+import asyncio
+import json
+import math
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+from benchmarks.corpus import CORPORA, generate_corpus
+
+DEFAULT_CONCURRENCY = (1, 4, 16, 64)
+DEFAULT_REQUESTS = 2000
+WORKLOADS = ('evaluate_rule', 'match_rules', 'evaluate_batch')
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """
+    Compute a percentile by the nearest-rank method.
+
+    Args:
+        values (Sequence[float]): The values.
+        fraction (float): The percentile, between 0 and 1.
+
+    Returns:
+        float: The smallest value greater than or equal to the given
+            fraction of the values, 0.0 if there are none.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+async def run_level(send: Callable, concurrency: int, total: int) -> Dict:
+    """
+    Send requests from concurrent clients and time them.
+
+    Args:
+        send (Callable): A coroutine function of the request number,
+            returning the response.
+        concurrency (int): The number of concurrent clients.
+        total (int): The number of requests, shared between the clients.
+
+    Returns:
+        Dict: The throughput, latency percentiles of the requests not
+            rejected, and status counts.
+    """
+    numbers = iter(range(total))
+    latencies: List[float] = []
+    rejected = errors = 0
+
+    async def client():
+        nonlocal rejected, errors
+        # The iterator is shared, so every request is sent exactly once.
+        for number in numbers:
+            start = time.perf_counter()
+            response = await send(number)
+            if response.status_code == 429:
+                rejected += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'seconds': seconds,
+        'requests_per_second': total / seconds if seconds else float('inf'),
+        'p50_seconds': percentile(latencies, 0.5),
+        'p99_seconds': percentile(latencies, 0.99),
+        'rejected': rejected,
+        'errors': errors,
+    }
+
+
+async def run_load_test(workload: str = 'evaluate_rule', concurrency_levels: Sequence[int] = DEFAULT_CONCURRENCY,
+                        requests_per_level: int = DEFAULT_REQUESTS, max_in_flight: Optional[int] = None,
+                        queue_timeout: Optional[float] = None) -> List[Dict]:
+    """
+    Load the rules of the first corpus into the app, then run every
+    concurrency level against one endpoint.
+
+    The app must use a fresh database, set up before rule_engine.models is
+    first imported.
+
+    Args:
+        workload (str): The endpoint to load, one of WORKLOADS.
+        concurrency_levels (Sequence[int]): The numbers of concurrent clients.
+        requests_per_level (int): The number of requests per level.
+        max_in_flight (Optional[int]): Overrides ADMISSION_MAX_IN_FLIGHT.
+        queue_timeout (Optional[float]): Overrides ADMISSION_QUEUE_TIMEOUT.
+
+    Returns:
+        List[Dict]: The results of each level, as returned by run_level.
+
+    Raises:
+        ValueError: If the workload is unknown.
+    """
+    if workload not in WORKLOADS:
+        raise ValueError(f"Unknown workload {workload!r}")
+    import httpx
+    from rule_engine.main import admission, app
+    from rule_engine.models import get_async_engine
+
+    if max_in_flight is not None:
+        admission.max_in_flight = max_in_flight
+    if queue_timeout is not None:
+        admission.queue_timeout = queue_timeout
+
+    corpus = generate_corpus(CORPORA[0])
+    rules, records = corpus['rules'], corpus['records']
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load") as client:
+        # The database is fresh, so the rules get IDs 1 to n.
+        for index, rule in enumerate(rules):
+            response = await client.post("/create_rule", json={"rule": rule, "name": f"load-{index}"})
+            response.raise_for_status()
+        batch = records[:100]
+
+        def send(number):
+            data = records[number % len(records)]
+            if workload == 'match_rules':
+                return client.post("/match_rules", json={"data": data})
+            rule_id = 1 + number % len(rules)
+            if workload == 'evaluate_batch':
+                return client.post("/evaluate_batch", json={"rule_id": rule_id, "records": batch})
+            return client.post("/evaluate_rule", json={"rule_id": rule_id, "data": data})
+
+        results = []
+        for concurrency in concurrency_levels:
+            result = await run_level(send, concurrency, requests_per_level)
+            results.append(result)
+            print(
+                f"{workload:15} concurrency {concurrency:>4} {result['requests_per_second']:>10,.0f} req/s"
+                f"  p50 {result['p50_seconds'] * 1e3:8.2f} ms  p99 {result['p99_seconds'] * 1e3:8.2f} ms"
+                f"  429 {result['rejected']:>6}  errors {result['errors']:>4}",
+                flush=True
+            )
+    # Close the pooled connections on this event loop, before it ends.
+    await get_async_engine().dispose()
+    return results
+
+
+def run_load_benchmark(workload: str = 'evaluate_rule', concurrency_levels: Sequence[int] = DEFAULT_CONCURRENCY,
+                       requests_per_level: int = DEFAULT_REQUESTS, max_in_flight: Optional[int] = None,
+                       queue_timeout: Optional[float] = None, output_path: Optional[str] = None) -> int:
+    """
+    Run the load test against a throwaway SQLite database.
+
+    Args:
+        workload (str): The endpoint to load, one of WORKLOADS.
+        concurrency_levels (Sequence[int]): The numbers of concurrent clients.
+        requests_per_level (int): The number of requests per level.
+        max_in_flight (Optional[int]): Overrides ADMISSION_MAX_IN_FLIGHT.
+        queue_timeout (Optional[float]): Overrides ADMISSION_QUEUE_TIMEOUT.
+        output_path (Optional[str]): The JSON file to write the results to.
+
+    Returns:
+        int: 0.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'load.db')}"
+        results = asyncio.run(run_load_test(
+            workload, concurrency_levels, requests_per_level, max_in_flight, queue_timeout
+        ))
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as output:
+            json.dump({'workload': workload, 'results': results}, output, indent=2)
+    return 0
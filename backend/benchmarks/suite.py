@@ -0,0 +1,256 @@
+"""
+Throughput benchmarks for the parser, evaluator, serialization and API.
+
+Every benchmark runs over the synthetic corpora of benchmarks.corpus and
+reports the best time per item over a few repeats. Results are written as
+JSON, keyed by "<corpus>/<benchmark>", and can be compared against the
+results of a previous run to catch regressions.
+"""
+
+import json
+import os
+import platform
+from itertools import cycle
+import sys
+import tempfile
+import time
+import timeit
+from typing import Callable, Dict, List, Optional, Tuple
+from benchmarks.corpus import CORPORA, generate_corpus
+
+# Slowdown, relative to the baseline, reported as a regression.
+REGRESSION_THRESHOLD = 0.2
+
+REPEAT = 3
+
+
+def measure(fn: Callable[[], None], items: int, repeat: int = REPEAT) -> Dict:
+    """
+    Time a function, taking the best of a few repeats.
+
+    Args:
+        fn (Callable[[], None]): The function, processing `items` items.
+        items (int): The number of items processed per call.
+        repeat (int): The number of repeats.
+
+    Returns:
+        Dict: The seconds per item, items per second and item count.
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat=repeat, number=number)) / number / max(items, 1)
+    return {
+        'seconds_per_item': seconds,
+        'items_per_second': 1.0 / seconds if seconds else float('inf'),
+        'items': items,
+    }
+
+
+def core_benchmarks(rules: List[str], records: List[Dict]) -> Dict[str, Tuple[Callable, int]]:
+    """
+    Build the benchmarks of the library for a corpus.
+
+    Args:
+        rules (List[str]): The rule strings.
+        records (List[Dict]): The records.
+
+    Returns:
+        Dict[str, Tuple[Callable, int]]: The function and item count of
+            each benchmark, by name.
+    """
+    from rule_engine.ast_utils import AST
+    from rule_engine.index_utils import IndexedRuleSet
+    from rule_engine.main import json_to_ast
+    from rule_engine.parser_utils import Parser, parse_rule, tokenize
+    from rule_engine.serialization_utils import bytes_to_root, root_to_bytes, root_to_json
+    from rule_engine.session_utils import EvaluationSession
+    from rule_engine.snapshot_utils import MappedAST, RuleSnapshot, write_snapshot
+
+    parse_uncached = parse_rule.__wrapped__
+    roots = [parse_rule(rule) for rule in rules]
+    interpreted = [AST(root) for root in roots]
+    compiled = [AST(root) for root in roots]
+    for ast in compiled:
+        ast.compile()
+    json_strings = [root_to_json(root) for root in roots]
+    encoded = [root_to_bytes(root) for root in roots]
+    rule_set = IndexedRuleSet.from_rules(enumerate(interpreted))
+    evaluations = len(rules) * len(records)
+
+    # Every record is an entity, whose first (numeric) field alternates
+    # between two values from one round of updates to the next.
+    session = EvaluationSession(enumerate(interpreted))
+    for entity_id, data in enumerate(records):
+        session.update(entity_id, data)
+    rounds = cycle([[{'f0': data['f0'] + offset} for data in records] for offset in (50, 0)])
+
+    # Cold start: map a snapshot and look up every rule, against decoding
+    # the stored binary representation of every rule.
+    snapshot_directory = tempfile.TemporaryDirectory()
+    snapshot_path = os.path.join(snapshot_directory.name, 'rules.snapshot')
+    write_snapshot(snapshot_path, ((rule_id, 1, root) for rule_id, root in enumerate(roots)))
+
+    def load_snapshot():
+        # The closure keeps the directory alive as long as the benchmark.
+        snapshot = RuleSnapshot.open(os.path.join(snapshot_directory.name, 'rules.snapshot'))
+        for rule_id in range(len(rules)):
+            MappedAST(snapshot.get(rule_id)[0])
+
+    def update_session():
+        for entity_id, changes in enumerate(next(rounds)):
+            session.update(entity_id, changes)
+
+    def evaluate_interpreted():
+        for ast in interpreted:
+            for data in records:
+                ast.evaluate_rule(data)
+
+    def evaluate_compiled():
+        for ast in compiled:
+            ast.evaluate_many(records)
+
+    return {
+        'parser.tokenize_parse': (lambda: [Parser(tokenize(rule)).parse() for rule in rules], len(rules)),
+        'parser.parse_rule': (lambda: [parse_uncached(rule) for rule in rules], len(rules)),
+        'ast.evaluate_rule': (evaluate_interpreted, evaluations),
+        'ast.evaluate_compiled': (evaluate_compiled, evaluations),
+        'ast.combine_rules': (lambda: AST().combine_rules(rules), len(rules)),
+        'serialization.root_to_json': (lambda: [root_to_json(root) for root in roots], len(rules)),
+        'serialization.json_to_ast': (lambda: [json_to_ast(text) for text in json_strings], len(rules)),
+        'serialization.root_to_bytes': (lambda: [root_to_bytes(root) for root in roots], len(rules)),
+        'serialization.bytes_to_root': (lambda: [bytes_to_root(data) for data in encoded], len(rules)),
+        'snapshot.load': (load_snapshot, len(rules)),
+        'ruleset.match': (lambda: [rule_set.match(data) for data in records], len(records)),
+        'session.update': (update_session, len(records)),
+    }
+
+
+def api_benchmarks(rules: List[str], records: List[Dict]) -> Dict[str, Tuple[Callable, int]]:
+    """
+    Build the benchmarks of the API endpoints, through the test client.
+
+    Args:
+        rules (List[str]): The rule strings.
+        records (List[Dict]): The records.
+
+    Returns:
+        Dict[str, Tuple[Callable, int]]: The function and item count of
+            each benchmark, by name.
+    """
+    from fastapi.testclient import TestClient
+    from rule_engine.main import app
+
+    # The database is fresh, so the rules get IDs 1 to n.
+    client = TestClient(app)
+    for index, rule in enumerate(rules):
+        client.post("/create_rule", json={"rule": rule, "name": f"bench-{index}"}).raise_for_status()
+    rule_ids = [1 + index for index in range(len(rules))]
+    sample = records[:100]
+
+    def post(path, payload):
+        client.post(path, json=payload).raise_for_status()
+
+    return {
+        'api.create_rule': (lambda: post("/create_rule", {"rule": rules[0], "name": "bench"}), 1),
+        'api.evaluate_rule': (lambda: [
+            post("/evaluate_rule", {"rule_id": rule_id, "data": sample[0]}) for rule_id in rule_ids[:10]
+        ], 10),
+        'api.evaluate_batch': (lambda: post(
+            "/evaluate_batch", {"rule_id": rule_ids[0], "records": sample}
+        ), len(sample)),
+        'api.match_rules': (lambda: [post("/match_rules", {"data": data}) for data in sample[:10]], 10),
+        'api.combine_rules': (lambda: post("/combine_rules", {"rules": rules[:10]}), 1),
+    }
+
+
+def run_suite(name_filter: Optional[str] = None) -> Dict[str, Dict]:
+    """
+    Run every benchmark over every corpus, and the API benchmarks over the
+    first one.
+
+    The API runs against a throwaway SQLite database, which must be set up
+    before rule_engine.models is first imported.
+
+    Args:
+        name_filter (Optional[str]): Only run the benchmarks whose full
+            name contains this string.
+
+    Returns:
+        Dict[str, Dict]: The measurements, by "<corpus>/<benchmark>".
+    """
+    results = {}
+    for index, spec in enumerate(CORPORA):
+        corpus = generate_corpus(spec)
+        benchmarks = core_benchmarks(corpus['rules'], corpus['records'])
+        if index == 0:
+            benchmarks.update(api_benchmarks(corpus['rules'], corpus['records']))
+        for name, (fn, items) in benchmarks.items():
+            full_name = f"{spec.name}/{name}"
+            if name_filter and name_filter not in full_name:
+                continue
+            results[full_name] = measure(fn, items)
+            print(f"{full_name:45} {results[full_name]['items_per_second']:>14,.0f} items/s", flush=True)
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict],
+            threshold: float = REGRESSION_THRESHOLD) -> List[Tuple[str, float]]:
+    """
+    Find the benchmarks slower than in a baseline.
+
+    Args:
+        results (Dict[str, Dict]): The current measurements.
+        baseline (Dict[str, Dict]): The baseline measurements.
+        threshold (float): The relative slowdown reported as a regression.
+
+    Returns:
+        List[Tuple[str, float]]: The name and slowdown ratio of each regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        ratio = result['seconds_per_item'] / reference['seconds_per_item']
+        if ratio > 1.0 + threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def run_benchmarks(output_path: Optional[str] = None, baseline_path: Optional[str] = None,
+                   name_filter: Optional[str] = None) -> int:
+    """
+    Run the suite, save the results and compare them against a baseline.
+
+    Args:
+        output_path (Optional[str]): The JSON file to write the results to.
+        baseline_path (Optional[str]): The JSON file of a previous run.
+        name_filter (Optional[str]): Only run the matching benchmarks.
+
+    Returns:
+        int: 1 if a benchmark regressed against the baseline, else 0.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        results = run_suite(name_filter)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'results': results,
+    }
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+
+    if not baseline_path:
+        return 0
+    with open(baseline_path, encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)['results']
+    regressions = compare(results, baseline)
+    for name, ratio in regressions:
+        print(f"REGRESSION {name}: {ratio:.2f}x slower than baseline", file=sys.stderr)
+    return 1 if regressions else 0
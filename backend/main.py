@@ -3,22 +3,61 @@ Main script file to run backend and database.
 """
 
 import argparse
+import sys
 import unittest
 import uvicorn
+import tests.test_admission
+import tests.test_api
+import tests.test_bench
+import tests.test_bulk
+import tests.test_cache
+import tests.test_columnar
+import tests.test_compact
+import tests.test_database
+import tests.test_index
+import tests.test_metrics
+import tests.test_optimizer
+import tests.test_parallel
 import tests.test_parser
+import tests.test_ruleset
+import tests.test_schema
+import tests.test_serialization
+import tests.test_session
+import tests.test_snapshot
+import tests.test_stream
 import tests.test_tree_traversal
 
+TEST_MODULES = (
+    tests.test_parser,
+    tests.test_tree_traversal,
+    tests.test_cache,
+    tests.test_columnar,
+    tests.test_ruleset,
+    tests.test_index,
+    tests.test_optimizer,
+    tests.test_serialization,
+    tests.test_database,
+    tests.test_bulk,
+    tests.test_parallel,
+    tests.test_stream,
+    tests.test_bench,
+    tests.test_metrics,
+    tests.test_schema,
+    tests.test_compact,
+    tests.test_session,
+    tests.test_snapshot,
+    tests.test_admission,
+    tests.test_api,
+)
+
 def _run_tests():
     """Run tests."""
     print("--test: running tests")
 
     loader = unittest.TestLoader()
-    suite_parser = loader.loadTestsFromModule(tests.test_parser)
-    suite_tree = loader.loadTestsFromModule(tests.test_tree_traversal)
-
     runner = unittest.TextTestRunner()
-    runner.run(suite_parser)
-    runner.run(suite_tree)
+    for module in TEST_MODULES:
+        runner.run(loader.loadTestsFromModule(module))
 
 def _run_dev_api_server(host = None, port = None):
     """Run a dev instance of the FastAPI server."""
@@ -30,6 +69,77 @@ def _run_dev_api_server(host = None, port = None):
 
     uvicorn.run('rule_engine.main:app', host=host, port=port, reload=True)
 
+def _run_evaluate(rule_ids, input_path = None, output_path = None, fmt = None,
+                  mode = None, workers = None):
+    """Evaluate stored rules against an NDJSON or CSV stream."""
+    from rule_engine import database, models
+    from fastapi import HTTPException
+    from rule_engine.main import schema, typed_ast
+    from rule_engine.stream_utils import (RecordWriter, coerce_csv_record, detect_format,
+                                          evaluate_stream, read_records)
+
+    input_path = input_path or "-"
+    output_path = output_path or "-"
+    fmt = fmt or detect_format(input_path)
+
+    db = models.SessionLocal()
+    try:
+        rules = []
+        for rule_id in rule_ids:
+            db_rule = database.get_rule(db, rule_id)
+            if db_rule is None:
+                sys.exit(f"--evaluate: rule {rule_id} not found")
+            try:
+                rules.append((rule_id, typed_ast(db_rule)))
+            except HTTPException as e:
+                sys.exit(f"--evaluate: {e.detail}")
+    finally:
+        db.close()
+
+    source = sys.stdin if input_path == "-" else open(input_path, newline="", encoding="utf-8")
+    sink = sys.stdout if output_path == "-" else open(output_path, "w", newline="", encoding="utf-8")
+    try:
+        writer = RecordWriter(sink, fmt, mode or "filter", rule_ids)
+        if schema is not None:
+            coerce = schema.coerce_record
+        else:
+            coerce = coerce_csv_record if fmt == "csv" else None
+        for record, matched in evaluate_stream(read_records(source, fmt), rules, coerce,
+                                               workers=workers or 1):
+            writer.write(record, matched)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+def _run_bench(output_path = None, baseline_path = None, name_filter = None):
+    """Run the benchmark suite, exiting with 1 on a regression."""
+    print("--bench: running benchmarks")
+    from benchmarks.suite import run_benchmarks
+
+    sys.exit(run_benchmarks(output_path, baseline_path, name_filter))
+
+def _run_load(workload = None, concurrency = None, requests = None, max_in_flight = None,
+              queue_timeout = None, output_path = None):
+    """Run the API load test at increasing concurrency."""
+    print("--load: running load test")
+    from benchmarks.load import DEFAULT_CONCURRENCY, DEFAULT_REQUESTS, run_load_benchmark
+
+    sys.exit(run_load_benchmark(workload or "evaluate_rule", concurrency or DEFAULT_CONCURRENCY,
+                                requests or DEFAULT_REQUESTS, max_in_flight, queue_timeout, output_path))
+
+def _run_snapshot(path):
+    """Write every stored rule to a snapshot file, for workers to map at startup."""
+    from fastapi import HTTPException
+    from rule_engine.main import write_rule_snapshot
+
+    try:
+        version = write_rule_snapshot(path)
+    except HTTPException as e:
+        sys.exit(f"--snapshot: {e.detail}")
+    print(f"--snapshot: wrote version {version} to {path}")
+
 def _run_db_migrate():
     """Instantiate Postgres DB with schema, and empty tables."""
     print("--migrate: running DB Migrate")
@@ -41,13 +151,48 @@ def _run_start_db():
 def _show_help():
     """Show help information."""
     help_string = (
-        "usage: main.py [-h] [--tests] [--dev] [--host HOST] [--port PORT]\n\n"
+        "usage: main.py [-h] [--tests] [--dev] [--host HOST] [--port PORT]\n"
+        "               [--evaluate ID [ID ...]] [--input PATH] [--output PATH]\n"
+        "               [--format FORMAT] [--mode MODE] [--workers N]\n"
+        "               [--bench] [--bench-output PATH] [--bench-baseline PATH]\n"
+        "               [--bench-filter TEXT]\n"
+        "               [--load] [--load-workload NAME] [--load-concurrency N [N ...]]\n"
+        "               [--load-requests N] [--load-max-in-flight N]\n"
+        "               [--load-queue-timeout SECONDS] [--load-output PATH]\n"
+        "               [--snapshot PATH]\n\n"
         "options:\n"
         "-h, --help         show this help message and exit\n"
         "--tests            Run tests for Parser and AST\n"
         "--dev              Run dev FastAPI Server\n"
         "--host HOST        Add host address to run the FastAPI Server\n"
         "--port PORT        Add port address to run the FastAPI Server\n"
+        "--evaluate ID [ID ...]\n"
+        "                   Evaluate stored rules against an NDJSON or CSV stream\n"
+        "--input PATH       Input file for --evaluate, - for stdin (default)\n"
+        "--output PATH      Output file for --evaluate, - for stdout (default)\n"
+        "--format FORMAT    ndjson or csv, by default from the input extension\n"
+        "--mode MODE        filter: write matching records (default),\n"
+        "                   column: add a rule_<id> column to every record\n"
+        "--workers N        Number of worker processes for --evaluate\n"
+        "--bench            Run the benchmark suite\n"
+        "--bench-output PATH\n"
+        "                   Write the benchmark results to a JSON file\n"
+        "--bench-baseline PATH\n"
+        "                   Compare against the results of a previous run\n"
+        "--bench-filter TEXT\n"
+        "                   Only run the benchmarks whose name contains TEXT\n"
+        "--load             Run the API load test at increasing concurrency\n"
+        "--load-workload NAME\n"
+        "                   evaluate_rule (default), match_rules or evaluate_batch\n"
+        "--load-concurrency N [N ...]\n"
+        "                   Concurrent clients per level (default: 1 4 16 64)\n"
+        "--load-requests N  Requests per level (default: 2000)\n"
+        "--load-max-in-flight N\n"
+        "                   Admission limit, overriding ADMISSION_MAX_IN_FLIGHT\n"
+        "--load-queue-timeout SECONDS\n"
+        "                   Admission queue timeout, overriding ADMISSION_QUEUE_TIMEOUT\n"
+        "--load-output PATH Write the load test results to a JSON file\n"
+        "--snapshot PATH    Write every stored rule to a snapshot file, see RULE_SNAPSHOT\n"
     )
 
     print(help_string)
@@ -63,12 +208,47 @@ def main():
     parser.add_argument('--host', dest='host', type=str, help='Add host address to run the FastAPI Server')
     parser.add_argument('--port', dest='port', type=int, help='Add port address to run the FastAPI Server')
 
+    parser.add_argument('--evaluate', dest='rule_ids', type=int, nargs='+', metavar='ID',
+                        help='Evaluate stored rules against an NDJSON or CSV stream')
+    parser.add_argument('--input', dest='input_path', type=str, help='Input file for --evaluate, - for stdin')
+    parser.add_argument('--output', dest='output_path', type=str, help='Output file for --evaluate, - for stdout')
+    parser.add_argument('--format', dest='format', choices=('ndjson', 'csv'), help='Format of the input and output')
+    parser.add_argument('--mode', dest='mode', choices=('filter', 'column'), help='Write matching records, or a result column')
+    parser.add_argument('--workers', dest='workers', type=int, help='Number of worker processes for --evaluate')
+    parser.add_argument('--bench', action='store_true', help='Run the benchmark suite')
+    parser.add_argument('--bench-output', dest='bench_output', type=str, help='Write the benchmark results to a JSON file')
+    parser.add_argument('--bench-baseline', dest='bench_baseline', type=str, help='Compare against the results of a previous run')
+    parser.add_argument('--bench-filter', dest='bench_filter', type=str, help='Only run the benchmarks whose name contains TEXT')
+    parser.add_argument('--load', action='store_true', help='Run the API load test at increasing concurrency')
+    parser.add_argument('--load-workload', dest='load_workload', choices=('evaluate_rule', 'match_rules', 'evaluate_batch'),
+                        help='Endpoint to load')
+    parser.add_argument('--load-concurrency', dest='load_concurrency', type=int, nargs='+', metavar='N',
+                        help='Concurrent clients per level')
+    parser.add_argument('--load-requests', dest='load_requests', type=int, help='Requests per level')
+    parser.add_argument('--load-max-in-flight', dest='load_max_in_flight', type=int,
+                        help='Admission limit, overriding ADMISSION_MAX_IN_FLIGHT')
+    parser.add_argument('--load-queue-timeout', dest='load_queue_timeout', type=float,
+                        help='Admission queue timeout, overriding ADMISSION_QUEUE_TIMEOUT')
+    parser.add_argument('--load-output', dest='load_output', type=str, help='Write the load test results to a JSON file')
+    parser.add_argument('--snapshot', dest='snapshot_path', type=str, metavar='PATH',
+                        help='Write every stored rule to a snapshot file')
+
     args = parser.parse_args()
 
     if args.tests:
         _run_tests()
     elif args.dev:
         _run_dev_api_server(args.host, args.port)
+    elif args.bench:
+        _run_bench(args.bench_output, args.bench_baseline, args.bench_filter)
+    elif args.load:
+        _run_load(args.load_workload, args.load_concurrency, args.load_requests,
+                  args.load_max_in_flight, args.load_queue_timeout, args.load_output)
+    elif args.snapshot_path:
+        _run_snapshot(args.snapshot_path)
+    elif args.rule_ids:
+        _run_evaluate(args.rule_ids, args.input_path, args.output_path, args.format,
+                      args.mode, args.workers)
     else:
         _show_help()
 
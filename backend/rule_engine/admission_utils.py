@@ -0,0 +1,150 @@
+"""
+Admission control for the API.
+
+An AdmissionController caps the number of requests in flight. A request
+arriving when every slot is taken waits in a FIFO queue for at most the
+queue timeout, and is rejected with 429 Too Many Requests if no slot frees
+up in time, so that overload shows up as fast rejections rather than
+ever-growing latency. AdmissionMiddleware applies it to every HTTP request
+but a few exempt paths, such as /metrics.
+
+The controller is meant to be used from a single event loop: its state is
+only changed from coroutines running on it.
+"""
+
+import asyncio
+import os
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional
+from starlette.responses import JSONResponse
+
+
+class AdmissionController:
+    """
+    Limits the number of requests in flight.
+
+    Attributes:
+        max_in_flight (int): The maximum number of requests in flight, 0 for
+            no limit.
+        queue_timeout (float): How long, in seconds, a request may wait for
+            a slot before being rejected, 0 to reject it right away.
+        in_flight (int): The number of requests in flight.
+        queued (int): The number of requests waiting for a slot.
+        admitted (int): The number of requests admitted so far.
+        rejected (int): The number of requests rejected so far.
+    """
+    def __init__(self, max_in_flight: int = 0, queue_timeout: float = 0.0):
+        if max_in_flight < 0 or queue_timeout < 0:
+            raise ValueError("max_in_flight and queue_timeout must not be negative")
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @classmethod
+    def from_env(cls) -> 'AdmissionController':
+        """
+        Create a controller configured by the ADMISSION_MAX_IN_FLIGHT and
+        ADMISSION_QUEUE_TIMEOUT environment variables.
+
+        Returns:
+            AdmissionController: The controller, without limit if
+                ADMISSION_MAX_IN_FLIGHT is not set.
+        """
+        return cls(
+            max_in_flight=int(os.getenv('ADMISSION_MAX_IN_FLIGHT') or 0),
+            queue_timeout=float(os.getenv('ADMISSION_QUEUE_TIMEOUT') or 0),
+        )
+
+    async def acquire(self) -> bool:
+        """
+        Take a slot, waiting for one for at most the queue timeout.
+
+        Returns:
+            bool: True if a slot was taken, which must then be released,
+                False if the request should be rejected.
+        """
+        # Slots freed while requests wait are handed over to them, so a free
+        # slot means nobody is waiting.
+        if not self.max_in_flight or self.in_flight < self.max_in_flight:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if not self.queue_timeout:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # A slot handed over just as the timeout expired is kept.
+            if not waiter.done() or waiter.cancelled():
+                self.rejected += 1
+                return False
+        except asyncio.CancelledError:
+            # The request went away, pass on a slot it was handed.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            self.queued -= 1
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        """Free a slot, handing it over to the longest waiting request if any."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot passes to the waiter, in_flight is unchanged.
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Report the counters of the controller.
+
+        Returns:
+            Dict[str, int]: The limit and the in-flight, queued, admitted
+                and rejected request counts.
+        """
+        return {
+            'max_in_flight': self.max_in_flight,
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware rejecting HTTP requests with 429 when the controller
+    has no slot for them.
+
+    The slot is held until the response, streamed or not, is complete.
+    """
+    def __init__(self, app, controller: AdmissionController, exempt_paths: Optional[Iterable[str]] = None):
+        self.app = app
+        self.controller = controller
+        self.exempt_paths = frozenset(exempt_paths or ())
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.controller.max_in_flight or scope['path'] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+        if not await self.controller.acquire():
+            response = JSONResponse({"detail": "Too many requests"}, status_code=429, headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
@@ -6,13 +6,41 @@ an Abstract Syntax Tree (AST) for rules, as well as to combine
 multiple rules into a single AST.
 """
 
-from typing import List, TypeVar
+from functools import partial
+from typing import Callable, Dict, FrozenSet, Iterable, List, TypeVar
 from abc import ABC, abstractmethod
 
 
 T = TypeVar('T')
 
+# Deepest tree compiled into nested closures, which recurse when called.
+# Deeper trees are evaluated iteratively by evaluate_tree.
+MAX_COMPILED_DEPTH = 256
+
+# Comparison symbols of rule strings, by the comparison type they denote.
+COMPARISON_SYMBOLS = {
+    '>': 'gt', '<': 'lt', '=': 'eq', '==': 'eq',
+    '>=': 'ge', '=>': 'ge', '<=': 'le', '!=': 'ne',
+}
+
+
+def normalize_comparison(comparison_type: str) -> str:
+    """
+    Map a comparison symbol, e.g. '>=', to its comparison type, e.g. 'ge'.
+
+    Args:
+        comparison_type (str): The symbol or comparison type.
+
+    Returns:
+        str: The comparison type, unknown values being returned unchanged.
+    """
+    return COMPARISON_SYMBOLS.get(comparison_type, comparison_type)
+
+
 class Node:
+    # No per-instance __dict__, as many trees are kept resident.
+    __slots__ = ('node_type', 'left', 'right', 'value')
+
     def __init__(self, node_type, left=None, right=None, value=None):
         self.node_type = node_type
         self.left = left
@@ -23,10 +51,12 @@ class Node:
         if self.node_type == 'operand':
             return self.value.evaluate(data[self.value.lvariable])
         elif self.node_type == 'operator':
-            return self.value.evaluate(self.left, self.right, data)
+            return evaluate_tree(self, data)
 
 
 class Condition:
+    __slots__ = ('lvariable', 'rvalue', 'comparison_type')
+
     def __init__(self, lvariable, rvalue, comparison_type):
         self.lvariable = lvariable
         self.rvalue = rvalue
@@ -39,13 +69,40 @@ class Condition:
             return input_value < self.rvalue
         elif self.comparison_type == 'eq':
             return input_value == self.rvalue
+        elif self.comparison_type == 'ge':
+            return input_value >= self.rvalue
+        elif self.comparison_type == 'le':
+            return input_value <= self.rvalue
+        elif self.comparison_type == 'ne':
+            return input_value != self.rvalue
+        elif self.comparison_type in ('in', 'not_in'):
+            # rvalue is a frozenset, unhashable values are in no set.
+            try:
+                found = input_value in self.rvalue
+            except TypeError:
+                found = False
+            return found if self.comparison_type == 'in' else not found
+        elif self.comparison_type == 'between':
+            low, high = self.rvalue
+            return low <= input_value <= high
         # Add more comparison types as needed
         return False
 
 class Operator(ABC):
     """
     Abstract base class for operators.
+
+    Operators are stateless, so each operator class has a single shared
+    instance, returned by every call to the class.
     """
+    __slots__ = ()
+    _instances: Dict[type, 'Operator'] = {}
+
+    def __new__(cls):
+        instance = Operator._instances.get(cls)
+        if instance is None:
+            instance = Operator._instances[cls] = super().__new__(cls)
+        return instance
 
     @abstractmethod
     def evaluate(self, left: Node, right: Node) -> bool:
@@ -62,26 +119,338 @@ class Operator(ABC):
         pass
 
 class ANDOperator(Operator):
+    __slots__ = ()
+
     def evaluate(self, left, right, data):
         return left.evaluate(data) and right.evaluate(data)
 
 
 class OROperator(Operator):
+    __slots__ = ()
+
     def evaluate(self, left, right, data):
         return left.evaluate(data) or right.evaluate(data)
 
 
+class NOTOperator(Operator):
+    """Negates its left operand, a NOT node has no right operand."""
+    __slots__ = ()
+
+    def evaluate(self, left, right, data):
+        return not left.evaluate(data)
+
+
+def evaluate_tree(root: Node, data: Dict):
+    """
+    Evaluate a tree without recursion, so that trees of any depth are supported.
+
+    AND, OR and NOT nodes are walked with an explicit stack of the operators
+    waiting for their left operand, short-circuiting as Python's and/or do.
+    Nodes of other operators are evaluated by their own evaluate method.
+
+    Args:
+        root (Node): The root node of the tree, or None for an empty tree.
+        data (Dict): The record.
+
+    Returns:
+        The result of the evaluation, as the recursive evaluation would.
+
+    Raises:
+        KeyError: If a condition evaluated references a missing field.
+    """
+    if root is None:
+        return True
+    and_operator, or_operator, not_operator = _NATIVE_OPERATORS
+    stack = []
+    node = root
+    while True:
+        value = node.value
+        if value is and_operator or value is or_operator or value is not_operator:
+            stack.append(node)
+            node = node.left
+            continue
+        if node.node_type == 'operand':
+            result = value.evaluate(data[value.lvariable])
+        else:
+            result = value.evaluate(node.left, node.right, data)
+
+        # The result of a right operand is that of its parent, so only
+        # operators waiting for their left operand are on the stack.
+        while stack:
+            parent = stack.pop()
+            value = parent.value
+            if value is not_operator:
+                result = not result
+            elif result:
+                if value is and_operator:
+                    node = parent.right
+                    break
+            elif value is or_operator:
+                node = parent.right
+                break
+        else:
+            return result
+
+
+def tree_depth(root: Node) -> int:
+    """
+    Compute the depth of a tree without recursion.
+
+    Args:
+        root (Node): The root node of the tree.
+
+    Returns:
+        int: The number of nodes on the longest root to leaf path, 0 for an
+            empty tree.
+    """
+    depth = 0
+    stack = [(root, 1)] if root is not None else []
+    while stack:
+        node, level = stack.pop()
+        depth = max(depth, level)
+        if node.node_type == 'operator':
+            stack.extend((child, level + 1) for child in (node.left, node.right) if child is not None)
+    return depth
+
+
+def compile_node(node: Node) -> Callable[[Dict], bool]:
+    """
+    Compile a node, and its subtree, into a nested Python closure.
+
+    The node type, operator and comparison type are resolved once at compile
+    time, so the returned callable only does the field lookup and comparison
+    for every record. Semantics match Node.evaluate, including short-circuiting
+    and the KeyError raised for a missing field. Trees deeper than
+    MAX_COMPILED_DEPTH are not compiled but evaluated by evaluate_tree.
+
+    Args:
+        node (Node): The root node of the (sub)tree to compile.
+
+    Returns:
+        Callable[[Dict], bool]: A function evaluating the tree for a record.
+    """
+    if node is not None and tree_depth(node) > MAX_COMPILED_DEPTH:
+        return partial(evaluate_tree, node)
+    return _compile_node(node)
+
+
+def _compile_node(node: Node) -> Callable[[Dict], bool]:
+    """Compile a tree no deeper than MAX_COMPILED_DEPTH, see compile_node."""
+    if node is None:
+        return lambda data: True
+
+    if node.node_type == 'operand':
+        return compile_condition(node.value)
+
+    if isinstance(node.value, NOTOperator):
+        operand = _compile_node(node.left)
+        return lambda data: not operand(data)
+
+    left = _compile_node(node.left)
+    right = _compile_node(node.right)
+    if isinstance(node.value, ANDOperator):
+        return lambda data: left(data) and right(data)
+    if isinstance(node.value, OROperator):
+        return lambda data: left(data) or right(data)
+
+    # Unknown operator, defer to its own evaluate method.
+    return node.evaluate
+
+
+# Operators walked by evaluate_tree rather than called, which are singletons.
+_NATIVE_OPERATORS = (ANDOperator(), OROperator(), NOTOperator())
+
+
+def compile_condition(condition: Condition) -> Callable[[Dict], bool]:
+    """
+    Compile a condition into a closure with its field and literal bound.
+
+    Args:
+        condition (Condition): The condition to compile.
+
+    Returns:
+        Callable[[Dict], bool]: A function evaluating the condition for a record.
+    """
+    key = condition.lvariable
+    rvalue = condition.rvalue
+    comparison_type = condition.comparison_type
+
+    if comparison_type == 'gt':
+        return lambda data: data[key] > rvalue
+    if comparison_type == 'lt':
+        return lambda data: data[key] < rvalue
+    if comparison_type == 'eq':
+        return lambda data: data[key] == rvalue
+    if comparison_type == 'ge':
+        return lambda data: data[key] >= rvalue
+    if comparison_type == 'le':
+        return lambda data: data[key] <= rvalue
+    if comparison_type == 'ne':
+        return lambda data: data[key] != rvalue
+    if comparison_type == 'between':
+        low, high = rvalue
+        return lambda data: low <= data[key] <= high
+    if comparison_type in ('in', 'not_in'):
+        # A single hash lookup in the frozenset, whatever its size.
+        expected = comparison_type == 'in'
+
+        def evaluate(data):
+            value = data[key]
+            try:
+                return (value in rvalue) is expected
+            except TypeError:
+                return not expected
+        return evaluate
+
+    # Unsupported comparison types evaluate to False, like Condition.evaluate.
+    def evaluate(data):
+        data[key]
+        return False
+    return evaluate
+
+
+def flatten(node: Node, operator_class: type) -> List[Node]:
+    """
+    Collect the operands of a chain of the same operator, left to right.
+
+    Nested nodes of the given operator are flattened into their children
+    without recursion, so arbitrarily deep chains are supported.
+
+    Args:
+        node (Node): The root node of the chain.
+        operator_class (type): The operator of the chain.
+
+    Returns:
+        List[Node]: The operands of the chain.
+    """
+    operands = []
+    stack = [node] if node is not None else []
+    while stack:
+        current = stack.pop()
+        if current.node_type == 'operator' and type(current.value) is operator_class:
+            stack.append(current.right)
+            stack.append(current.left)
+        else:
+            operands.append(current)
+    return operands
+
+
+def node_fields(root: Node) -> FrozenSet[str]:
+    """
+    Collect the fields referenced by a tree.
+
+    Args:
+        root (Node): The root node of the tree.
+
+    Returns:
+        FrozenSet[str]: The field names.
+    """
+    fields = set()
+    stack = [root] if root is not None else []
+    while stack:
+        node = stack.pop()
+        if node.node_type == 'operand':
+            fields.add(node.value.lvariable)
+        else:
+            stack.extend(child for child in (node.left, node.right) if child is not None)
+    return frozenset(fields)
+
+
+def combine_nodes(nodes: List[Node], operator_class: type = ANDOperator) -> Node:
+    """
+    Combine nodes into a balanced tree of the given operator.
+
+    Nodes rooted at the same operator are flattened first, then operands are
+    paired level by level, keeping their order, so combining n operands
+    yields a tree of depth ceil(log2(n)) instead of a chain of depth n.
+
+    Args:
+        nodes (List[Node]): The nodes to combine.
+        operator_class (type): The operator combining the nodes.
+
+    Returns:
+        Node: The root node of the combined tree, or None if there are no nodes.
+    """
+    operands = []
+    for node in nodes:
+        operands.extend(flatten(node, operator_class))
+    if not operands:
+        return None
+
+    while len(operands) > 1:
+        paired = [
+            Node("operator", left=operands[i], right=operands[i + 1], value=operator_class())
+            for i in range(0, len(operands) - 1, 2)
+        ]
+        if len(operands) % 2:
+            paired.append(operands[-1])
+        operands = paired
+    return operands[0]
+
+
 class AST:
     def __init__(self, root=None):
         self.root = root
+        self.compiled = None
 
     def evaluate_rule(self, data):
+        if self.compiled is not None:
+            return self.compiled(data)
         return self._evaluate_node(self.root, data)
 
+    def compile(self) -> Callable[[Dict], bool]:
+        """
+        Compile the AST into a callable for repeated evaluation.
+
+        The tree is walked once, the returned callable is also kept on
+        AST.compiled and used by AST.evaluate_rule from then on. Recompile
+        after the tree is modified.
+
+        Returns:
+            Callable[[Dict], bool]: A function evaluating the rule for a record.
+        """
+        self.compiled = compile_node(self.root)
+        return self.compiled
+
+    def evaluate_many(self, records: Iterable[Dict]) -> List[bool]:
+        """
+        Evaluate the rule against many records.
+
+        The rule is compiled once, if it is not already, and applied to each
+        record in turn.
+
+        Args:
+            records (Iterable[Dict]): The records to evaluate.
+
+        Returns:
+            List[bool]: The evaluation results, in input order.
+        """
+        compiled = self.compiled if self.compiled is not None else self.compile()
+        return list(map(compiled, records))
+
+    def evaluate_columns(self, columns: Dict[str, Iterable]):
+        """
+        Evaluate the rule against columnar data in a vectorized manner.
+
+        Each condition is evaluated as one NumPy comparison over its column,
+        which requires NumPy, installed with the columnar extra.
+
+        Args:
+            columns (Dict[str, Iterable]): Arrays of equal length, keyed by
+                field name.
+
+        Returns:
+            numpy.ndarray: A boolean mask with the result for every row.
+
+        Raises:
+            ImportError: If NumPy is not installed.
+        """
+        from rule_engine.columnar_utils import evaluate_columns
+
+        return evaluate_columns(self.root, columns)
+
     def _evaluate_node(self, node, data):
-        if node is None:
-            return True
-        return node.evaluate(data)
+        return evaluate_tree(node, data)
 
     def create_rule(self, rule: str) -> bool:
         """
@@ -93,31 +462,30 @@ class AST:
         Returns:
             bool: True if the rule was created successfully.
         """
-        from rule_engine.parser_utils import tokenize, Parser
+        from rule_engine.parser_utils import parse_rule
 
-        tokens = tokenize(rule)
-        parser = Parser(tokens)
-        self.root = parser.parse()
+        self.root = parse_rule(rule)
+        self.compiled = None
         return True
 
     def combine_rules(self, rules: List[str]) -> bool:
         """
         Combine multiple rules into a single AST.
 
+        The combined tree is simplified, so conditions repeated across the
+        rules are only kept, and evaluated, once.
+
         Args:
             rules (List[str]): The list of rule strings.
 
         Returns:
             bool: True if the rules were combined successfully.
         """
-        from rule_engine.parser_utils import tokenize, Parser
-        
+        from rule_engine.parser_utils import parse_rule
+        from rule_engine.optimizer_utils import simplify
+
         # Parse each rule into its AST form
-        asts = []
-        for rule in rules:
-            tokens = tokenize(rule)
-            parser = Parser(tokens)
-            asts.append(parser.parse())
+        asts = [parse_rule(rule) for rule in rules]
 
         # Determine the most frequent operator to use as the root
         operator_count = {'AND': 0, 'OR': 0}
@@ -130,17 +498,7 @@ class AST:
         operator_class = ANDOperator if most_frequent_operator == 'AND' \
             else OROperator
 
-        # Combine all ASTs into one using the most frequent operator
-        while len(asts) > 1:
-            left_ast = asts.pop(0)
-            right_ast = asts.pop(0)
-            combined_ast = Node(
-                node_type="operator",
-                left=left_ast,
-                right=right_ast,
-                value=operator_class()
-            )
-            asts.append(combined_ast)
-
-        self.root = asts[0]
+        # Combine all ASTs into one balanced tree using the most frequent operator
+        self.root = simplify(combine_nodes(asts, operator_class))
+        self.compiled = None
         return True
@@ -0,0 +1,199 @@
+"""
+Bulk import and export of rules as NDJSON.
+
+Each line of an import holds one JSON object with the name of the rule and
+either its rule string, under "rule", or its base64 encoded binary AST,
+under "ast_binary", as written by an export. Lines are parsed in parallel
+worker processes and turned into rows ready for database.create_rules.
+"""
+
+import base64
+import json
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+from rule_engine.parser_utils import parse_rule
+from rule_engine.schema_utils import Schema
+from rule_engine.serialization_utils import bytes_to_root, json_to_root, root_to_bytes, root_to_json
+
+if TYPE_CHECKING:
+    from rule_engine.models import Rule
+
+# Number of lines parsed and inserted together, and of worker processes.
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE') or 1000)
+BULK_WORKERS = int(os.getenv('BULK_WORKERS') or os.cpu_count() or 1)
+
+# Chunks smaller than this are parsed in the calling process.
+MIN_PARALLEL_LINES = 256
+
+_executor: Optional[Executor] = None
+
+
+def get_executor() -> Optional[Executor]:
+    """
+    Return the process pool parsing bulk imports, creating it on first use.
+
+    Returns:
+        Optional[Executor]: The process pool, or None with a single worker.
+    """
+    global _executor
+    if _executor is None and BULK_WORKERS > 1:
+        _executor = ProcessPoolExecutor(max_workers=BULK_WORKERS)
+    return _executor
+
+
+def encode_line(line_number: int, line: str, schema: Optional[Schema] = None) -> Dict:
+    """
+    Parse one NDJSON line into a row of the rules table.
+
+    Args:
+        line_number (int): The 1-based number of the line, for errors.
+        line (str): The line.
+        schema (Optional[Schema]): The schema the rule must fit, if any.
+
+    Returns:
+        Dict: The name, ast_json and ast_binary of the rule.
+
+    Raises:
+        ValueError: If the line is not a valid rule.
+    """
+    try:
+        entry = json.loads(line)
+        name = entry['name']
+        if 'rule' in entry:
+            root = parse_rule(entry['rule'])
+        else:
+            root = bytes_to_root(base64.b64decode(entry['ast_binary'], validate=True))
+        if schema is not None:
+            schema.validate(root)
+        return {'name': name, 'ast_json': root_to_json(root), 'ast_binary': root_to_bytes(root)}
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Line {line_number}: {e}") from None
+
+
+def encode_lines(lines: List[Tuple[int, str]], schema: Optional[Schema] = None) -> List[Dict]:
+    """
+    Parse numbered NDJSON lines into rows of the rules table.
+
+    Args:
+        lines (List[Tuple[int, str]]): The line numbers and lines.
+        schema (Optional[Schema]): The schema the rules must fit, if any.
+
+    Returns:
+        List[Dict]: The rows, in input order.
+
+    Raises:
+        ValueError: If a line is not a valid rule.
+    """
+    return [encode_line(line_number, line, schema) for line_number, line in lines]
+
+
+def encode_lines_parallel(lines: List[Tuple[int, str]], executor: Optional[Executor] = None,
+                          schema: Optional[Schema] = None) -> List[Dict]:
+    """
+    Parse numbered NDJSON lines into rows, split across worker processes.
+
+    Args:
+        lines (List[Tuple[int, str]]): The line numbers and lines.
+        executor (Optional[Executor]): The pool to use, by default the
+            shared process pool.
+        schema (Optional[Schema]): The schema the rules must fit, if any.
+
+    Returns:
+        List[Dict]: The rows, in input order.
+
+    Raises:
+        ValueError: If a line is not a valid rule.
+    """
+    executor = executor or get_executor()
+    if executor is None or len(lines) < MIN_PARALLEL_LINES:
+        return encode_lines(lines, schema)
+    size = -(-len(lines) // BULK_WORKERS)
+    parts = executor.map(partial(encode_lines, schema=schema), [lines[i:i + size] for i in range(0, len(lines), size)])
+    return [row for part in parts for row in part]
+
+
+def numbered_chunks(lines: Iterable[str], chunk_size: int = BULK_CHUNK_SIZE) -> Iterator[List[Tuple[int, str]]]:
+    """
+    Group the non-blank lines of an input into numbered chunks.
+
+    Args:
+        lines (Iterable[str]): The lines.
+        chunk_size (int): The maximum number of lines per chunk.
+
+    Yields:
+        List[Tuple[int, str]]: The line numbers and lines of each chunk.
+    """
+    chunk = []
+    for line_number, line in enumerate(lines, start=1):
+        if line.strip():
+            chunk.append((line_number, line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+async def stream_chunks(stream: AsyncIterable[bytes], chunk_size: int = BULK_CHUNK_SIZE) -> AsyncIterator[List[Tuple[int, str]]]:
+    """
+    Group the non-blank lines of a byte stream into numbered chunks.
+
+    Only the current chunk and the incomplete last line are buffered, so
+    inputs of any size can be consumed.
+
+    Args:
+        stream (AsyncIterable[bytes]): The UTF-8 encoded input, e.g. a request body.
+        chunk_size (int): The maximum number of lines per chunk.
+
+    Yields:
+        List[Tuple[int, str]]: The line numbers and lines of each chunk.
+
+    Raises:
+        ValueError: If a line is not valid UTF-8.
+    """
+    pending = b''
+    line_number = 0
+    chunk = []
+    async for data in stream:
+        *lines, pending = (pending + data).split(b'\n')
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                chunk.append((line_number, _decode_line(line_number, line)))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    if pending.strip():
+        chunk.append((line_number + 1, _decode_line(line_number + 1, pending)))
+    if chunk:
+        yield chunk
+
+
+def _decode_line(line_number: int, line: bytes) -> str:
+    """Decode a UTF-8 line, naming the line if it is not valid UTF-8."""
+    try:
+        return line.decode('utf-8')
+    except UnicodeDecodeError:
+        raise ValueError(f"Line {line_number}: invalid UTF-8") from None
+
+
+def rule_to_ndjson(db_rule: 'Rule') -> str:
+    """
+    Format a stored rule as an NDJSON line that can be imported back.
+
+    Args:
+        db_rule (Rule): The stored rule.
+
+    Returns:
+        str: The JSON object of the rule, newline terminated.
+    """
+    ast_binary = db_rule.ast_binary
+    if ast_binary is None:
+        ast_binary = root_to_bytes(json_to_root(db_rule.ast_json))
+    return json.dumps({
+        'id': db_rule.id,
+        'name': db_rule.name,
+        'ast_binary': base64.b64encode(ast_binary).decode('ascii'),
+    }) + '\n'
@@ -0,0 +1,163 @@
+"""
+In-process cache of ready-to-evaluate rules.
+
+This module provides a bounded LRU cache, with an optional TTL, that maps
+rule ids to compiled AST objects so that evaluating a rule does not have to
+query the database and rebuild the tree on every request.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+from rule_engine.ast_utils import AST
+
+
+class RuleCache:
+    """
+    A thread-safe LRU cache of AST objects keyed by rule id.
+
+    Entries may carry the version of their rule. Invalidating a rule with
+    its new version leaves a marker of that version in the cache, which
+    counts towards its size, until the new version is put.
+
+    Attributes:
+        max_size (int): The maximum number of rules held in the cache.
+        ttl (Optional[float]): Seconds after which an entry expires, or None
+            to keep entries until they are evicted or invalidated.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups not found, or expired, in the cache.
+        evictions (int): Number of entries dropped to respect max_size.
+    """
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None):
+        if max_size < 1:
+            raise ValueError("Cache size must be at least 1")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, rule_id: Hashable) -> Optional[AST]:
+        """
+        Retrieve a rule from the cache, marking it as recently used.
+
+        Args:
+            rule_id (Hashable): The ID of the rule to retrieve.
+
+        Returns:
+            Optional[AST]: The cached AST, or None if absent or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(rule_id)
+            if entry is None or entry[0] is None:
+                self.misses += 1
+                return None
+            ast, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[rule_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(rule_id)
+            self.hits += 1
+            return ast
+
+    def put(self, rule_id: Hashable, ast: AST, version: Optional[int] = None) -> bool:
+        """
+        Add a rule to the cache, evicting the least recently used entries.
+
+        A versioned rule is not added if the cache already knows of a newer
+        version, so that a request that loaded a rule just before it was
+        updated can not put the outdated version back.
+
+        Args:
+            rule_id (Hashable): The ID of the rule.
+            ast (AST): The AST of the rule, compiled by the caller if needed.
+            version (Optional[int]): The version of the rule.
+
+        Returns:
+            bool: True if the rule was added.
+        """
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            if not self._is_current(rule_id, version):
+                return False
+            self._store(rule_id, (ast, expires_at, version))
+            return True
+
+    def invalidate(self, rule_id: Hashable, version: Optional[int] = None) -> bool:
+        """
+        Drop a rule from the cache.
+
+        Given the new version of an updated rule, the cache remembers it and
+        rejects any older version put afterwards.
+
+        Args:
+            rule_id (Hashable): The ID of the rule to drop.
+            version (Optional[int]): The version the rule was updated to.
+
+        Returns:
+            bool: True if a cached rule was dropped.
+        """
+        with self._lock:
+            entry = self._entries.get(rule_id)
+            if version is None:
+                self._entries.pop(rule_id, None)
+            elif self._is_current(rule_id, version):
+                self._store(rule_id, (None, None, version))
+            else:
+                # The cache already holds a newer version.
+                return False
+            return entry is not None and entry[0] is not None
+
+    def _is_current(self, rule_id: Hashable, version: Optional[int]) -> bool:
+        """Check that no newer version of a rule is known, the lock being held."""
+        entry = self._entries.get(rule_id)
+        return version is None or entry is None or entry[2] is None or entry[2] <= version
+
+    def _store(self, rule_id: Hashable, entry) -> None:
+        """Store an entry as the most recently used, the lock being held."""
+        self._entries[rule_id] = entry
+        self._entries.move_to_end(rule_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every rule from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the cache counters.
+
+        Returns:
+            Dict[str, int]: The size, hits, misses and evictions of the cache.
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _ttl_from_env() -> Optional[float]:
+    """Read the cache TTL in seconds from the environment, if set."""
+    ttl = os.getenv('RULE_CACHE_TTL')
+    return float(ttl) if ttl else None
+
+# Process-wide cache used by the API and invalidated by database writes.
+rule_cache = RuleCache(
+    max_size=int(os.getenv('RULE_CACHE_SIZE') or 1024),
+    ttl=_ttl_from_env(),
+)
@@ -0,0 +1,130 @@
+"""
+Vectorized evaluation of rule ASTs over columnar data.
+
+This module evaluates an AST against a mapping of column name to array, with
+each Condition turned into one NumPy comparison producing a boolean mask and
+AND/OR/NOT operators combining masks with &, | and ~. NumPy is an optional
+dependency, only needed by this module, and installed with the columnar
+extra.
+"""
+
+from typing import Dict, Mapping, Sequence
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError("Columnar evaluation requires NumPy, install the rule-engine[columnar] extra") from e
+from rule_engine.ast_utils import Node, Condition, ANDOperator, OROperator, NOTOperator
+
+
+def to_columns(columns: Mapping[str, Sequence]) -> Dict[str, np.ndarray]:
+    """
+    Convert a mapping of column name to sequence into NumPy arrays.
+
+    Args:
+        columns (Mapping[str, Sequence]): The columns, all of the same length.
+
+    Returns:
+        Dict[str, np.ndarray]: The columns as one-dimensional arrays.
+
+    Raises:
+        ValueError: If the columns differ in length or are not one-dimensional.
+    """
+    arrays = {name: np.asarray(values) for name, values in columns.items()}
+    lengths = {array.shape for array in arrays.values()}
+    if len(lengths) > 1 or any(len(shape) != 1 for shape in lengths):
+        raise ValueError("Columns must be one-dimensional and of equal length")
+    return arrays
+
+
+def evaluate_columns(root: Node, columns: Mapping[str, Sequence]) -> np.ndarray:
+    """
+    Evaluate an AST against columnar data.
+
+    Args:
+        root (Node): The root node of the AST.
+        columns (Mapping[str, Sequence]): The columns, keyed by field name.
+
+    Returns:
+        np.ndarray: A boolean mask with the result for every row.
+    """
+    arrays = to_columns(columns)
+    num_rows = next(iter(arrays.values())).shape[0] if arrays else 0
+    if root is None:
+        return np.ones(num_rows, dtype=bool)
+    return _evaluate_node(root, arrays, num_rows)
+
+
+def _evaluate_node(root: Node, arrays: Dict[str, np.ndarray], num_rows: int) -> np.ndarray:
+    """
+    Evaluate a tree against columnar data, returning a boolean mask.
+
+    The tree is walked in post-order with an explicit stack, so trees of any
+    depth are supported.
+
+    Args:
+        root (Node): The root node of the tree.
+        arrays (Dict[str, np.ndarray]): The columns, keyed by field name.
+        num_rows (int): The number of rows in every column.
+
+    Returns:
+        np.ndarray: A boolean mask with the result for every row.
+
+    Raises:
+        ValueError: If the tree holds an operator other than AND, OR and NOT.
+    """
+    masks = []
+    # Each entry holds a node and whether its operands were evaluated.
+    stack = [(root, False)]
+    while stack:
+        node, visited = stack.pop()
+        if node.node_type == 'operand':
+            masks.append(_evaluate_condition(node.value, arrays, num_rows))
+        elif not visited:
+            if not isinstance(node.value, (ANDOperator, OROperator, NOTOperator)):
+                raise ValueError(f"Operator {type(node.value).__name__} can not be evaluated on columns")
+            stack.append((node, True))
+            if not isinstance(node.value, NOTOperator):
+                stack.append((node.right, False))
+            stack.append((node.left, False))
+        elif isinstance(node.value, NOTOperator):
+            masks.append(~masks.pop())
+        else:
+            right = masks.pop()
+            left = masks.pop()
+            masks.append(left & right if isinstance(node.value, ANDOperator) else left | right)
+    return masks[0]
+
+
+def _evaluate_condition(condition: Condition, arrays: Dict[str, np.ndarray],
+                        num_rows: int) -> np.ndarray:
+    """
+    Evaluate a condition against its column with a single comparison.
+
+    Args:
+        condition (Condition): The condition to evaluate.
+        arrays (Dict[str, np.ndarray]): The columns, keyed by field name.
+        num_rows (int): The number of rows in every column.
+
+    Returns:
+        np.ndarray: A boolean mask with the result for every row.
+    """
+    column = arrays[condition.lvariable]
+    if condition.comparison_type == 'gt':
+        return np.asarray(column > condition.rvalue, dtype=bool)
+    if condition.comparison_type == 'lt':
+        return np.asarray(column < condition.rvalue, dtype=bool)
+    if condition.comparison_type == 'eq':
+        return np.asarray(column == condition.rvalue, dtype=bool)
+    if condition.comparison_type == 'ge':
+        return np.asarray(column >= condition.rvalue, dtype=bool)
+    if condition.comparison_type == 'le':
+        return np.asarray(column <= condition.rvalue, dtype=bool)
+    if condition.comparison_type == 'ne':
+        return np.asarray(column != condition.rvalue, dtype=bool)
+    if condition.comparison_type in ('in', 'not_in'):
+        return np.isin(column, list(condition.rvalue), invert=condition.comparison_type == 'not_in')
+    if condition.comparison_type == 'between':
+        low, high = condition.rvalue
+        return np.asarray((column >= low) & (column <= high), dtype=bool)
+    # Unsupported comparison types evaluate to False, like Condition.evaluate.
+    return np.zeros(num_rows, dtype=bool)
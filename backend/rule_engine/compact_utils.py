@@ -0,0 +1,331 @@
+"""
+Struct-of-arrays encoding of rule trees.
+
+A CompactTree holds a rule as parallel arrays indexed by node number, with
+nodes numbered in preorder so that the left child of an operator is the
+node following it:
+
+    kinds      the node kind, an operator or a comparison type (1 byte)
+    rights     the index of the right child of AND/OR nodes, else -1
+    fields     the index of the field of condition nodes in field_names
+    constants  the index of the literal of condition nodes in
+               constant_values, or the predicate slot of predicate nodes
+
+Field names and literals are interned per tree. Compared with a tree of
+Node and Condition objects and the closures compiled from it, this takes a
+fraction of the memory, and evaluation walks contiguous arrays with an
+explicit stack instead of chasing pointers through nested calls.
+"""
+
+import operator
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from rule_engine.ast_utils import Node, Condition, ANDOperator, OROperator, NOTOperator
+
+KIND_AND = 0
+KIND_OR = 1
+KIND_NOT = 2
+# A condition evaluated through a predicate slot of a rule set.
+KIND_PREDICATE = 3
+
+# Comparison types, by kind, unsupported types getting the last kind.
+COMPARISON_TYPES = ('gt', 'lt', 'eq', 'ge', 'le', 'ne', 'in', 'not_in', 'between')
+FIRST_COMPARISON = 4
+KIND_UNSUPPORTED = FIRST_COMPARISON + len(COMPARISON_TYPES)
+
+_COMPARISON_KINDS = {name: FIRST_COMPARISON + index for index, name in enumerate(COMPARISON_TYPES)}
+
+
+def _in(value: Any, values: frozenset) -> bool:
+    """Check set membership, unhashable values being in no set."""
+    try:
+        return value in values
+    except TypeError:
+        return False
+
+
+def _not_in(value: Any, values: frozenset) -> bool:
+    """Check set non-membership."""
+    return not _in(value, values)
+
+
+def _between(value: Any, bounds: Tuple[Any, Any]) -> bool:
+    """Check an inclusive range."""
+    return bounds[0] <= value <= bounds[1]
+
+
+def _unsupported(value: Any, condition: Tuple[str, Any]) -> bool:
+    """Unsupported comparison types evaluate to False, like Condition.evaluate."""
+    return False
+
+
+# Comparison functions, by kind minus FIRST_COMPARISON.
+_COMPARATORS = (
+    operator.gt, operator.lt, operator.eq, operator.ge, operator.le, operator.ne,
+    _in, _not_in, _between, _unsupported,
+)
+
+# Literal types interned by value, others (sets, pairs) are stored as is.
+_INTERNED_TYPES = (str, int, float, bool, type(None))
+
+
+class CompactTree:
+    """
+    A rule tree stored as parallel arrays, see the module docstring.
+
+    Shared subtrees of a DAG, e.g. from simplify, are stored once per
+    parent, as in a tree.
+
+    Attributes:
+        kinds (array): The kind of each node.
+        rights (array): The right child of each AND/OR node, else -1.
+        fields (array): The field index of each condition node, else -1.
+        constants (array): The literal index of each condition node, the
+            slot of each predicate node, or for NOT nodes over predicates
+            the index of the fields of their operand. The literal of an
+            unsupported comparison is stored with its comparison type.
+        field_names (Tuple[str, ...]): The interned field names.
+        constant_values (Tuple[Any, ...]): The interned literals.
+    """
+    __slots__ = ('kinds', 'rights', 'fields', 'constants', 'field_names', 'constant_values')
+
+    def __init__(self, kinds: array, rights: array, fields: array, constants: array,
+                 field_names: Sequence[str], constant_values: Sequence[Any]):
+        self.kinds = kinds
+        self.rights = rights
+        self.fields = fields
+        self.constants = constants
+        self.field_names = tuple(field_names)
+        self.constant_values = tuple(constant_values)
+
+    @classmethod
+    def from_root(cls, root: Node, predicate_slot: Optional[Callable[[Condition], int]] = None) -> 'CompactTree':
+        """
+        Encode a tree.
+
+        Args:
+            root (Node): The root node of the tree, or None for an empty tree.
+            predicate_slot (Optional[Callable[[Condition], int]]): Maps each
+                condition to a predicate slot, to store conditions as
+                predicate nodes evaluated by evaluate_predicates.
+
+        Returns:
+            CompactTree: The encoded tree.
+
+        Raises:
+            ValueError: If the tree holds an unknown operator.
+        """
+        kinds, rights, fields, constants = array('B'), array('i'), array('i'), array('i')
+        field_ids: Dict[str, int] = {}
+        constant_ids: Dict[Tuple[type, Any], int] = {}
+        constant_values: List[Any] = []
+        # In predicate mode, the fields of the subtree of each node.
+        subtree_fields: List[Optional[frozenset]] = []
+
+        def add_constant(value):
+            if isinstance(value, _INTERNED_TYPES):
+                key = (type(value), value)
+                index = constant_ids.get(key)
+                if index is None:
+                    index = constant_ids[key] = len(constant_values)
+                    constant_values.append(value)
+                return index
+            constant_values.append(value)
+            return len(constant_values) - 1
+
+        # Nodes with the index of the parent whose right child they are.
+        stack = [(root, -1)] if root is not None else []
+        while stack:
+            node, parent = stack.pop()
+            index = len(kinds)
+            if parent >= 0:
+                rights[parent] = index
+            field = constant = -1
+            if node.node_type == 'operand':
+                condition = node.value
+                if predicate_slot is not None:
+                    kind = KIND_PREDICATE
+                    constant = predicate_slot(condition)
+                    subtree_fields.append(frozenset((condition.lvariable,)))
+                else:
+                    kind = _COMPARISON_KINDS.get(condition.comparison_type, KIND_UNSUPPORTED)
+                    field = field_ids.setdefault(condition.lvariable, len(field_ids))
+                    if kind == KIND_UNSUPPORTED:
+                        constant = add_constant((condition.comparison_type, condition.rvalue))
+                    else:
+                        constant = add_constant(condition.rvalue)
+            elif isinstance(node.value, NOTOperator):
+                kind = KIND_NOT
+            elif isinstance(node.value, (ANDOperator, OROperator)):
+                kind = KIND_AND if isinstance(node.value, ANDOperator) else KIND_OR
+            else:
+                raise ValueError(f"Unsupported operator {type(node.value).__name__}")
+
+            kinds.append(kind)
+            rights.append(-1)
+            fields.append(field)
+            constants.append(constant)
+            if kind <= KIND_NOT and predicate_slot is not None:
+                subtree_fields.append(None)
+            if kind == KIND_AND or kind == KIND_OR:
+                stack.append((node.right, index))
+            if kind <= KIND_NOT:
+                stack.append((node.left, -1))
+
+        if predicate_slot is not None:
+            # Children have higher indices than their parent, so the fields
+            # of every subtree are collected in one pass, and nested NOTs do
+            # not walk their subtree again.
+            for index in range(len(kinds) - 1, -1, -1):
+                kind = kinds[index]
+                if kind == KIND_PREDICATE:
+                    continue
+                operand_fields = subtree_fields[index + 1]
+                if kind == KIND_NOT:
+                    constants[index] = add_constant(operand_fields)
+                else:
+                    right_fields = subtree_fields[rights[index]]
+                    if not right_fields <= operand_fields:
+                        operand_fields = operand_fields | right_fields
+                subtree_fields[index] = operand_fields
+        return cls(kinds, rights, fields, constants, field_ids, constant_values)
+
+    def to_root(self) -> Node:
+        """
+        Decode the tree back into nodes.
+
+        Returns:
+            Node: The root node, or None for an empty tree.
+
+        Raises:
+            ValueError: If the tree holds predicate nodes, whose conditions
+                are not stored.
+        """
+        nodes: List[Optional[Node]] = [None] * len(self.kinds)
+        # Children have higher indices than their parent.
+        for index in range(len(self.kinds) - 1, -1, -1):
+            kind = self.kinds[index]
+            if kind == KIND_AND or kind == KIND_OR:
+                operator_class = ANDOperator if kind == KIND_AND else OROperator
+                node = Node("operator", left=nodes[index + 1], right=nodes[self.rights[index]],
+                            value=operator_class())
+            elif kind == KIND_NOT:
+                node = Node("operator", left=nodes[index + 1], value=NOTOperator())
+            elif kind == KIND_PREDICATE:
+                raise ValueError("Predicate nodes can not be decoded")
+            else:
+                rvalue = self.constant_values[self.constants[index]]
+                if kind == KIND_UNSUPPORTED:
+                    comparison_type, rvalue = rvalue
+                else:
+                    comparison_type = COMPARISON_TYPES[kind - FIRST_COMPARISON]
+                node = Node("operand", value=Condition(self.field_names[self.fields[index]], rvalue, comparison_type))
+            nodes[index] = node
+        return nodes[0] if nodes else None
+
+    def evaluate(self, data: Dict) -> bool:
+        """
+        Evaluate the tree for a record.
+
+        Semantics match compile_node, including short-circuiting and the
+        KeyError raised for a missing field.
+
+        Args:
+            data (Dict): The record.
+
+        Returns:
+            bool: The result of the evaluation.
+        """
+        kinds = self.kinds
+        if not kinds:
+            return True
+        rights, fields, constants = self.rights, self.fields, self.constants
+        names, values = self.field_names, self.constant_values
+        comparators = _COMPARATORS
+        # Operators whose left operand is being evaluated, and the bitwise
+        # complement of those whose right operand is.
+        stack = []
+        index = 0
+        while True:
+            kind = kinds[index]
+            if kind <= KIND_NOT:
+                stack.append(index)
+                index += 1
+                continue
+            if kind == KIND_PREDICATE:
+                raise ValueError("Predicate nodes are evaluated by evaluate_predicates")
+            result = comparators[kind - FIRST_COMPARISON](data[names[fields[index]]], values[constants[index]])
+
+            while stack:
+                parent = stack.pop()
+                if parent < 0:
+                    continue
+                kind = kinds[parent]
+                if kind == KIND_NOT:
+                    result = not result
+                elif (kind == KIND_AND) == bool(result):
+                    # AND with a true left operand, or OR with a false one.
+                    stack.append(~parent)
+                    index = rights[parent]
+                    break
+            else:
+                return result
+
+    def evaluate_predicates(self, data: Dict, memo: Sequence, predicates: Sequence[Callable]) -> bool:
+        """
+        Evaluate a tree of predicate nodes, like a compiled RuleSet rule.
+
+        Predicate results are memoized per record, a predicate on a missing
+        field is False, and so is a NOT over a subtree referencing one.
+
+        Args:
+            data (Dict): The record.
+            memo (Sequence): The per-record predicate results, None for
+                those not evaluated yet.
+            predicates (Sequence[Callable]): The predicate functions, by slot.
+
+        Returns:
+            bool: The result of the evaluation.
+        """
+        kinds = self.kinds
+        if not kinds:
+            return True
+        rights, constants, values = self.rights, self.constants, self.constant_values
+        stack = []
+        index = 0
+        while True:
+            kind = kinds[index]
+            if kind != KIND_PREDICATE:
+                stack.append(index)
+                index += 1
+                continue
+            slot = constants[index]
+            result = memo[slot]
+            if result is None:
+                try:
+                    result = predicates[slot](data)
+                except KeyError:
+                    result = False
+                memo[slot] = result
+
+            while stack:
+                parent = stack.pop()
+                if parent < 0:
+                    continue
+                kind = kinds[parent]
+                if kind == KIND_NOT:
+                    result = data.keys() >= values[constants[parent]] and not result
+                elif (kind == KIND_AND) == bool(result):
+                    stack.append(~parent)
+                    index = rights[parent]
+                    break
+            else:
+                return result
+
+    @property
+    def nbytes(self) -> int:
+        """The size of the arrays, in bytes."""
+        return sum(values.itemsize * len(values) for values in (self.kinds, self.rights, self.fields, self.constants))
+
+    def __len__(self) -> int:
+        return len(self.kinds)
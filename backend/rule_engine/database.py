@@ -5,8 +5,12 @@ This module provides functions to interact with the database for
 storing and retrieving rules.
 """
 
+from typing import Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from rule_engine.models import Rule
+from rule_engine.cache_utils import rule_cache
 
 
 def get_rule(db: Session, rule_id: int) -> Rule:
@@ -23,7 +27,52 @@ def get_rule(db: Session, rule_id: int) -> Rule:
     return db.query(Rule).filter(Rule.id == rule_id).first()
 
 
-def create_rule(db: Session, rule_name: str, ast_json: str) -> Rule:
+def get_rules(db: Session, after_id: int = 0) -> List[Rule]:
+    """
+    Retrieve the rules with an ID greater than the given one, in ID order.
+
+    Args:
+        db (Session): The database session.
+        after_id (int): Only rules with a greater ID are returned.
+
+    Returns:
+        List[Rule]: The retrieved rule objects.
+    """
+    return db.query(Rule).filter(Rule.id > after_id).order_by(Rule.id).all()
+
+
+def get_rule_versions(db: Session) -> Dict[int, int]:
+    """
+    Retrieve the current version of every rule, without loading the rules.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        Dict[int, int]: The version of each rule, by ID.
+    """
+    return dict(db.execute(select(Rule.id, Rule.version)).all())
+
+
+def iter_rules(db: Session, batch_size: int = 1000) -> Iterator[Rule]:
+    """
+    Iterate over every rule in ID order, fetching them in batches.
+
+    A server-side cursor is used where the database supports it, so the
+    rules are never all held in memory at once.
+
+    Args:
+        db (Session): The database session.
+        batch_size (int): The number of rules fetched at a time.
+
+    Yields:
+        Rule: The rule objects.
+    """
+    statement = select(Rule).order_by(Rule.id).execution_options(yield_per=batch_size)
+    yield from db.execute(statement).scalars()
+
+
+def create_rule(db: Session, rule_name: str, ast_json: str, ast_binary: bytes = None) -> Rule:
     """
     Create a new rule in the database.
 
@@ -31,12 +80,139 @@ def create_rule(db: Session, rule_name: str, ast_json: str) -> Rule:
         db (Session): The database session.
         rule_name (str): The name of the rule.
         ast_json (str): The JSON representation of the AST for the rule.
+        ast_binary (bytes): The compact binary representation of the AST.
 
     Returns:
         Rule: The created rule object.
     """
-    db_rule = Rule(name=rule_name, ast_json=ast_json)
+    db_rule = Rule(name=rule_name, ast_json=ast_json, ast_binary=ast_binary)
     db.add(db_rule)
     db.commit()
     db.refresh(db_rule)
+    rule_cache.invalidate(db_rule.id)
+    return db_rule
+
+
+def update_rule(db: Session, rule_id: int, ast_json: str, ast_binary: bytes = None,
+                rule_name: str = None, expected_version: int = None) -> Optional[Rule]:
+    """
+    Update the AST, and optionally the name, of a rule, incrementing its version.
+
+    The update is a single conditional statement, so concurrent updates
+    expecting the same version can not both succeed. The cached rule is
+    invalidated with its new version, so that no older version can be
+    cached again.
+
+    Args:
+        db (Session): The database session.
+        rule_id (int): The ID of the rule to update.
+        ast_json (str): The JSON representation of the new AST.
+        ast_binary (bytes): The compact binary representation of the new AST.
+        rule_name (str): The new name of the rule, or None to keep it.
+        expected_version (int): Only update the rule if it is at this
+            version, or None to update any version.
+
+    Returns:
+        Optional[Rule]: The updated rule object, or None if the rule does
+            not exist or is not at the expected version.
+    """
+    values = {'ast_json': ast_json, 'ast_binary': ast_binary, 'version': Rule.version + 1}
+    if rule_name is not None:
+        values['name'] = rule_name
+    statement = update(Rule).where(Rule.id == rule_id)
+    if expected_version is not None:
+        statement = statement.where(Rule.version == expected_version)
+    if db.execute(statement.values(**values)).rowcount == 0:
+        db.rollback()
+        return None
+    db.commit()
+    db_rule = get_rule(db, rule_id)
+    db.refresh(db_rule)
+    rule_cache.invalidate(rule_id, db_rule.version)
+    return db_rule
+
+
+def create_rules(db: Session, rows: Iterable[Dict], chunk_size: int = 1000) -> int:
+    """
+    Create many rules in the database, in batches.
+
+    Each chunk of rows is inserted with a single executemany statement and
+    committed in its own transaction.
+
+    Args:
+        db (Session): The database session.
+        rows (Iterable[Dict]): The name, ast_json and ast_binary of each rule.
+        chunk_size (int): The number of rules inserted per transaction.
+
+    Returns:
+        int: The number of rules created.
+    """
+    created = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            created += _insert_rules(db, chunk)
+            chunk = []
+    if chunk:
+        created += _insert_rules(db, chunk)
+    return created
+
+
+def _insert_rules(db: Session, rows: List[Dict]) -> int:
+    """Insert and commit one batch of rules, returning their number."""
+    db.execute(insert(Rule), rows)
+    db.commit()
+    return len(rows)
+
+
+async def get_rule_async(db: AsyncSession, rule_id: int) -> Rule:
+    """
+    Retrieve a rule from the database by its ID, without blocking.
+
+    Args:
+        db (AsyncSession): The async database session.
+        rule_id (int): The ID of the rule to retrieve.
+
+    Returns:
+        Rule: The retrieved rule object.
+    """
+    result = await db.execute(select(Rule).where(Rule.id == rule_id))
+    return result.scalars().first()
+
+
+async def get_rules_async(db: AsyncSession, after_id: int = 0) -> List[Rule]:
+    """
+    Retrieve the rules with an ID greater than the given one, in ID order,
+    without blocking.
+
+    Args:
+        db (AsyncSession): The async database session.
+        after_id (int): Only rules with a greater ID are returned.
+
+    Returns:
+        List[Rule]: The retrieved rule objects.
+    """
+    result = await db.execute(select(Rule).where(Rule.id > after_id).order_by(Rule.id))
+    return list(result.scalars().all())
+
+
+async def create_rule_async(db: AsyncSession, rule_name: str, ast_json: str, ast_binary: bytes = None) -> Rule:
+    """
+    Create a new rule in the database, without blocking.
+
+    Args:
+        db (AsyncSession): The async database session.
+        rule_name (str): The name of the rule.
+        ast_json (str): The JSON representation of the AST for the rule.
+        ast_binary (bytes): The compact binary representation of the AST.
+
+    Returns:
+        Rule: The created rule object.
+    """
+    db_rule = Rule(name=rule_name, ast_json=ast_json, ast_binary=ast_binary)
+    db.add(db_rule)
+    await db.commit()
+    await db.refresh(db_rule)
+    rule_cache.invalidate(db_rule.id)
     return db_rule
@@ -0,0 +1,291 @@
+"""
+Predicate index for selecting the rules relevant to a record.
+
+This module provides an inverted index over the conditions of many rules,
+with hash buckets for 'eq' and 'in' conditions and sorted threshold arrays
+for 'gt', 'lt', 'ge' and 'le' conditions, and a rule set using it to only
+evaluate the rules that reference a condition the record satisfies.
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from rule_engine.ast_utils import AST, Condition, Node, NOTOperator
+from rule_engine.ruleset_utils import RuleSet
+
+# Range comparisons, held in sorted threshold arrays.
+RANGE_COMPARISONS = ('gt', 'lt', 'ge', 'le')
+
+
+def _value_kind(value: Any) -> Optional[str]:
+    """
+    Classify a value into a family of mutually comparable values.
+
+    Args:
+        value (Any): The value.
+
+    Returns:
+        Optional[str]: 'number', 'string', or None for other values.
+    """
+    if isinstance(value, (int, float)):
+        return 'number'
+    if isinstance(value, str):
+        return 'string'
+    return None
+
+
+def _has_negation(root: Node) -> bool:
+    """Check whether a tree holds a NOT operator."""
+    stack = [root] if root is not None else []
+    while stack:
+        node = stack.pop()
+        if node.node_type == 'operator':
+            if isinstance(node.value, NOTOperator):
+                return True
+            stack.extend(child for child in (node.left, node.right) if child is not None)
+    return False
+
+
+class PredicateIndex:
+    """
+    An inverted index from record fields to the predicates they satisfy.
+
+    Predicates are identified by the slot given when they are added. 'eq'
+    predicates are bucketed by field and literal, 'in' predicates in the
+    bucket of each of their values, so that a set of any size costs a single
+    lookup. 'gt', 'lt', 'ge' and 'le' predicates are kept in per-field
+    arrays sorted by threshold, so that looking up a record only touches
+    the predicates it satisfies. Values of a different
+    kind than the threshold (e.g. a string against a number) satisfy no
+    range predicate.
+    """
+    def __init__(self):
+        self._eq: Dict[str, Dict[Hashable, Set[int]]] = {}
+        self._ranges: Dict[Tuple[str, str, str], Tuple[List, List[int]]] = {}
+        self._fields: Dict[str, int] = {}
+
+    @staticmethod
+    def is_indexable(condition: Condition) -> bool:
+        """
+        Check whether a condition can be held in the index.
+
+        Args:
+            condition (Condition): The condition.
+
+        Returns:
+            bool: True if the condition can be added to the index.
+        """
+        if condition.comparison_type == 'eq':
+            try:
+                hash(condition.rvalue)
+            except TypeError:
+                return False
+            return True
+        if condition.comparison_type == 'in':
+            return isinstance(condition.rvalue, frozenset)
+        if condition.comparison_type in RANGE_COMPARISONS:
+            return _value_kind(condition.rvalue) is not None
+        return False
+
+    def add(self, slot: int, condition: Condition) -> bool:
+        """
+        Add a predicate to the index.
+
+        Args:
+            slot (int): The slot identifying the predicate.
+            condition (Condition): The condition of the predicate.
+
+        Returns:
+            bool: True if the condition was indexed, False if it is not
+                indexable.
+        """
+        if not self.is_indexable(condition):
+            return False
+        field = condition.lvariable
+        if condition.comparison_type in ('eq', 'in'):
+            buckets = self._eq.setdefault(field, {})
+            for value in _bucket_values(condition):
+                buckets.setdefault(value, set()).add(slot)
+        else:
+            key = (field, condition.comparison_type, _value_kind(condition.rvalue))
+            thresholds, slots = self._ranges.setdefault(key, ([], []))
+            position = bisect_right(thresholds, condition.rvalue)
+            thresholds.insert(position, condition.rvalue)
+            slots.insert(position, slot)
+        self._fields[field] = self._fields.get(field, 0) + 1
+        return True
+
+    def remove(self, slot: int, condition: Condition) -> None:
+        """
+        Remove a predicate from the index.
+
+        Args:
+            slot (int): The slot identifying the predicate.
+            condition (Condition): The condition the predicate was added with.
+        """
+        field = condition.lvariable
+        if condition.comparison_type in ('eq', 'in'):
+            buckets = self._eq[field]
+            for value in _bucket_values(condition):
+                bucket = buckets[value]
+                bucket.discard(slot)
+                if not bucket:
+                    del buckets[value]
+            if not buckets:
+                del self._eq[field]
+        else:
+            key = (field, condition.comparison_type, _value_kind(condition.rvalue))
+            thresholds, slots = self._ranges[key]
+            start = bisect_left(thresholds, condition.rvalue)
+            position = slots.index(slot, start)
+            del thresholds[position]
+            del slots[position]
+            if not slots:
+                del self._ranges[key]
+        self._fields[field] -= 1
+        if not self._fields[field]:
+            del self._fields[field]
+
+    def lookup(self, data: Dict) -> Set[int]:
+        """
+        Find the predicates a record satisfies.
+
+        Args:
+            data (Dict): The record.
+
+        Returns:
+            Set[int]: The slots of the satisfied predicates.
+        """
+        matched = set()
+        for field, value in data.items():
+            if field not in self._fields:
+                continue
+            buckets = self._eq.get(field)
+            if buckets:
+                try:
+                    matched.update(buckets.get(value, ()))
+                except TypeError:
+                    pass
+            kind = _value_kind(value)
+            if kind is None:
+                continue
+            greater = self._ranges.get((field, 'gt', kind))
+            if greater:
+                thresholds, slots = greater
+                matched.update(slots[:bisect_left(thresholds, value)])
+            greater_equal = self._ranges.get((field, 'ge', kind))
+            if greater_equal:
+                thresholds, slots = greater_equal
+                matched.update(slots[:bisect_right(thresholds, value)])
+            lower = self._ranges.get((field, 'lt', kind))
+            if lower:
+                thresholds, slots = lower
+                matched.update(slots[bisect_right(thresholds, value):])
+            lower_equal = self._ranges.get((field, 'le', kind))
+            if lower_equal:
+                thresholds, slots = lower_equal
+                matched.update(slots[bisect_left(thresholds, value):])
+        return matched
+
+
+def _bucket_values(condition: Condition) -> Iterable:
+    """Return the literals an 'eq' or 'in' condition is bucketed under."""
+    return condition.rvalue if condition.comparison_type == 'in' else (condition.rvalue,)
+
+
+class _IndexedMemo(dict):
+    """Per-record predicate results, False for indexed predicates not looked up."""
+    __slots__ = ('unindexed',)
+
+    def __init__(self, matched: Set[int], unindexed: Set[int]):
+        super().__init__(dict.fromkeys(matched, True))
+        self.unindexed = unindexed
+
+    def __missing__(self, slot: int) -> Optional[bool]:
+        return None if slot in self.unindexed else False
+
+
+class IndexedRuleSet(RuleSet):
+    """
+    A rule set that uses a PredicateIndex to select candidate rules.
+
+    Rules made of AND/OR combinations of conditions can only match if the
+    record satisfies at least one of their conditions. Matching looks the
+    record up in the index, and only evaluates the rules that reference a
+    satisfied predicate, plus the rules holding conditions that can not be
+    indexed or a NOT, which may match without any satisfied condition. Matching cost therefore scales with the number
+    of relevant rules rather than with the size of the rule set.
+    """
+    def __init__(self, compact: bool = False):
+        super().__init__(compact)
+        self.index = PredicateIndex()
+        self._unindexed_slots: Set[int] = set()
+        self._slot_rules: Dict[int, Set[Hashable]] = {}
+        self._always_candidates: Set[Hashable] = set()
+        self._rule_order: Dict[Hashable, int] = {}
+        self._next_order = 0
+
+    def add_rule(self, rule_id: Hashable, ast: AST) -> None:
+        previous = self._rules.get(rule_id)
+        old_slots = set(previous[1]) if previous is not None else set()
+        super().add_rule(rule_id, ast)
+        slots = set(self._rules[rule_id][1])
+        for slot in old_slots - slots:
+            rules = self._slot_rules[slot]
+            rules.discard(rule_id)
+            if not rules:
+                del self._slot_rules[slot]
+        for slot in slots - old_slots:
+            self._slot_rules.setdefault(slot, set()).add(rule_id)
+        if not slots or slots & self._unindexed_slots or _has_negation(ast.root):
+            self._always_candidates.add(rule_id)
+        else:
+            self._always_candidates.discard(rule_id)
+        if rule_id not in self._rule_order:
+            self._rule_order[rule_id] = self._next_order
+            self._next_order += 1
+
+    def remove_rule(self, rule_id: Hashable) -> bool:
+        entry = self._rules.get(rule_id)
+        if entry is None:
+            return False
+        for slot in set(entry[1]):
+            rules = self._slot_rules[slot]
+            rules.discard(rule_id)
+            if not rules:
+                del self._slot_rules[slot]
+        self._always_candidates.discard(rule_id)
+        del self._rule_order[rule_id]
+        return super().remove_rule(rule_id)
+
+    def candidates(self, matched: Set[int]) -> List[Hashable]:
+        """
+        Select the rules that may match, given the satisfied predicates.
+
+        Args:
+            matched (Set[int]): The slots of the satisfied predicates.
+
+        Returns:
+            List[Hashable]: The IDs of the candidate rules, in insertion order.
+        """
+        candidates = set(self._always_candidates)
+        for slot in matched:
+            candidates.update(self._slot_rules[slot])
+        return sorted(candidates, key=self._rule_order.__getitem__)
+
+    def match(self, data: Dict) -> List[Hashable]:
+        matched = self.index.lookup(data)
+        memo = _IndexedMemo(matched, self._unindexed_slots)
+        return [
+            rule_id for rule_id in self.candidates(matched)
+            if self._rules[rule_id][0](data, memo)
+        ]
+
+    def _predicate_added(self, slot: int) -> None:
+        if not self.index.add(slot, self.predicates[slot]):
+            self._unindexed_slots.add(slot)
+
+    def _predicate_removed(self, slot: int) -> None:
+        if slot in self._unindexed_slots:
+            self._unindexed_slots.discard(slot)
+        else:
+            self.index.remove(slot, self.predicates[slot])
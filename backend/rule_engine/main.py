@@ -4,23 +4,75 @@ FastAPI application for the rule engine.
 This module provides API endpoints for creating, combining, and evaluating rules.
 """
 
+import asyncio
+import base64
 import json
-from typing import Dict, List
-from fastapi import FastAPI, HTTPException, Depends
-from fastapi.responses import JSONResponse
+import logging
+import os
+import threading
+from typing import Dict, Iterator, List, Literal, Optional
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from rule_engine import models, database
-from rule_engine.parser_utils import Parser, tokenize
-from rule_engine.ast_utils import ANDOperator, Condition, Node, AST, OROperator
+from rule_engine.admission_utils import AdmissionController, AdmissionMiddleware
+from rule_engine.parser_utils import parse_rule
+from rule_engine.ast_utils import ANDOperator, Node, AST, combine_nodes
+from rule_engine.bulk_utils import encode_lines_parallel, rule_to_ndjson, stream_chunks
+from rule_engine.cache_utils import rule_cache
+from rule_engine.index_utils import IndexedRuleSet
+from rule_engine.metrics_utils import metrics
+from rule_engine.optimizer_utils import keep_original_order, reorder, simplify
+from rule_engine.schema_utils import schema_from_env
+from rule_engine.serialization_utils import bytes_to_root, dict_to_root, json_to_root, root_to_bytes, root_to_json
+from rule_engine.snapshot_utils import MappedAST, RuleSnapshot, write_snapshot
 
 app = FastAPI()
 
+logger = logging.getLogger(__name__)
+
+# Caps the requests in flight, set by ADMISSION_MAX_IN_FLIGHT and
+# ADMISSION_QUEUE_TIMEOUT. Requests finding no slot within the timeout get
+# a 429. Metrics stay reachable under load.
+admission = AdmissionController.from_env()
+app.add_middleware(AdmissionMiddleware, controller=admission, exempt_paths=("/metrics",))
+
+# Rule set of every stored rule, for /match_rules, and the highest rule ID
+# loaded into it so far. RULESET_COMPACT=1 holds its rules as compact
+# trees, trading matching speed for memory.
+rule_set = IndexedRuleSet(compact=os.getenv('RULESET_COMPACT', '').lower() in ('1', 'true', 'yes'))
+rule_set_last_id = 0
+rule_set_lock = threading.Lock()
+
+# Declared field types, loaded from the file named by RULE_SCHEMA, or None
+# to evaluate rules and records untyped.
+schema = schema_from_env()
+
+# Snapshot of compiled rules, mapped at startup from the file named by
+# RULE_SNAPSHOT if it exists, so that rules are served without querying
+# the database on their first request. Rules updated since the snapshot was
+# written are loaded from the database as before.
+rule_snapshot_path = os.getenv('RULE_SNAPSHOT')
+rule_snapshot: Optional[RuleSnapshot] = None
+# Rules are evaluated straight from the mapped snapshot, shared between the
+# processes mapping it. RULE_SNAPSHOT_COMPILE=1 decodes and compiles them
+# instead when first loaded, for faster evaluation afterwards.
+rule_snapshot_compile = os.getenv('RULE_SNAPSHOT_COMPILE', '').lower() in ('1', 'true', 'yes')
+
 class RuleString(BaseModel):
     """Pydantic model for a rule string."""
     rule: str
     name: str
 
+class RuleUpdate(BaseModel):
+    """Pydantic model for a rule update, optionally expecting a version."""
+    rule: str
+    name: Optional[str] = None
+    version: Optional[int] = None
+
 class RuleList(BaseModel):
     """Pydantic model for a list of rule strings."""
     rules: List[str]
@@ -30,6 +82,17 @@ class EvaluateRequest(BaseModel):
     rule_id: int
     data: Dict
 
+class BatchEvaluateRequest(BaseModel):
+    """Pydantic model for a batch evaluation request."""
+    rule_id: int
+    records: List[Dict]
+    format: Literal["list", "bitmap"] = "list"
+    stream: bool = False
+
+class MatchRequest(BaseModel):
+    """Pydantic model for a request matching a record against all rules."""
+    data: Dict
+
 class ASTNode(BaseModel):
     """Pydantic model for an AST node."""
     node_type: str
@@ -50,101 +113,666 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """
+    Dependency for obtaining an async database session.
+
+    Yields:
+        AsyncSession: SQLAlchemy async database session.
+    """
+    async with models.get_async_sessionmaker()() as db:
+        yield db
+
 @app.post("/create_rule", response_model=ASTNode)
-def create_rule(rule_string: RuleString, db: Session = Depends(get_db)):
+async def create_rule(rule_string: RuleString, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new rule and store it in the database.
 
     Args:
         rule_string (RuleString): The rule string and name.
-        db (Session): The database session.
+        db (AsyncSession): The async database session.
 
     Returns:
         ASTNode: The root node of the created AST.
     """
-    tokens = tokenize(rule_string.rule)
-    parser = Parser(tokens)
     try:
-        root = parser.parse()
+        root = parse_rule(rule_string.rule)
+        if schema is not None:
+            schema.validate(root)
         ast_json = root_to_json(root)
-        database.create_rule(db, rule_string.name, ast_json)
+        await database.create_rule_async(db, rule_string.name, ast_json, root_to_bytes(root))
         return JSONResponse(ast_json)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.put("/rules/{rule_id}")
+async def update_rule(rule_id: int, rule_update: RuleUpdate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Update a rule to a new version.
+
+    The new version replaces the old one in the rule cache and in the rule
+    set of /match_rules in one step, so evaluations see either version as
+    a whole. Only the conditions that changed are re-indexed in the rule set.
+
+    Args:
+        rule_id (int): The ID of the rule.
+        rule_update (RuleUpdate): The new rule string, optionally a new name,
+            and optionally the version the rule is expected to be at.
+        db (AsyncSession): The async database session.
+
+    Returns:
+        Response: The ID, name and version of the rule, and its new AST.
+    """
+    try:
+        root = parse_rule(rule_update.rule)
+        if schema is not None:
+            schema.validate(root)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ast_json = root_to_json(root)
+    db_rule = await db.run_sync(
+        database.update_rule, rule_id, ast_json, root_to_bytes(root),
+        rule_update.name, rule_update.version
+    )
+    if db_rule is None:
+        if await database.get_rule_async(db, rule_id) is None:
+            raise HTTPException(status_code=404, detail="Rule not found")
+        raise HTTPException(status_code=409, detail="Rule is not at the expected version")
+
+    if rule_snapshot is not None:
+        rule_snapshot.discard(rule_id)
+    cache_rule(rule_id, db_rule)
+    # The lock may be held by a match loading many rules, so it is waited
+    # for in the threadpool, off the event loop.
+    await run_in_threadpool(replace_matched_rule, rule_id, db_rule)
+    # The AST is spliced in as stored rather than decoded and encoded
+    # again, which would recurse on deep trees.
+    fields = json.dumps({"id": db_rule.id, "name": db_rule.name, "version": db_rule.version})
+    return Response(content=f'{fields[:-1]}, "ast": {ast_json}}}', media_type="application/json")
+
+def replace_matched_rule(rule_id: int, db_rule: models.Rule) -> None:
+    """
+    Replace a rule in the rule set of /match_rules, if it was loaded into it.
+
+    Args:
+        rule_id (int): The ID of the rule.
+        db_rule (models.Rule): The new version of the rule.
+    """
+    with rule_set_lock:
+        if rule_id <= rule_set_last_id:
+            rule_set.add_rule(rule_id, typed_ast(db_rule))
+
 @app.post("/combine_rules", response_model=ASTNode)
 def combine_rules(rule_list: RuleList):
     """
     Combine multiple rules into a single AST.
 
+    The rules are ANDed together into a balanced tree, which is then
+    simplified to drop conditions repeated across the rules.
+
     Args:
         rule_list (RuleList): The list of rule strings.
 
     Returns:
         ASTNode: The root node of the combined AST.
     """
-    combined_root = None
-    for rule in rule_list.rules:
-        tokens = tokenize(rule)
-        parser = Parser(tokens)
-        root = parser.parse()
-        if combined_root is None:
-            combined_root = root
-        else:
-            combined_root = Node(
-                node_type="operator",
-                left=combined_root,
-                right=root,
-                value=ANDOperator()
-            )
+    try:
+        roots = [parse_rule(rule) for rule in rule_list.rules]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    combined_root = simplify(combine_nodes(roots, ANDOperator))
     return JSONResponse(root_to_json(combined_root))
 
 @app.post("/evaluate_rule")
-def evaluate_rule(request: EvaluateRequest, db: Session = Depends(get_db)):
+async def evaluate_rule(request: EvaluateRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Evaluate a rule against provided data.
 
     Args:
         request (EvaluateRequest): The evaluation request containing rule ID and data.
-        db (Session): The database session.
+        db (AsyncSession): The async database session.
 
     Returns:
         Dict: The evaluation result.
     """
-    db_rule = database.get_rule(db, request.rule_id)
+    ast = await load_rule_async(db, request.rule_id)
+    try:
+        result = ast.evaluate_rule(request.data)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Missing field {e}")
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"result": result}
+
+@app.post("/evaluate_batch")
+async def evaluate_batch(request: BatchEvaluateRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Evaluate a rule against many records in a single request.
+
+    The rule is loaded and compiled once for the whole batch. Results are
+    returned in input order, either as a list of booleans or as a base64
+    encoded bitmap where bit i (LSB first) is the result of record i. With
+    stream set, list results are streamed as NDJSON chunks instead, see
+    stream_results; bitmaps can not be streamed. The records are evaluated
+    in the threadpool, off the event loop.
+
+    Args:
+        request (BatchEvaluateRequest): The rule ID, records and output format.
+        db (AsyncSession): The async database session.
+
+    Returns:
+        Dict: The evaluation results.
+    """
+    if request.stream and request.format == "bitmap":
+        raise HTTPException(status_code=422, detail="Bitmap results can not be streamed")
+    ast = await load_rule_async(db, request.rule_id)
+    if request.stream:
+        return StreamingResponse(
+            stream_results(ast, request.records),
+            media_type="application/x-ndjson"
+        )
+    try:
+        results = await run_in_threadpool(ast.evaluate_many, request.records)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Missing field {e}")
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.format == "bitmap":
+        return {"count": len(results), "bitmap": results_to_bitmap(results)}
+    return {"results": results}
+
+def stream_results(ast: AST, records: List[Dict], chunk_size: int = 1024) -> Iterator[str]:
+    """
+    Evaluate records lazily and yield the results as NDJSON chunks.
+
+    The response status is sent before the records are evaluated, so a
+    record that can not be evaluated ends the stream with an error line,
+    {"error": ..., "offset": ...}, where offset is the index of the first
+    record of the chunk holding it. The results of the previous chunks are
+    valid.
+
+    Args:
+        ast (AST): The compiled AST of the rule.
+        records (List[Dict]): The records to evaluate.
+        chunk_size (int): The number of results per chunk.
+
+    Yields:
+        str: A JSON list of results for each chunk, or the error line,
+            newline terminated.
+    """
+    for start in range(0, len(records), chunk_size):
+        try:
+            chunk = ast.evaluate_many(records[start:start + chunk_size])
+        except KeyError as e:
+            yield json.dumps({"error": f"Missing field {e}", "offset": start}) + "\n"
+            return
+        except (TypeError, ValueError) as e:
+            yield json.dumps({"error": str(e), "offset": start}) + "\n"
+            return
+        yield json.dumps(chunk) + "\n"
+
+def results_to_bitmap(results: List[bool]) -> str:
+    """
+    Pack evaluation results into a base64 encoded bitmap.
+
+    Args:
+        results (List[bool]): The evaluation results.
+
+    Returns:
+        str: The base64 bitmap, bit i (LSB first) holding result i.
+    """
+    bitmap = bytearray((len(results) + 7) // 8)
+    for i, result in enumerate(results):
+        if result:
+            bitmap[i >> 3] |= 1 << (i & 7)
+    return base64.b64encode(bytes(bitmap)).decode("ascii")
+
+@app.post("/match_rules")
+async def match_rules(request: MatchRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Find every stored rule the provided data satisfies.
+
+    Only the rules referencing a condition the data satisfies are
+    evaluated, and conditions shared between rules are evaluated at most once.
+    Stored rules that do not fit the schema, e.g. created before it was
+    set, are logged and left out until they are updated.
+
+    Rules are added and matched in the threadpool, off the event loop, as
+    the first match loads every stored rule.
+
+    Args:
+        request (MatchRequest): The match request containing the data.
+        db (AsyncSession): The async database session.
+
+    Returns:
+        Dict: The IDs of the matching rules.
+    """
+    # Rules created since the last match are fetched without holding the
+    # lock, concurrent requests skipping those another one already added.
+    new_rules = await database.get_rules_async(db, after_id=rule_set_last_id)
+    return await run_in_threadpool(match_record, new_rules, request.data)
+
+def match_record(new_rules: List[models.Rule], data: Dict) -> Dict:
+    """
+    Add new stored rules to the rule set of /match_rules, then match a record.
+
+    Args:
+        new_rules (List[models.Rule]): Rules fetched from the database, in
+            ID order, those already added being skipped.
+        data (Dict): The record.
+
+    Returns:
+        Dict: The IDs of the matching rules.
+
+    Raises:
+        HTTPException: If the record does not fit the schema.
+    """
+    global rule_set_last_id
+    with rule_set_lock:
+        for db_rule in new_rules:
+            if db_rule.id > rule_set_last_id:
+                try:
+                    rule_set.add_rule(db_rule.id, typed_ast(db_rule))
+                except HTTPException as e:
+                    logger.warning("Rule %s is left out of /match_rules: %s", db_rule.id, e.detail)
+                rule_set_last_id = db_rule.id
+        if schema is not None:
+            try:
+                data = schema.coerce_record(data)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        return {"rule_ids": rule_set.match(data)}
+
+@app.post("/rules/bulk")
+async def bulk_create_rules(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Create many rules from an NDJSON request body.
+
+    Each line holds {"name": ..., "rule": ...}, or {"name": ...,
+    "ast_binary": ...} as written by /rules/export. The body is consumed in
+    chunks, each parsed in worker processes and inserted in one transaction.
+
+    Args:
+        request (Request): The request, with an NDJSON body.
+        db (AsyncSession): The async database session.
+
+    Returns:
+        Dict: The number of rules created.
+    """
+    loop = asyncio.get_running_loop()
+    created = 0
+    try:
+        async for chunk in stream_chunks(request.stream()):
+            rows = await loop.run_in_executor(None, encode_lines_parallel, chunk, None, schema)
+            created += await db.run_sync(database.create_rules, rows)
+    except ValueError as e:
+        # Previous chunks are already committed.
+        raise HTTPException(status_code=400, detail=f"{e} ({created} rules created)")
+    return {"created": created}
+
+@app.get("/rules/export")
+def export_rules():
+    """
+    Stream every stored rule as NDJSON, in ID order.
+
+    The output can be imported back with /rules/bulk.
+
+    Returns:
+        StreamingResponse: One JSON object per rule.
+    """
+    return StreamingResponse(stream_rules(), media_type="application/x-ndjson")
+
+def stream_rules() -> Iterator[str]:
+    """
+    Page through the rules table and yield each rule as an NDJSON line.
+
+    The generator holds its own session, as it outlives the request handler.
+
+    Yields:
+        str: The JSON object of each rule, newline terminated.
+    """
+    db = models.SessionLocal()
+    try:
+        for db_rule in database.iter_rules(db):
+            yield rule_to_ndjson(db_rule)
+    finally:
+        db.close()
+
+@app.get("/schema")
+def get_schema():
+    """
+    Report the declared type of each field.
+
+    Returns:
+        Dict: The type name by field, empty when no schema is configured.
+    """
+    return schema.to_dict() if schema is not None else {}
+
+@app.get("/rule_cache/stats")
+def rule_cache_stats():
+    """
+    Report the counters of the compiled-rule cache.
+
+    Returns:
+        Dict: The size, hits, misses and evictions of the cache.
+    """
+    return rule_cache.stats()
+
+@app.post("/rules/snapshot")
+def create_snapshot():
+    """
+    Write every stored rule to the snapshot file named by RULE_SNAPSHOT,
+    replacing the previous snapshot, and serve rules from it.
+
+    Other processes pick the new snapshot up through /rules/snapshot/reload.
+
+    Returns:
+        Dict: The version of the snapshot and the number of rules served from it.
+    """
+    if not rule_snapshot_path:
+        raise HTTPException(status_code=400, detail="RULE_SNAPSHOT is not set")
+    try:
+        write_rule_snapshot(rule_snapshot_path)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=500, detail=f"Could not write the snapshot: {e}")
+    return reload_snapshot()
+
+@app.post("/rules/snapshot/reload")
+def reload_snapshot():
+    """
+    Map the snapshot file named by RULE_SNAPSHOT again, e.g. after another
+    process replaced it.
+
+    The previous snapshot stays mapped until the rules loaded from it are
+    evicted from the rule cache.
+
+    Returns:
+        Dict: The version of the snapshot and the number of rules served from it.
+    """
+    global rule_snapshot
+    if not rule_snapshot_path:
+        raise HTTPException(status_code=400, detail="RULE_SNAPSHOT is not set")
+    try:
+        snapshot = open_rule_snapshot(rule_snapshot_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rule_snapshot = snapshot
+    return {"version": snapshot.version, "rules": len(snapshot)}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Expose the rule cache, snapshot and admission counters and, when RULE_METRICS is
+    enabled, the evaluation profiles of the rules in the Prometheus text format.
+
+    Returns:
+        PlainTextResponse: The metrics.
+    """
+    stats = rule_cache.stats()
+    extra = {
+        "rule_cache_size": ("gauge", "Compiled rules held in the cache.", stats["size"]),
+        "rule_cache_hits_total": ("counter", "Rule cache hits.", stats["hits"]),
+        "rule_cache_misses_total": ("counter", "Rule cache misses.", stats["misses"]),
+        "rule_cache_evictions_total": ("counter", "Rule cache evictions.", stats["evictions"]),
+        "rule_snapshot_version": ("gauge", "Version of the mapped rule snapshot, 0 if none.",
+                                  rule_snapshot.version if rule_snapshot is not None else 0),
+        "rule_snapshot_rules": ("gauge", "Rules served from the snapshot.",
+                                len(rule_snapshot) if rule_snapshot is not None else 0),
+        "admission_in_flight": ("gauge", "Requests in flight.", admission.in_flight),
+        "admission_queued": ("gauge", "Requests waiting for a slot.", admission.queued),
+        "admission_rejected_total": ("counter", "Requests rejected with 429.", admission.rejected),
+    }
+    return PlainTextResponse(
+        metrics.to_prometheus(extra), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@app.get("/rules/{rule_id}/profile")
+def get_rule_profile(rule_id: int):
+    """
+    Report the evaluation profile of a rule.
+
+    Profiles are only recorded when RULE_METRICS is enabled, from the time
+    the rule is loaded into the rule cache.
+
+    Args:
+        rule_id (int): The ID of the rule.
+
+    Returns:
+        Dict: The latency histogram and the statistics of every node.
+    """
+    profile = metrics.get(rule_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No profile recorded for this rule")
+    return profile.to_dict()
+
+def load_rule(db: Session, rule_id: int) -> AST:
+    """
+    Load a compiled rule, from the rule cache, the rule snapshot or else
+    from the database.
+
+    Rules loaded from the database are reordered for cheaper short-circuit
+    evaluation before being compiled.
+
+    Args:
+        db (Session): The database session.
+        rule_id (int): The ID of the rule to load.
+
+    Returns:
+        AST: The compiled AST of the rule.
+
+    Raises:
+        HTTPException: If the rule does not exist.
+    """
+    ast = rule_cache.get(rule_id)
+    if ast is None:
+        ast = snapshot_rule(rule_id)
+    if ast is not None:
+        return ast
+    return cache_rule(rule_id, database.get_rule(db, rule_id))
+
+async def load_rule_async(db: AsyncSession, rule_id: int) -> AST:
+    """
+    Load a compiled rule like load_rule, querying the database without blocking.
+
+    Args:
+        db (AsyncSession): The async database session.
+        rule_id (int): The ID of the rule to load.
+
+    Returns:
+        AST: The compiled AST of the rule.
+
+    Raises:
+        HTTPException: If the rule does not exist.
+    """
+    ast = rule_cache.get(rule_id)
+    if ast is None:
+        ast = snapshot_rule(rule_id)
+    if ast is not None:
+        return ast
+    return cache_rule(rule_id, await database.get_rule_async(db, rule_id))
+
+def snapshot_rule(rule_id: int) -> Optional[AST]:
+    """
+    Load a rule from the rule snapshot and add it to the rule cache.
+
+    The rule is evaluated from the mapped snapshot, in its stored order.
+    Its nodes are only decoded to be compiled like cache_rule does, when
+    RULE_METRICS or RULE_SNAPSHOT_COMPILE is enabled.
+
+    Args:
+        rule_id (int): The ID of the rule.
+
+    Returns:
+        Optional[AST]: The rule, or None if the snapshot does not hold its
+            current version.
+    """
+    snapshot = rule_snapshot
+    if snapshot is None:
+        return None
+    entry = snapshot.get(rule_id)
+    if entry is None:
+        return None
+    tree, version = entry
+    ast = MappedAST(tree)
+    if metrics.enabled or rule_snapshot_compile:
+        compile_rule(rule_id, ast)
+    elif schema is not None:
+        ast.compiled = schema.bind(ast.compiled)
+    if not rule_cache.put(rule_id, ast, version):
+        # The cache knows of a newer version of the rule.
+        snapshot.discard(rule_id)
+        return None
+    return ast
+
+def cache_rule(rule_id: int, db_rule: models.Rule) -> AST:
+    """
+    Compile a stored rule and add it to the rule cache.
+
+    With a schema, the literals of the rule are converted once, here, and
+    records are converted in a single pass before each evaluation, see
+    compile_rule.
+
+    Args:
+        rule_id (int): The ID of the rule.
+        db_rule (models.Rule): The stored rule, or None if it does not exist.
+
+    Returns:
+        AST: The compiled AST of the rule.
+
+    Raises:
+        HTTPException: If the rule does not exist or does not fit the schema.
+    """
     if db_rule is None:
         raise HTTPException(status_code=404, detail="Rule not found")
-    ast = json_to_ast(db_rule.ast_json)
-    result = ast.evaluate_rule(request.data)
-    return {"result": result}
+    ast = typed_ast(db_rule)
+    compile_rule(rule_id, ast)
+    rule_cache.put(rule_id, ast, db_rule.version)
+    return ast
+
+def compile_rule(rule_id: int, ast: AST) -> None:
+    """
+    Reorder a typed rule for cheaper short-circuit evaluation and compile it.
+
+    Records missing a field the reordered rule reads, or holding one it can
+    not compare, get the result of the original order, so reordering never
+    turns a result into a KeyError or TypeError.
+    With a schema, records are converted before each evaluation.
+
+    Args:
+        rule_id (int): The ID of the rule.
+        ast (AST): The AST of the rule, with the literals of the schema types.
+    """
+    original = ast.root
+    ast.root = reorder(original)
+    if metrics.enabled:
+        ast.compiled = metrics.compile(rule_id, ast.root)
+    else:
+        ast.compile()
+    ast.compiled = keep_original_order(ast.compiled, original)
+    if schema is not None:
+        ast.compiled = schema.bind(ast.compiled)
+
+def write_rule_snapshot(path: str) -> int:
+    """
+    Write every stored rule to a snapshot file, typed as cache_rule does.
+
+    Rules are written in their stored order, which they are evaluated in
+    from the snapshot, so that records missing a field get the same result
+    as from the database.
+
+    Args:
+        path (str): The snapshot file.
+
+    Returns:
+        int: The version of the snapshot.
+
+    Raises:
+        HTTPException: If a rule does not fit the schema.
+    """
+    db = models.SessionLocal()
+    try:
+        return write_snapshot(path, (
+            (db_rule.id, db_rule.version, typed_ast(db_rule).root)
+            for db_rule in database.iter_rules(db)
+        ))
+    finally:
+        db.close()
 
-def root_to_json(root: Node) -> str:
+def open_rule_snapshot(path: str) -> RuleSnapshot:
     """
-    Convert an AST root node to JSON.
+    Map a snapshot file, discarding the rules updated or deleted since it
+    was written.
 
     Args:
-        root (Node): The root node of the AST.
+        path (str): The snapshot file.
 
     Returns:
-        str: The JSON representation of the AST.
+        RuleSnapshot: The snapshot.
+
+    Raises:
+        ValueError: If the file is not a valid snapshot.
+    """
+    snapshot = RuleSnapshot.open(path)
+    db = models.SessionLocal()
+    try:
+        snapshot.discard_stale(database.get_rule_versions(db))
+    finally:
+        db.close()
+    return snapshot
+
+def typed_ast(db_rule: models.Rule) -> AST:
+    """
+    Convert a stored rule to an AST with its literals of the schema types.
+
+    Args:
+        db_rule (models.Rule): The stored rule.
+
+    Returns:
+        AST: The AST object.
+
+    Raises:
+        HTTPException: If the rule no longer fits the schema.
     """
-    if root is None:
-        return ""
-    return json.dumps(root, default=lambda o: o.__dict__)
+    ast = rule_to_ast(db_rule)
+    if schema is not None:
+        try:
+            ast.root = schema.coerce_literals(ast.root)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Rule {db_rule.id} does not fit the schema: {e}")
+    return ast
+
+def rule_to_ast(db_rule: models.Rule) -> AST:
+    """
+    Convert a stored rule to an AST.
+
+    The compact binary representation is used when the rule has one, else
+    the AST is rebuilt from its JSON.
+
+    Args:
+        db_rule (models.Rule): The stored rule.
+
+    Returns:
+        AST: The AST object.
+    """
+    if db_rule.ast_binary:
+        return AST(bytes_to_root(db_rule.ast_binary))
+    return json_to_ast(db_rule.ast_json)
 
 def json_to_ast(json_str: str) -> AST:
     """
     Convert a JSON string to an AST.
 
+    Trees of any depth are supported.
+
     Args:
         json_str (str): The JSON string representing the AST.
 
     Returns:
         AST: The AST object.
     """
-    data = json.loads(json_str)
-    root = dict_to_node(data)
-    return AST(root)
+    return AST(json_to_root(json_str))
 
 def dict_to_node(data: dict) -> Node:
     """
@@ -156,24 +784,10 @@ def dict_to_node(data: dict) -> Node:
     Returns:
         Node: The AST node.
     """
-    if data is None:
-        return None
-    node = Node(node_type=data['node_type'])
-    node.left = dict_to_node(data.get('left'))
-    node.right = dict_to_node(data.get('right'))
-    if data['node_type'] == 'operand':
-        node.value = Condition(
-            lvariable=data['value']['lvariable'],
-            rvalue=data['value']['rvalue'],
-            comparison_type=data['value']['comparison_type']
-        )
-    else:
-        operator = data['value']
-        if operator == 'ANDOperator':
-            node.value = ANDOperator()
-        elif operator == 'OROperator':
-            node.value = OROperator()
-    return node
+    return dict_to_root(data)
+
+if rule_snapshot_path and os.path.exists(rule_snapshot_path):
+    rule_snapshot = open_rule_snapshot(rule_snapshot_path)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,340 @@
+"""
+Opt-in profiling of rule evaluation.
+
+When metrics are enabled, rules are compiled with instrumented closures that
+count, for every node of the tree, how often it is evaluated, how often it
+is true and, for AND/OR nodes, how often the right operand is skipped by
+short-circuiting. The latency of every evaluation of the rule is kept in a
+histogram. When disabled, rules are compiled as usual and nothing is
+recorded, so there is no overhead.
+
+Counters are updated without locking, so concurrent evaluations of the same
+rule may lose the odd increment.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+from rule_engine.ast_utils import (Node, ANDOperator, OROperator, NOTOperator, MAX_COMPILED_DEPTH, compile_condition,
+                                   compile_node, tree_depth)
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2, 0.1)
+
+
+class Histogram:
+    """
+    A cumulative histogram of observed values, as in Prometheus.
+
+    Attributes:
+        bounds (Tuple[float, ...]): The upper bounds of the buckets.
+        counts (List[int]): The number of observations per bucket, the last
+            one counting those above every bound.
+        sum (float): The sum of the observations.
+        count (int): The number of observations.
+    """
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """
+        Record an observation.
+
+        Args:
+            value (float): The observed value.
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        Return the cumulative count of observations below each bound.
+
+        Returns:
+            List[Tuple[str, int]]: The bound, "+Inf" for the last bucket, and
+                the number of observations less than or equal to it.
+        """
+        total = 0
+        buckets = []
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            total += count
+            buckets.append(('+Inf' if bound == float('inf') else repr(bound), total))
+        return buckets
+
+
+def describe_node(node: Node) -> str:
+    """
+    Describe a node for profiles, e.g. "age gt 30", "dept in ['HR', 'Sales']"
+    or "AND".
+
+    Args:
+        node (Node): The node.
+
+    Returns:
+        str: The description.
+    """
+    if node.node_type == 'operand':
+        condition = node.value
+        rvalue = condition.rvalue
+        if isinstance(rvalue, frozenset):
+            rvalue = sorted(rvalue, key=lambda value: (type(value).__name__, value))
+        return f"{condition.lvariable} {condition.comparison_type} {rvalue!r}"
+    if isinstance(node.value, ANDOperator):
+        return 'AND'
+    if isinstance(node.value, OROperator):
+        return 'OR'
+    if isinstance(node.value, NOTOperator):
+        return 'NOT'
+    return type(node.value).__name__
+
+
+def _short_circuits(node: Node) -> bool:
+    """Check whether a node is an AND/OR node, which may skip its right operand."""
+    return node.node_type == 'operator' and isinstance(node.value, (ANDOperator, OROperator))
+
+
+class RuleProfile:
+    """
+    Evaluation statistics of one rule.
+
+    Nodes are numbered in preorder, the root being node 0.
+
+    Attributes:
+        rule_id (Hashable): The ID of the rule.
+        nodes (List[Node]): The nodes of the rule, by number.
+        evaluations (List[int]): How often each node was evaluated.
+        true_counts (List[int]): How often each node was true.
+        short_circuits (List[int]): How often each AND/OR node skipped its
+            right operand.
+        latency (Histogram): The latency of evaluations of the whole rule.
+    """
+    def __init__(self, rule_id: Hashable, root: Node):
+        self.rule_id = rule_id
+        self.root = root
+        self.nodes: List[Node] = []
+        stack = [root] if root is not None else []
+        while stack:
+            node = stack.pop()
+            self.nodes.append(node)
+            if node.node_type == 'operator':
+                stack.extend(child for child in (node.right, node.left) if child is not None)
+        self.evaluations = [0] * len(self.nodes)
+        self.true_counts = [0] * len(self.nodes)
+        self.short_circuits = [0] * len(self.nodes)
+        self.latency = Histogram()
+
+    def compile(self) -> Callable[[Dict], bool]:
+        """
+        Compile the rule into an instrumented callable.
+
+        The callable evaluates the rule like compile_node, recording the
+        statistics of every node and the latency of the whole evaluation.
+        Rules deeper than MAX_COMPILED_DEPTH are evaluated without
+        recursion, recording only the latency.
+
+        Returns:
+            Callable[[Dict], bool]: A function evaluating the rule for a record.
+        """
+        if self.root is None:
+            evaluate = lambda data: True
+        elif tree_depth(self.root) > MAX_COMPILED_DEPTH:
+            evaluate = compile_node(self.root)
+        else:
+            evaluate = self._compile_node(iter(range(len(self.nodes))), self.root)
+        observe = self.latency.observe
+        perf_counter = time.perf_counter
+
+        def timed(data):
+            start = perf_counter()
+            try:
+                return evaluate(data)
+            finally:
+                observe(perf_counter() - start)
+        return timed
+
+    def _compile_node(self, numbers, node: Node) -> Callable[[Dict], bool]:
+        """Compile a node, taking node numbers in preorder."""
+        index = next(numbers)
+        evaluations = self.evaluations
+        true_counts = self.true_counts
+
+        if node.node_type == 'operand':
+            condition = compile_condition(node.value)
+
+            def evaluate(data):
+                evaluations[index] += 1
+                result = condition(data)
+                if result:
+                    true_counts[index] += 1
+                return result
+            return evaluate
+
+        if isinstance(node.value, NOTOperator):
+            operand = self._compile_node(numbers, node.left)
+
+            def evaluate(data):
+                evaluations[index] += 1
+                result = not operand(data)
+                if result:
+                    true_counts[index] += 1
+                return result
+            return evaluate
+
+        if not isinstance(node.value, (ANDOperator, OROperator)):
+            # Unknown operator, counted as a whole.
+            def evaluate(data):
+                evaluations[index] += 1
+                result = node.evaluate(data)
+                if result:
+                    true_counts[index] += 1
+                return result
+            return evaluate
+
+        left = self._compile_node(numbers, node.left)
+        right = self._compile_node(numbers, node.right)
+        short_circuits = self.short_circuits
+        decisive = not isinstance(node.value, ANDOperator)
+
+        def evaluate(data):
+            evaluations[index] += 1
+            if bool(left(data)) is decisive:
+                short_circuits[index] += 1
+                result = decisive
+            else:
+                result = right(data)
+            if result:
+                true_counts[index] += 1
+            return result
+        return evaluate
+
+    def to_dict(self) -> Dict:
+        """
+        Summarize the profile.
+
+        Returns:
+            Dict: The latency histogram and, for each node, its description,
+                evaluation count, true rate and short-circuit rate.
+        """
+        nodes = []
+        for index, node in enumerate(self.nodes):
+            evaluations = self.evaluations[index]
+            entry = {
+                'node': index,
+                'description': describe_node(node),
+                'evaluations': evaluations,
+                'true_rate': self.true_counts[index] / evaluations if evaluations else None,
+            }
+            if _short_circuits(node):
+                entry['short_circuit_rate'] = self.short_circuits[index] / evaluations if evaluations else None
+            nodes.append(entry)
+        return {
+            'rule_id': self.rule_id,
+            'latency': {
+                'count': self.latency.count,
+                'sum': self.latency.sum,
+                'buckets': dict(self.latency.cumulative()),
+            },
+            'nodes': nodes,
+        }
+
+
+class MetricsRegistry:
+    """
+    The profiles of all instrumented rules.
+
+    Attributes:
+        enabled (bool): Whether rules should be compiled with instrumentation.
+    """
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._profiles: Dict[Hashable, RuleProfile] = {}
+        self._lock = threading.Lock()
+
+    def compile(self, rule_id: Hashable, root: Node) -> Callable[[Dict], bool]:
+        """
+        Compile a rule with instrumentation, starting a new profile for it.
+
+        Args:
+            rule_id (Hashable): The ID of the rule.
+            root (Node): The root node of the rule.
+
+        Returns:
+            Callable[[Dict], bool]: The instrumented function evaluating the rule.
+        """
+        profile = RuleProfile(rule_id, root)
+        with self._lock:
+            self._profiles[rule_id] = profile
+        return profile.compile()
+
+    def get(self, rule_id: Hashable) -> Optional[RuleProfile]:
+        """
+        Return the profile of a rule.
+
+        Args:
+            rule_id (Hashable): The ID of the rule.
+
+        Returns:
+            Optional[RuleProfile]: The profile, or None if the rule was not
+                compiled with instrumentation.
+        """
+        with self._lock:
+            return self._profiles.get(rule_id)
+
+    def clear(self) -> None:
+        """Drop every profile."""
+        with self._lock:
+            self._profiles.clear()
+
+    def to_prometheus(self, extra: Optional[Dict[str, Tuple[str, str, float]]] = None) -> str:
+        """
+        Render every profile in the Prometheus text exposition format.
+
+        Args:
+            extra (Optional[Dict[str, Tuple[str, str, float]]]): Additional
+                metrics without labels, as name: (type, help, value).
+
+        Returns:
+            str: The metrics.
+        """
+        with self._lock:
+            profiles = list(self._profiles.values())
+
+        lines = []
+        for name, (metric_type, help_text, value) in (extra or {}).items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {value}"]
+
+        lines += [
+            "# HELP rule_evaluation_seconds Latency of rule evaluations.",
+            "# TYPE rule_evaluation_seconds histogram",
+        ]
+        for profile in profiles:
+            labels = f'rule_id="{profile.rule_id}"'
+            for bound, count in profile.latency.cumulative():
+                lines.append(f'rule_evaluation_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"rule_evaluation_seconds_sum{{{labels}}} {profile.latency.sum}")
+            lines.append(f"rule_evaluation_seconds_count{{{labels}}} {profile.latency.count}")
+
+        counters = (
+            ('rule_node_evaluations_total', 'Evaluations of rule nodes.', 'evaluations'),
+            ('rule_node_true_total', 'Evaluations of rule nodes that were true.', 'true_counts'),
+            ('rule_node_short_circuits_total', 'Evaluations of AND/OR nodes that skipped their right operand.',
+             'short_circuits'),
+        )
+        for name, help_text, attribute in counters:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for profile in profiles:
+                for index, value in enumerate(getattr(profile, attribute)):
+                    if attribute == 'short_circuits' and not _short_circuits(profile.nodes[index]):
+                        continue
+                    lines.append(f'{name}{{rule_id="{profile.rule_id}",node="{index}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+# Shared registry, enabled with RULE_METRICS=1.
+metrics = MetricsRegistry(enabled=os.getenv('RULE_METRICS', '').lower() in ('1', 'true', 'yes'))
@@ -1,23 +1,67 @@
 """
 SQLAlchemy models and database setup for the rule engine.
 
-This module defines the Rule model and sets up the database connection.
+This module defines the Rule model and sets up the database connection,
+both synchronous and, lazily, asynchronous. Pooling is configured through
+DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT and DB_POOL_PRE_PING, and
+DATABASE_URL may override the Postgres URL, e.g. with sqlite:///rules.db
+as a local stand-in.
 """
 
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
-from sqlalchemy import Column, Integer, String, Text, create_engine
+from sqlalchemy import Column, Integer, LargeBinary, String, Text, create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 load_dotenv()
 
 # Database URL from environment variables
-DATABASE_URL = (
+DATABASE_URL = os.getenv('DATABASE_URL') or (
     f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
     f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
 )
 
+# Async drivers by database backend
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+def async_database_url(url: str) -> str:
+    """
+    Convert a database URL to use the async driver of its backend.
+
+    Args:
+        url (str): The database URL.
+
+    Returns:
+        str: The database URL with an async driver.
+    """
+    scheme, rest = url.split('://', 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+def pool_options(url: str) -> dict:
+    """
+    Build the connection pool options from environment variables.
+
+    SQLite does not use a sized connection pool, so only pre-ping applies.
+
+    Args:
+        url (str): The database URL.
+
+    Returns:
+        dict: Keyword arguments for create_engine and create_async_engine.
+    """
+    options = {'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '').lower() in ('1', 'true', 'yes')}
+    if not url.startswith('sqlite'):
+        options['pool_size'] = int(os.getenv('DB_POOL_SIZE') or 5)
+        options['max_overflow'] = int(os.getenv('DB_MAX_OVERFLOW') or 10)
+        options['pool_timeout'] = float(os.getenv('DB_POOL_TIMEOUT') or 30)
+    return options
+
 Base = declarative_base()
 
 class Rule(Base):
@@ -28,18 +72,47 @@ class Rule(Base):
         id (int): Primary key.
         name (str): Name of the rule.
         ast_json (str): JSON representation of the AST.
+        ast_binary (bytes): Compact binary representation of the AST, see
+            rule_engine.serialization_utils.
+        version (int): Version of the rule, incremented on every update.
     """
     __tablename__ = "rules"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     ast_json = Column(Text, nullable=False)
+    ast_binary = Column(LargeBinary, nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default='1')
 
 # Create the database engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
 
 # Create a configured "Session" class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+@lru_cache(maxsize=None)
+def get_async_engine() -> AsyncEngine:
+    """
+    Create the async database engine on first use.
+
+    The async driver, asyncpg, or aiosqlite for SQLite, is loaded then, on
+    the first request served by the API.
+
+    Returns:
+        AsyncEngine: The async database engine.
+    """
+    url = async_database_url(DATABASE_URL)
+    return create_async_engine(url, **pool_options(url))
+
+@lru_cache(maxsize=None)
+def get_async_sessionmaker() -> async_sessionmaker:
+    """
+    Create the configured "AsyncSession" class on first use.
+
+    Returns:
+        async_sessionmaker: The factory of async sessions.
+    """
+    return async_sessionmaker(bind=get_async_engine(), autoflush=False, expire_on_commit=False)
+
 # Create all tables in the database
 Base.metadata.create_all(bind=engine)
@@ -0,0 +1,538 @@
+"""
+Optimization passes over rule ASTs.
+
+This module provides a cost-based pass that reorders the children of AND and
+OR operators, so that cheap predicates likely to decide the result are
+evaluated first and short-circuiting skips the rest of the work, and a pass
+that removes duplicate and redundant subtrees.
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from rule_engine.ast_utils import (Node, Condition, Operator, ANDOperator, OROperator, NOTOperator, combine_nodes,
+                                   evaluate_tree, flatten)
+from rule_engine.ruleset_utils import condition_key
+
+# Factoring simplifies the shared and remaining operands again, which may
+# factor them in turn. Past this many nested factorings, chains are left
+# unfactored rather than recursing any deeper.
+_MAX_FACTORING = 64
+
+# Static probability of a condition being true, by comparison type.
+DEFAULT_SELECTIVITY = {
+    'gt': 0.5,
+    'lt': 0.5,
+    'eq': 0.1,
+    'ge': 0.5,
+    'le': 0.5,
+    'ne': 0.9,
+    'in': 0.2,
+    'not_in': 0.8,
+    'between': 0.25,
+}
+
+
+class SelectivityStats:
+    """
+    Observed true/false counts of conditions.
+
+    Attributes:
+        counts (Dict[Tuple, List[int]]): True and false counts by condition key.
+    """
+    def __init__(self):
+        self.counts: Dict[Tuple, List[int]] = {}
+
+    def record(self, condition: Condition, result: bool) -> None:
+        """
+        Record the outcome of evaluating a condition.
+
+        Args:
+            condition (Condition): The condition.
+            result (bool): The result of the evaluation.
+        """
+        counts = self.counts.setdefault(condition_key(condition), [0, 0])
+        counts[0 if result else 1] += 1
+
+    def observe(self, root: Node, records: Iterable[Dict]) -> None:
+        """
+        Evaluate every condition of a tree against sample records.
+
+        Conditions are evaluated regardless of short-circuiting, so that the
+        statistics are not biased by the current order of the tree. Records
+        missing a field are skipped for that field.
+
+        Args:
+            root (Node): The root node of the tree.
+            records (Iterable[Dict]): The sample records.
+        """
+        conditions = [node.value for node in _operands(root)]
+        for data in records:
+            for condition in conditions:
+                if condition.lvariable in data:
+                    self.record(condition, condition.evaluate(data[condition.lvariable]))
+
+    def selectivity(self, condition: Condition) -> Optional[float]:
+        """
+        Return the observed probability of a condition being true.
+
+        Args:
+            condition (Condition): The condition.
+
+        Returns:
+            Optional[float]: The probability, or None if never observed.
+        """
+        counts = self.counts.get(condition_key(condition))
+        if not counts:
+            return None
+        return counts[0] / (counts[0] + counts[1])
+
+
+def condition_cost(condition: Condition) -> float:
+    """
+    Estimate the relative cost of evaluating a condition.
+
+    Numeric comparisons are cheaper than string comparisons, set membership
+    is a single hash lookup whatever the size of the set, and other
+    literals, e.g. the bounds of 'between', are assumed to be the most
+    expensive.
+
+    Args:
+        condition (Condition): The condition.
+
+    Returns:
+        float: The relative cost.
+    """
+    rvalue = condition.rvalue
+    if isinstance(rvalue, (int, float)):
+        return 1.0
+    if isinstance(rvalue, str):
+        return 1.5 + len(rvalue) / 64
+    if isinstance(rvalue, frozenset):
+        return 1.5
+    return 2.0
+
+
+def condition_selectivity(condition: Condition, stats: Optional[SelectivityStats] = None) -> float:
+    """
+    Estimate the probability of a condition being true.
+
+    Args:
+        condition (Condition): The condition.
+        stats (Optional[SelectivityStats]): Observed statistics, preferred
+            over the static estimate when available.
+
+    Returns:
+        float: The probability.
+    """
+    if stats is not None:
+        observed = stats.selectivity(condition)
+        if observed is not None:
+            return observed
+    # Unsupported comparison types always evaluate to False.
+    return DEFAULT_SELECTIVITY.get(condition.comparison_type, 0.0)
+
+
+def reorder(root: Node, stats: Optional[SelectivityStats] = None) -> Node:
+    """
+    Reorder the children of AND/OR operators by expected cost.
+
+    Chains of the same operator are flattened and their operands sorted so
+    that, for AND, operands with the lowest cost per chance of being False
+    come first, and for OR, those with the lowest cost per chance of being
+    True, which minimizes the expected evaluation cost under independence.
+    The chain is then rebuilt as a balanced tree keeping that order. The
+    input tree is not modified.
+
+    Reordering does not change the result of a rule for records holding
+    every field it references, with values comparable to its literals. For
+    other records, the reordered rule may read a missing or mistyped field
+    the original order short-circuited past, see keep_original_order.
+
+    Args:
+        root (Node): The root node of the tree.
+        stats (Optional[SelectivityStats]): Observed selectivity statistics.
+
+    Returns:
+        Node: The root node of the reordered tree.
+    """
+    if root is None:
+        return None
+    return _reorder_node(root, stats)[0]
+
+
+def keep_original_order(evaluate: Callable[[Dict], bool], root: Node) -> Callable[[Dict], bool]:
+    """
+    Wrap a rule compiled from a reordered tree so that records missing a
+    field, or holding one that can not be compared to its literal, get the
+    result of the original order.
+
+    When the reordered rule raises KeyError or TypeError, the record is
+    evaluated again in the original order, which returns its result or
+    raises its own error. Records the reordered rule evaluates without error
+    get the same result either way, so only these records pay for the
+    second evaluation.
+
+    Args:
+        evaluate (Callable[[Dict], bool]): The compiled reordered rule.
+        root (Node): The root node of the rule, in its original order.
+
+    Returns:
+        Callable[[Dict], bool]: The wrapped function.
+    """
+    def evaluate_in_order(data):
+        try:
+            return evaluate(data)
+        except (KeyError, TypeError):
+            return evaluate_tree(root, data)
+    return evaluate_in_order
+
+
+def _reorder_node(root: Node, stats: Optional[SelectivityStats]) -> Tuple[Node, float, float]:
+    """
+    Reorder a subtree, returning it with its expected cost and probability.
+
+    The tree is walked in post-order with an explicit stack, so trees of any
+    depth are supported.
+
+    Args:
+        root (Node): The root node of the subtree.
+        stats (Optional[SelectivityStats]): Observed selectivity statistics.
+
+    Returns:
+        Tuple[Node, float, float]: The reordered subtree, its expected cost
+            and its probability of being true.
+    """
+    results: List[Tuple[Node, float, float]] = []
+    # Each entry holds a node and, once they are pushed, its children.
+    stack: List[Tuple[Node, Optional[List[Node]]]] = [(root, None)]
+    while stack:
+        node, children = stack.pop()
+        if children is None:
+            if node.node_type == 'operand':
+                results.append((node, condition_cost(node.value), condition_selectivity(node.value, stats)))
+                continue
+            operator = node.value
+            if isinstance(operator, NOTOperator):
+                children = [node.left]
+            elif isinstance(operator, (ANDOperator, OROperator)):
+                children = flatten(node, type(operator))
+            else:
+                results.append((node, 1.0, 0.5))
+                continue
+            stack.append((node, children))
+            stack.extend((child, None) for child in reversed(children))
+            continue
+
+        operands = results[len(results) - len(children):]
+        del results[len(results) - len(children):]
+        results.append(_reorder_operands(node.value, operands))
+    return results[0]
+
+
+def _reorder_operands(operator: Operator, operands: List[Tuple[Node, float, float]]) -> Tuple[Node, float, float]:
+    """
+    Combine the reordered operands of a NOT, AND or OR node.
+
+    Args:
+        operator (Operator): The operator of the node.
+        operands (List[Tuple[Node, float, float]]): The reordered operands,
+            with their expected cost and probability, in their original order.
+
+    Returns:
+        Tuple[Node, float, float]: The reordered node, its expected cost and
+            its probability of being true.
+    """
+    if isinstance(operator, NOTOperator):
+        child, cost, probability = operands[0]
+        return Node("operator", left=child, value=operator), cost, 1.0 - probability
+
+    operator_class = type(operator)
+    if operator_class is ANDOperator:
+        operands.sort(key=lambda item: _rank(item[1], 1.0 - item[2]))
+    else:
+        operands.sort(key=lambda item: _rank(item[1], item[2]))
+
+    _, cost, probability = operands[0]
+    for _, child_cost, child_probability in operands[1:]:
+        if operator_class is ANDOperator:
+            cost += probability * child_cost
+            probability *= child_probability
+        else:
+            cost += (1.0 - probability) * child_cost
+            probability = 1.0 - (1.0 - probability) * (1.0 - child_probability)
+    combined = combine_nodes([item[0] for item in operands], operator_class)
+    return combined, cost, probability
+
+
+def simplify(root: Node) -> Node:
+    """
+    Canonicalize and simplify an AND/OR tree.
+
+    Nested chains of the same operator are flattened, and in each chain:
+
+    - duplicate operands are removed, comparing subtrees structurally with
+      AND/OR operands taken as unordered sets,
+    - 'gt'/'lt' conditions on the same field are folded into the tightest
+      one, e.g. age > 30 AND age > 40 becomes age > 40, and the loosest one
+      under OR,
+    - operands absorbed by another one are removed, e.g. a AND (a OR b)
+      becomes a,
+    - operands common to every branch are factored out, e.g.
+      (a AND b) OR (a AND c) becomes a AND (b OR c).
+
+    The operand of a NOT is simplified too, and double negations removed.
+
+    Identical subtrees are hash-consed, so the result is a DAG in which each
+    distinct subtree is a single Node shared by all its parents. The input
+    tree is not modified, but shared nodes of the result must not be
+    modified in place.
+
+    Args:
+        root (Node): The root node of the tree.
+
+    Returns:
+        Node: The root node of the simplified tree.
+    """
+    if root is None:
+        return None
+    return _Simplifier().simplify(root)
+
+
+class _Simplifier:
+    """
+    State of one simplify pass: structural keys and hash-consed nodes.
+    """
+    def __init__(self):
+        # Keyed by id, holding the node so that the id is not reused.
+        self.keys: Dict[int, Tuple[Node, Tuple]] = {}
+        self.nodes: Dict[Tuple, Node] = {}
+        # Number of nested factor calls.
+        self.factoring = 0
+
+    def key(self, node: Node) -> Tuple:
+        """
+        Return the structural key of a simplified node.
+
+        The key of an operator node refers to its operands by the id of
+        their shared node, so keys stay flat whatever the depth of the tree,
+        and are computed with an explicit stack rather than recursion.
+        """
+        entry = self.keys.get(id(node))
+        if entry is not None:
+            return entry[1]
+        stack: List[Tuple[Node, Optional[List[Node]]]] = [(node, None)]
+        while stack:
+            current, children = stack.pop()
+            if id(current) in self.keys:
+                continue
+            if children is None:
+                if current.node_type == 'operand':
+                    self.keys[id(current)] = (current, ('operand', condition_key(current.value)))
+                    continue
+                if isinstance(current.value, NOTOperator):
+                    children = [current.left]
+                elif isinstance(current.value, (ANDOperator, OROperator)):
+                    children = flatten(current, type(current.value))
+                else:
+                    self.keys[id(current)] = (current, ('node', id(current)))
+                    continue
+                stack.append((current, children))
+                stack.extend((child, None) for child in children if id(child) not in self.keys)
+                continue
+
+            operands = [id(self.nodes.setdefault(self.keys[id(child)][1], child)) for child in children]
+            if isinstance(current.value, NOTOperator):
+                key = ('NOT', operands[0])
+            else:
+                key = (type(current.value).__name__, frozenset(operands))
+            self.keys[id(current)] = (current, key)
+        return self.keys[id(node)][1]
+
+    def intern(self, node: Node) -> Node:
+        """Return the shared node structurally identical to a node."""
+        return self.nodes.setdefault(self.key(node), node)
+
+    def simplify(self, root: Node) -> Node:
+        """
+        Simplify a tree, returning its shared root node.
+
+        The tree is walked in post-order with an explicit stack, so trees of
+        any depth are supported.
+        """
+        results: List[Node] = []
+        # Each entry holds a node and, once they are pushed, its children.
+        stack: List[Tuple[Node, Optional[List[Node]]]] = [(root, None)]
+        while stack:
+            node, children = stack.pop()
+            if children is None:
+                if node.node_type == 'operator' and isinstance(node.value, NOTOperator):
+                    children = [node.left]
+                elif node.node_type == 'operator' and isinstance(node.value, (ANDOperator, OROperator)):
+                    children = flatten(node, type(node.value))
+                else:
+                    results.append(self.intern(node))
+                    continue
+                stack.append((node, children))
+                stack.extend((child, None) for child in reversed(children))
+                continue
+
+            operands = results[len(results) - len(children):]
+            del results[len(results) - len(children):]
+            if isinstance(node.value, NOTOperator):
+                operand = operands[0]
+                if _is_operator(operand, NOTOperator):
+                    results.append(operand.left)
+                else:
+                    results.append(self.intern(Node("operator", left=operand, value=node.value)))
+            else:
+                results.append(self.build(operands, type(node.value)))
+        return results[0]
+
+    def build(self, operands: List[Node], operator_class: type) -> Node:
+        """Simplify the operands of a chain and combine them."""
+        dual_class = OROperator if operator_class is ANDOperator else ANDOperator
+
+        operands = [child for operand in operands for child in flatten(operand, operator_class)]
+        operands = self.deduplicate(operands)
+        operands = self.fold_ranges(operands, operator_class)
+
+        # Absorption: a AND (a OR b) is a, a OR (a AND b) is a.
+        keys = {self.key(operand) for operand in operands}
+        operands = [
+            operand for operand in operands
+            if not (_is_operator(operand, dual_class) and any(
+                self.key(child) in keys for child in flatten(operand, dual_class)
+            ))
+        ]
+
+        if (len(operands) > 1 and self.factoring < _MAX_FACTORING
+                and all(_is_operator(operand, dual_class) for operand in operands)):
+            self.factoring += 1
+            try:
+                factored = self.factor(operands, operator_class, dual_class)
+            finally:
+                self.factoring -= 1
+            if factored is not None:
+                return factored
+
+        return self.intern(combine_nodes(operands, operator_class))
+
+    def deduplicate(self, operands: List[Node]) -> List[Node]:
+        """Remove structurally identical operands, keeping the first one."""
+        seen = set()
+        unique = []
+        for operand in operands:
+            key = self.key(operand)
+            if key not in seen:
+                seen.add(key)
+                unique.append(operand)
+        return unique
+
+    def fold_ranges(self, operands: List[Node], operator_class: type) -> List[Node]:
+        """Keep a single 'gt' and 'lt' condition per field and literal kind."""
+        tightest = {}
+        for operand in operands:
+            key = _range_key(operand)
+            if key is None:
+                continue
+            current = tightest.get(key)
+            if current is None or _tighter(operand.value, current.value, operator_class):
+                tightest[key] = operand
+
+        folded = []
+        for operand in operands:
+            key = _range_key(operand)
+            if key is None:
+                folded.append(operand)
+            elif key in tightest:
+                folded.append(tightest.pop(key))
+        return folded
+
+    def factor(self, operands: List[Node], operator_class: type, dual_class: type) -> Optional[Node]:
+        """
+        Factor the operands shared by every branch out of a chain.
+
+        Each operand is a chain of the dual operator, e.g. for an OR chain of
+        ANDs, (a AND b) OR (a AND c) is rewritten to a AND (b OR c).
+
+        Returns:
+            Optional[Node]: The factored node, or None if nothing is shared.
+        """
+        branches = [flatten(operand, dual_class) for operand in operands]
+        common = set.intersection(*({self.key(child) for child in branch} for branch in branches))
+        if not common:
+            return None
+
+        shared = [child for child in branches[0] if self.key(child) in common]
+        remainders = []
+        for branch in branches:
+            remainder = [child for child in branch if self.key(child) not in common]
+            if not remainder:
+                # One branch is exactly the shared part, which absorbs the rest.
+                return self.build(shared, dual_class)
+            remainders.append(combine_nodes(remainder, dual_class))
+        rest = self.build(remainders, operator_class)
+        return self.build(shared + flatten(rest, dual_class), dual_class)
+
+
+def _is_operator(node: Node, operator_class: type) -> bool:
+    """Check whether a node is an operator node of the given operator."""
+    return node.node_type == 'operator' and type(node.value) is operator_class
+
+
+def _range_key(node: Node) -> Optional[Tuple]:
+    """Return the folding key of a 'gt'/'lt' operand, or None."""
+    if node.node_type != 'operand':
+        return None
+    condition = node.value
+    if condition.comparison_type not in ('gt', 'lt'):
+        return None
+    if isinstance(condition.rvalue, (int, float)):
+        kind = 'number'
+    elif isinstance(condition.rvalue, str):
+        kind = 'string'
+    else:
+        return None
+    return (condition.lvariable, condition.comparison_type, kind)
+
+
+def _tighter(candidate: Condition, current: Condition, operator_class: type) -> bool:
+    """
+    Check whether a range condition should replace another on the same field.
+
+    Under AND the most restrictive threshold is kept, under OR the least.
+    """
+    if candidate.comparison_type == 'gt':
+        stricter = candidate.rvalue > current.rvalue
+    else:
+        stricter = candidate.rvalue < current.rvalue
+    return stricter if operator_class is ANDOperator else (
+        not stricter and candidate.rvalue != current.rvalue
+    )
+
+
+def _rank(cost: float, decisive_probability: float) -> float:
+    """Return the expected cost per chance of deciding the operator."""
+    if decisive_probability <= 0.0:
+        return float('inf')
+    return cost / decisive_probability
+
+
+def _operands(root: Node) -> List[Node]:
+    """
+    Collect the operand nodes of a tree.
+
+    Args:
+        root (Node): The root node of the tree.
+
+    Returns:
+        List[Node]: The operand nodes.
+    """
+    operands = []
+    stack = [root] if root is not None else []
+    while stack:
+        node = stack.pop()
+        if node.node_type == 'operand':
+            operands.append(node)
+        else:
+            stack.extend(child for child in (node.left, node.right) if child is not None)
+    return operands
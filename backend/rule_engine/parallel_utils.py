@@ -0,0 +1,223 @@
+"""
+Multi-process evaluation of rules over large record sets.
+
+Evaluation is pure-Python CPU work, so a single process is bound to one core
+by the GIL. This module evaluates a rule, or matches a whole rule set, in a
+pool of worker processes: the rules are serialized and shipped to each
+worker once, when the pool starts, then records are sent in chunks and the
+results reassembled in input order. Columnar input is placed in shared
+memory, so that workers read their row range without copying the columns.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import resource_tracker
+from typing import Dict, Hashable, Iterable, Iterator, List, Mapping, Sequence, Tuple, Union
+from rule_engine.ast_utils import AST, compile_node
+from rule_engine.index_utils import IndexedRuleSet
+from rule_engine.serialization_utils import bytes_to_root, root_to_bytes
+
+# Default number of worker processes and of records per chunk.
+PARALLEL_WORKERS = int(os.getenv('PARALLEL_WORKERS') or os.cpu_count() or 1)
+PARALLEL_CHUNK_SIZE = int(os.getenv('PARALLEL_CHUNK_SIZE') or 10000)
+
+# Worker state, set once per worker process by the pool initializer.
+_worker_root = None
+_worker_evaluate = None
+
+
+def _init_rule(encoded: bytes) -> None:
+    """Decode and compile the rule evaluated by this worker."""
+    global _worker_root, _worker_evaluate
+    _worker_root = bytes_to_root(encoded)
+    _worker_evaluate = compile_node(_worker_root)
+
+
+def _init_rule_set(encoded: List[Tuple[Hashable, bytes]]) -> None:
+    """Decode the rules and build the rule set matched by this worker."""
+    global _worker_evaluate
+    rule_set = IndexedRuleSet.from_rules(
+        (rule_id, AST(bytes_to_root(data))) for rule_id, data in encoded
+    )
+    _worker_evaluate = rule_set.match
+
+
+def _evaluate_chunk(records: List[Dict]) -> List:
+    """Evaluate a chunk of records in a worker."""
+    return list(map(_worker_evaluate, records))
+
+
+def _evaluate_column_range(shared: Dict[str, Tuple[str, str, int]], copied: Dict[str, Sequence],
+                           output: str, start: int, stop: int) -> None:
+    """
+    Evaluate a row range of columnar data in a worker.
+
+    Args:
+        shared (Dict[str, Tuple[str, str, int]]): The shared memory name,
+            dtype and length of each shared column.
+        copied (Dict[str, Sequence]): The row range of the other columns.
+        output (str): The shared memory name of the result mask.
+        start (int): The first row of the range.
+        stop (int): The row following the range.
+    """
+    import numpy as np
+    from multiprocessing import shared_memory
+    from rule_engine.columnar_utils import evaluate_columns
+
+    blocks = []
+    try:
+        columns = dict(copied)
+        for name, (block_name, dtype, length) in shared.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            columns[name] = np.ndarray(length, dtype=dtype, buffer=block.buf)[start:stop]
+        block = shared_memory.SharedMemory(name=output)
+        blocks.append(block)
+        mask = np.ndarray(stop, dtype=bool, buffer=block.buf)
+        mask[start:stop] = evaluate_columns(_worker_root, columns)
+        # Drop the views before closing the blocks they point into.
+        del columns, mask
+    finally:
+        for block in blocks:
+            block.close()
+
+
+def _chunks(records: Iterable[Dict], chunk_size: int) -> Iterator[List[Dict]]:
+    """Split records into lists of at most chunk_size records."""
+    iterator = iter(records)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ParallelEvaluator:
+    """
+    Evaluates a rule, or matches a rule set, in a pool of worker processes.
+
+    Given an AST, map yields the result of the rule for each record. Given
+    pairs of rule ID and AST, map yields the IDs of the rules each record
+    matches, like IndexedRuleSet.match. Only a bounded number of chunks are
+    in flight at a time, so records can be streamed from arbitrarily large
+    inputs. The evaluator should be closed, or used as a context manager,
+    to stop its workers.
+
+    Records are pickled to and from the workers, so this pays off when
+    evaluating a record costs more than sending it, e.g. for large rule
+    sets or columnar input, rather than for a single cheap rule.
+
+    Attributes:
+        workers (int): The number of worker processes.
+        chunk_size (int): The number of records sent to a worker at a time.
+    """
+    def __init__(self, rules: Union[AST, Iterable[Tuple[Hashable, AST]]],
+                 workers: int = None, chunk_size: int = None):
+        self.workers = workers or PARALLEL_WORKERS
+        self.chunk_size = chunk_size or PARALLEL_CHUNK_SIZE
+        self.is_rule_set = not isinstance(rules, AST)
+        if self.is_rule_set:
+            initializer = _init_rule_set
+            encoded = [(rule_id, root_to_bytes(ast.root)) for rule_id, ast in rules]
+        else:
+            initializer = _init_rule
+            encoded = root_to_bytes(rules.root)
+        # Workers must share the resource tracker of this process, so that
+        # shared memory they attach to is not reported as leaked.
+        resource_tracker.ensure_running()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=initializer, initargs=(encoded,)
+        )
+
+    def map(self, records: Iterable[Dict]) -> Iterator:
+        """
+        Evaluate records in the workers, yielding the results in input order.
+
+        Args:
+            records (Iterable[Dict]): The records to evaluate.
+
+        Yields:
+            The result of the rule for each record, or the list of the IDs of
+            the rules it matches for a rule set.
+
+        Raises:
+            KeyError: If a record misses a field the rule references.
+        """
+        pending = deque()
+        for chunk in _chunks(records, self.chunk_size):
+            pending.append(self._executor.submit(_evaluate_chunk, chunk))
+            if len(pending) >= 2 * self.workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+    def evaluate_columns(self, columns: Mapping[str, Sequence]):
+        """
+        Evaluate the rule against columnar data in the workers.
+
+        Numeric and boolean columns are copied once into shared memory, and
+        each worker evaluates its row range of them in place. Other columns,
+        e.g. of strings, are sent to the workers by row range.
+
+        Args:
+            columns (Mapping[str, Sequence]): The columns, keyed by field name.
+
+        Returns:
+            numpy.ndarray: A boolean mask with the result for every row.
+
+        Raises:
+            ValueError: If the evaluator holds a rule set.
+            ImportError: If NumPy is not installed.
+        """
+        if self.is_rule_set:
+            raise ValueError("Columnar evaluation requires a single rule")
+
+        # Imported first, to name the columnar extra if NumPy is missing.
+        from rule_engine.columnar_utils import to_columns
+        import numpy as np
+        from multiprocessing import shared_memory
+
+        arrays = to_columns(columns)
+        num_rows = next(iter(arrays.values())).shape[0] if arrays else 0
+        blocks = []
+        try:
+            shared = {}
+            copied = {}
+            for name, array in arrays.items():
+                if array.dtype.kind in 'biuf' and array.nbytes:
+                    block = shared_memory.SharedMemory(create=True, size=array.nbytes)
+                    blocks.append(block)
+                    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+                    shared[name] = (block.name, array.dtype.str, num_rows)
+                else:
+                    copied[name] = array
+            output = shared_memory.SharedMemory(create=True, size=max(num_rows, 1))
+            blocks.append(output)
+
+            futures = [
+                self._executor.submit(
+                    _evaluate_column_range, shared,
+                    {name: array[start:start + self.chunk_size] for name, array in copied.items()},
+                    output.name, start, min(start + self.chunk_size, num_rows)
+                )
+                for start in range(0, num_rows, self.chunk_size)
+            ]
+            for future in futures:
+                future.result()
+            return np.ndarray(num_rows, dtype=bool, buffer=output.buf).copy()
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        self._executor.shutdown()
+
+    def __enter__(self) -> 'ParallelEvaluator':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -6,8 +6,50 @@ parsing them into abstract syntax trees (ASTs).
 """
 
 import re
-from typing import List
-from rule_engine.ast_utils import Node, ANDOperator, OROperator, Condition
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple, Union
+from rule_engine.ast_utils import (Node, ANDOperator, OROperator, NOTOperator, Condition,
+                                   COMPARISON_SYMBOLS, normalize_comparison)
+
+TOKEN_PATTERN = re.compile(r'\s*(=>|<=|>=|!=|&&|\|\||[()=><!]|[\w]+)\s*')
+
+# Single-pass scanner pattern, matching one token per match.
+SCANNER_PATTERN = re.compile(r"""\s*(
+    -?\d+(?:\.\d+)?(?![\w.])         # number
+  | '[^']*' | "[^"]*"                 # quoted string
+  | \w+ | && | \|\|                    # name, or the AND/OR keywords
+  | => | [<>=!]=?                     # comparison
+  | [(),]                             # parenthesis, list separator
+  | \S                                # anything else is an error
+)""", re.VERBOSE)
+
+KEYWORDS = {'AND': 'AND', 'OR': 'OR', '&&': 'AND', '||': 'OR'}
+
+# Words introducing a negation, a set or a range, which can not name a field.
+RESERVED = frozenset(('NOT', 'IN', 'BETWEEN'))
+
+# Token kinds by first character, names starting with any other word
+# character are handled by token_kind.
+_KINDS = {char: 'NUMBER' for char in '-0123456789'}
+_KINDS.update({"'": 'STRING', '"': 'STRING', '(': 'LPAREN', ')': 'RPAREN', ',': 'COMMA'})
+_KINDS.update({char: 'COMPARISON' for char in '<>=!'})
+
+PARSE_CACHE_SIZE = 4096
+
+class Token(NamedTuple):
+    """
+    A typed token produced by the scanner.
+
+    Attributes:
+        kind (str): One of NUMBER, STRING, NAME, AND, OR, COMPARISON, LPAREN,
+            RPAREN, COMMA or ERROR.
+        value (Union[str, int, float]): The token value, numbers converted
+            and strings unquoted.
+        pos (int): The offset of the token in the rule string.
+    """
+    kind: str
+    value: Union[str, int, float]
+    pos: int
 
 def tokenize(rule: str) -> List[str]:
     """
@@ -19,8 +61,245 @@ def tokenize(rule: str) -> List[str]:
     Returns:
         List[str]: A list of tokens.
     """
-    token_pattern = re.compile(r'\s*(=>|<=|>=|&&|\|\||[()=><!]|[\w]+)\s*')
-    return [token for token in token_pattern.findall(rule) if token.strip()]
+    return [token for token in TOKEN_PATTERN.findall(rule) if token.strip()]
+
+def token_kind(text: str) -> str:
+    """
+    Return the kind of a token matched by the scanner.
+
+    Args:
+        text (str): The token text.
+
+    Returns:
+        str: The kind of the token, see Token.
+    """
+    kind = _KINDS.get(text[0])
+    if kind == 'NUMBER':
+        digits = text[1:] if text[0] == '-' else text
+        if digits.replace('.', '', 1).isdigit():
+            return 'NUMBER'
+        # Digits followed by letters are a name, a lone '-' is an error.
+        return 'ERROR' if text[0] == '-' else 'NAME'
+    if kind is not None:
+        return kind
+    if text in KEYWORDS:
+        return KEYWORDS[text]
+    return 'NAME' if text[0].isalnum() or text[0] == '_' else 'ERROR'
+
+def literal_value(text: str) -> Union[str, int, float]:
+    """
+    Convert the text of a value token to its literal.
+
+    Args:
+        text (str): The token text.
+
+    Returns:
+        Union[str, int, float]: The number or unquoted string.
+    """
+    if text.isdigit():
+        return int(text)
+    first = text[0]
+    if first == "'" or first == '"':
+        return text[1:-1]
+    if first in '-0123456789':
+        try:
+            return float(text) if '.' in text else int(text)
+        except ValueError:
+            pass
+    return text
+
+def scan(rule: str) -> List[Token]:
+    """
+    Scan a rule string into typed tokens with their positions.
+
+    Args:
+        rule (str): The rule string to scan.
+
+    Returns:
+        List[Token]: The tokens of the rule.
+    """
+    tokens = []
+    for match in SCANNER_PATTERN.finditer(rule):
+        text = match.group(1)
+        kind = token_kind(text)
+        value = literal_value(text) if kind in ('NUMBER', 'STRING') else text
+        tokens.append(Token(kind, value, match.start(1)))
+    return tokens
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_rule(rule: str) -> Node:
+    """
+    Parse a rule string into an AST, caching the result by rule content.
+
+    The rule is scanned in a single pass, then parsed without recursion,
+    dispatching on the first character of each token. It builds the same
+    trees as Parser, AND/OR chains being grouped left to right, but rejects
+    malformed rules. Identical rule strings are only parsed once and share
+    the returned tree, which must therefore not be modified in place.
+
+    Besides the comparisons (>, <, =, >=, <=, !=), a condition may be
+    `field IN (v1, v2, ...)` or `field NOT IN (...)`, parsed into an 'in'
+    or 'not_in' condition on a frozenset of the values, or
+    `field BETWEEN low AND high`, an inclusive 'between' condition on the
+    (low, high) pair. NOT, or !, negates the condition or parenthesized
+    expression following it.
+
+    Args:
+        rule (str): The rule string to parse.
+
+    Returns:
+        Node: The root node of the AST.
+
+    Raises:
+        ValueError: If the rule is empty or malformed, reporting the
+            position of the offending token.
+    """
+    tokens = SCANNER_PATTERN.findall(rule)
+    if not tokens:
+        raise ValueError("Empty tokens list")
+    tokens.append(None)
+    kinds = _KINDS
+    pos = 0
+    # Expressions enclosing the current parenthesis, with their pending
+    # operator and negation.
+    stack: List[Tuple[Node, type, bool]] = []
+    node = None
+    operator_class = None
+    negate = False
+
+    while True:
+        field = tokens[pos]
+        if field == 'NOT' or field == '!':
+            negate = not negate
+            pos += 1
+            continue
+        if field == '(':
+            stack.append((node, operator_class, negate))
+            node = operator_class = None
+            negate = False
+            pos += 1
+            continue
+
+        # Condition: field, comparison, value(s).
+        if field is None or field in KEYWORDS or field in RESERVED or \
+                not field.isidentifier() and token_kind(field) != 'NAME':
+            _parse_error(rule, pos, "a field name")
+        comparison = tokens[pos + 1]
+        if comparison is not None and kinds.get(comparison[0]) == 'COMPARISON':
+            comparison_type = COMPARISON_SYMBOLS.get(comparison)
+            if comparison_type is None:
+                _parse_error(rule, pos + 1, "a comparison operator")
+            rvalue = _parse_value(rule, tokens, pos + 2)
+            pos += 3
+        elif comparison == 'IN' or comparison == 'NOT' and tokens[pos + 2] == 'IN':
+            comparison_type = 'in' if comparison == 'IN' else 'not_in'
+            rvalue, pos = _parse_values(rule, tokens, pos + (2 if comparison == 'IN' else 3))
+        elif comparison == 'BETWEEN':
+            low = _parse_value(rule, tokens, pos + 2)
+            if KEYWORDS.get(tokens[pos + 3]) != 'AND':
+                _parse_error(rule, pos + 3, "'AND'")
+            rvalue = (low, _parse_value(rule, tokens, pos + 4))
+            comparison_type = 'between'
+            pos += 5
+        else:
+            _parse_error(rule, pos + 1, "a comparison operator")
+        term = Node("operand", value=Condition(field, rvalue, comparison_type))
+
+        # Fold the term into the expression, closing any parenthesis.
+        while True:
+            if negate:
+                term = Node("operator", left=term, value=NOTOperator())
+                negate = False
+            node = term if node is None else Node("operator", left=node, right=term, value=operator_class())
+            if tokens[pos] == ')' and stack:
+                term = node
+                node, operator_class, negate = stack.pop()
+                pos += 1
+                continue
+            break
+
+        keyword = tokens[pos]
+        if keyword is None:
+            if stack:
+                _parse_error(rule, pos, "')'")
+            return node
+        keyword = KEYWORDS.get(keyword)
+        if keyword is None:
+            _parse_error(rule, pos, "'AND', 'OR' or ')'" if stack else "'AND' or 'OR'")
+        operator_class = ANDOperator if keyword == 'AND' else OROperator
+        pos += 1
+
+def _parse_value(rule: str, tokens: List[str], index: int) -> Union[str, int, float]:
+    """
+    Parse the literal value token at an index.
+
+    Args:
+        rule (str): The rule string.
+        tokens (List[str]): The tokens of the rule, ending with None.
+        index (int): The index of the value token.
+
+    Returns:
+        Union[str, int, float]: The literal.
+
+    Raises:
+        ValueError: If the token is not a value.
+    """
+    value = tokens[index]
+    if value is None:
+        _parse_error(rule, index, "a value")
+    if value.isdigit():
+        return int(value)
+    if value[0] == "'" or value[0] == '"':
+        return value[1:-1]
+    if value in KEYWORDS or token_kind(value) not in ('NUMBER', 'NAME'):
+        _parse_error(rule, index, "a value")
+    return literal_value(value)
+
+def _parse_values(rule: str, tokens: List[str], index: int) -> Tuple[frozenset, int]:
+    """
+    Parse a parenthesized, comma separated list of values.
+
+    Args:
+        rule (str): The rule string.
+        tokens (List[str]): The tokens of the rule, ending with None.
+        index (int): The index of the opening parenthesis.
+
+    Returns:
+        Tuple[frozenset, int]: The values, and the index following the
+            closing parenthesis.
+
+    Raises:
+        ValueError: If the list is malformed or empty.
+    """
+    if tokens[index] != '(':
+        _parse_error(rule, index, "'('")
+    values = []
+    while True:
+        values.append(_parse_value(rule, tokens, index + 1))
+        index += 2
+        if tokens[index] == ')':
+            return frozenset(values), index + 1
+        if tokens[index] != ',':
+            _parse_error(rule, index, "',' or ')'")
+
+def _parse_error(rule: str, index: int, expected: str) -> None:
+    """
+    Raise a ValueError for an unexpected token, reporting its position.
+
+    Args:
+        rule (str): The rule string.
+        index (int): The index of the unexpected token.
+        expected (str): A description of the expected token.
+
+    Raises:
+        ValueError: Always.
+    """
+    tokens = scan(rule)
+    if index < len(tokens):
+        found = f"{tokens[index].value!r} at position {tokens[index].pos}"
+    else:
+        found = f"end of rule at position {len(rule)}"
+    raise ValueError(f"Expected {expected}, found {found}")
 
 class Parser:
     """
@@ -100,5 +379,5 @@ class Parser:
             rvalue = float(rvalue)
         else:
             rvalue = rvalue.strip("'")
-        condition = Condition(lvariable, rvalue, comparison_type)
+        condition = Condition(lvariable, rvalue, normalize_comparison(comparison_type))
         return Node("operand", value=condition)
@@ -0,0 +1,248 @@
+"""
+Matching of a record against many rules at once.
+
+This module defines the RuleSet class, which holds many rules and shares
+identical conditions between them, so that each distinct condition is
+evaluated at most once per record, whichever rules reference it.
+"""
+
+from array import array
+from functools import partial
+from typing import Callable, Dict, Hashable, Iterable, List, Sequence, Tuple
+from rule_engine.ast_utils import (AST, Node, Condition, ANDOperator, OROperator, NOTOperator, MAX_COMPILED_DEPTH,
+                                   compile_condition, node_fields, tree_depth)
+from rule_engine.compact_utils import CompactTree
+
+
+def condition_key(condition: Condition) -> Tuple:
+    """
+    Build the key identifying equivalent conditions.
+
+    The type of the literal is part of the key, so that e.g. 1 and 1.0 or
+    True are kept apart even though they compare and hash equal. The same
+    goes for every value of a set or pair literal.
+
+    Args:
+        condition (Condition): The condition.
+
+    Returns:
+        Tuple: The field, comparison type, literal type and literal.
+    """
+    rvalue = condition.rvalue
+    if isinstance(rvalue, frozenset):
+        rvalue = frozenset((type(value).__name__, value) for value in rvalue)
+    elif isinstance(rvalue, tuple):
+        rvalue = tuple((type(value).__name__, value) for value in rvalue)
+    return (condition.lvariable, condition.comparison_type, type(condition.rvalue).__name__, rvalue)
+
+
+class RuleSet:
+    """
+    A set of rules sharing their distinct conditions.
+
+    Conditions are deduplicated across all rules of the set into a list of
+    predicates. Matching a record evaluates each rule with short-circuiting,
+    and memoizes predicate results for that record, so a predicate shared by
+    thousands of rules is evaluated at most once. A predicate on a field the
+    record does not have evaluates to False, and so does a NOT over a
+    subtree referencing such a field.
+
+    With compact set, each rule is held as a CompactTree over predicate
+    slots, evaluated iteratively, instead of a tree of closures, which takes
+    several times less memory per rule at some cost in matching speed.
+
+    Attributes:
+        predicates (List[Condition]): The distinct conditions, by slot. Slots
+            of conditions no longer used by any rule are None and reused.
+        compact (bool): Whether rules are held as compact trees.
+    """
+    def __init__(self, compact: bool = False):
+        self.compact = compact
+        self.predicates: List[Condition] = []
+        self._predicate_fns: List[Callable[[Dict], bool]] = []
+        self._predicate_refs: List[int] = []
+        self._predicate_slots: Dict[Tuple, int] = {}
+        self._free_slots: List[int] = []
+        self._rules: Dict[Hashable, Tuple[Callable, Sequence[int]]] = {}
+
+    @classmethod
+    def from_rules(cls, rules: Iterable[Tuple[Hashable, AST]], compact: bool = False) -> 'RuleSet':
+        """
+        Create a rule set from pairs of rule id and AST.
+
+        Args:
+            rules (Iterable[Tuple[Hashable, AST]]): The rules to add.
+            compact (bool): Whether to hold rules as compact trees.
+
+        Returns:
+            RuleSet: The rule set.
+        """
+        rule_set = cls(compact=compact)
+        for rule_id, ast in rules:
+            rule_set.add_rule(rule_id, ast)
+        return rule_set
+
+    def add_rule(self, rule_id: Hashable, ast: AST) -> None:
+        """
+        Add a rule to the set, replacing any rule with the same id.
+
+        A replaced rule keeps its position in the set. The predicates of the
+        new version are acquired before those of the old one are released,
+        so predicates used by both stay in place and only the ones that
+        changed are added to or removed from the set.
+
+        Args:
+            rule_id (Hashable): The ID of the rule.
+            ast (AST): The AST of the rule.
+        """
+        slots = []
+        # Rules too deep for nested closures are held as compact trees,
+        # which are evaluated without recursion.
+        if self.compact or tree_depth(ast.root) > MAX_COMPILED_DEPTH:
+            def acquire(condition):
+                slot = self._acquire_predicate(condition)
+                slots.append(slot)
+                return slot
+
+            tree = CompactTree.from_root(ast.root, predicate_slot=acquire)
+            evaluate = partial(tree.evaluate_predicates, predicates=self._predicate_fns)
+            slots = array('i', slots)
+        else:
+            evaluate = self._compile_node(ast.root, slots)
+        previous = self._rules.get(rule_id)
+        self._rules[rule_id] = (evaluate, slots)
+        if previous is not None:
+            for slot in previous[1]:
+                self._release_predicate(slot)
+
+    def remove_rule(self, rule_id: Hashable) -> bool:
+        """
+        Remove a rule, and the predicates only it used, from the set.
+
+        Args:
+            rule_id (Hashable): The ID of the rule.
+
+        Returns:
+            bool: True if the rule was in the set.
+        """
+        entry = self._rules.pop(rule_id, None)
+        if entry is None:
+            return False
+        for slot in entry[1]:
+            self._release_predicate(slot)
+        return True
+
+    def match(self, data: Dict) -> List[Hashable]:
+        """
+        Find every rule of the set the record satisfies.
+
+        Args:
+            data (Dict): The record.
+
+        Returns:
+            List[Hashable]: The IDs of the matching rules, in insertion order.
+        """
+        memo = [None] * len(self.predicates)
+        return [
+            rule_id for rule_id, (evaluate, _) in self._rules.items()
+            if evaluate(data, memo)
+        ]
+
+    def __contains__(self, rule_id: Hashable) -> bool:
+        return rule_id in self._rules
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def _compile_node(self, node: Node, slots: List[int]) -> Callable[[Dict, List], bool]:
+        """
+        Compile a rule node into a closure evaluating against shared predicates.
+
+        Args:
+            node (Node): The node to compile.
+            slots (List[int]): Collects the predicate slots the rule uses.
+
+        Returns:
+            Callable[[Dict, List], bool]: A function of the record and the
+                per-record memo of predicate results.
+        """
+        if node is None:
+            return lambda data, memo: True
+
+        if node.node_type == 'operand':
+            slot = self._acquire_predicate(node.value)
+            slots.append(slot)
+            predicate = self._predicate_fns[slot]
+
+            def evaluate(data, memo):
+                result = memo[slot]
+                if result is None:
+                    try:
+                        result = predicate(data)
+                    except KeyError:
+                        result = False
+                    memo[slot] = result
+                return result
+            return evaluate
+
+        if isinstance(node.value, NOTOperator):
+            operand = self._compile_node(node.left, slots)
+            fields = node_fields(node.left)
+            return lambda data, memo: data.keys() >= fields and not operand(data, memo)
+
+        left = self._compile_node(node.left, slots)
+        right = self._compile_node(node.right, slots)
+        if isinstance(node.value, ANDOperator):
+            return lambda data, memo: left(data, memo) and right(data, memo)
+        if isinstance(node.value, OROperator):
+            return lambda data, memo: left(data, memo) or right(data, memo)
+        raise ValueError(f"Unsupported operator {type(node.value).__name__}")
+
+    def _acquire_predicate(self, condition: Condition) -> int:
+        """
+        Return the slot of a condition, registering it if it is new.
+
+        Args:
+            condition (Condition): The condition.
+
+        Returns:
+            int: The slot of the predicate.
+        """
+        key = condition_key(condition)
+        slot = self._predicate_slots.get(key)
+        if slot is None:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+                self.predicates[slot] = condition
+                self._predicate_fns[slot] = compile_condition(condition)
+                self._predicate_refs[slot] = 0
+            else:
+                slot = len(self.predicates)
+                self.predicates.append(condition)
+                self._predicate_fns.append(compile_condition(condition))
+                self._predicate_refs.append(0)
+            self._predicate_slots[key] = slot
+            self._predicate_added(slot)
+        self._predicate_refs[slot] += 1
+        return slot
+
+    def _release_predicate(self, slot: int) -> None:
+        """
+        Drop a reference to a predicate, freeing its slot when unused.
+
+        Args:
+            slot (int): The slot of the predicate.
+        """
+        self._predicate_refs[slot] -= 1
+        if self._predicate_refs[slot] == 0:
+            self._predicate_removed(slot)
+            del self._predicate_slots[condition_key(self.predicates[slot])]
+            self.predicates[slot] = None
+            self._predicate_fns[slot] = None
+            self._free_slots.append(slot)
+
+    def _predicate_added(self, slot: int) -> None:
+        """Hook called when a new predicate is registered in a slot."""
+
+    def _predicate_removed(self, slot: int) -> None:
+        """Hook called before an unused predicate is freed from its slot."""
@@ -0,0 +1,273 @@
+"""
+Typed attribute schema for rules and records.
+
+A schema declares the type of each field rules may reference. Rules are
+validated against it when they are created, the literals of a rule are
+converted to the type of their field once, when the rule is compiled, and
+records are converted in a single pass before they are evaluated. Every
+comparison then happens between values of the declared type, without
+per-predicate checks or silent mismatches such as "35" > 30.
+"""
+
+import json
+import os
+from typing import Any, Callable, Dict, Mapping, Optional
+from rule_engine.ast_utils import Node, Condition
+
+# Comparisons that do not apply to booleans.
+_ORDERING_COMPARISONS = ('gt', 'lt', 'ge', 'le', 'between', '>', '<', '>=', '<=')
+
+
+def _to_int(value: Any) -> int:
+    """Convert a value to int, rejecting booleans and fractional numbers."""
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError
+        return int(value)
+    if isinstance(value, str):
+        return int(value.strip())
+    raise ValueError
+
+
+def _to_float(value: Any) -> float:
+    """Convert a value to float, rejecting booleans."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError
+    return float(value)
+
+
+def _to_str(value: Any) -> str:
+    """Convert a value to str, accepting numbers as their text."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ValueError
+
+
+def _to_bool(value: Any) -> bool:
+    """Convert a value to bool, accepting true/false, yes/no and 1/0."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in ('true', 'yes', '1'):
+            return True
+        if lowered in ('false', 'no', '0'):
+            return False
+    elif isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    raise ValueError
+
+
+# Converters and Python types, by declared field type.
+FIELD_TYPES: Dict[str, tuple] = {
+    'int': (_to_int, int),
+    'float': (_to_float, float),
+    'str': (_to_str, str),
+    'bool': (_to_bool, bool),
+}
+
+
+class Schema:
+    """
+    The declared types of the fields of records.
+
+    Attributes:
+        fields (Dict[str, str]): The type name of each field, one of
+            FIELD_TYPES.
+    """
+    def __init__(self, fields: Mapping[str, str]):
+        unknown = {type_name for type_name in fields.values() if type_name not in FIELD_TYPES}
+        if unknown:
+            raise ValueError(f"Unknown field types: {', '.join(sorted(unknown))}")
+        self.fields = dict(fields)
+        self._converters = {field: FIELD_TYPES[type_name][0] for field, type_name in self.fields.items()}
+        self._types = {field: FIELD_TYPES[type_name][1] for field, type_name in self.fields.items()}
+
+    @classmethod
+    def from_file(cls, path: str) -> 'Schema':
+        """
+        Load a schema from a JSON file mapping field names to type names.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            Schema: The schema.
+        """
+        with open(path, encoding='utf-8') as schema_file:
+            return cls(json.load(schema_file))
+
+    def convert(self, field: str, value: Any) -> Any:
+        """
+        Convert a value to the type of its field.
+
+        Args:
+            field (str): The field.
+            value (Any): The value.
+
+        Returns:
+            Any: The converted value, None staying None.
+
+        Raises:
+            ValueError: If the field is unknown or the value can not be
+                converted.
+        """
+        converter = self._converters.get(field)
+        if converter is None:
+            raise ValueError(f"Unknown field {field!r}")
+        if value is None or type(value) is self._types[field]:
+            return value
+        try:
+            return converter(value)
+        except (ValueError, TypeError):
+            raise ValueError(
+                f"Field {field!r} expects {self.fields[field]}, got {value!r}"
+            ) from None
+
+    def convert_literal(self, field: str, value: Any) -> Any:
+        """
+        Convert the literal of a condition, or each value of a set or pair
+        literal, to the type of its field.
+
+        Args:
+            field (str): The field.
+            value (Any): The literal.
+
+        Returns:
+            Any: The converted literal.
+
+        Raises:
+            ValueError: If the field is unknown or a value can not be
+                converted.
+        """
+        if isinstance(value, frozenset):
+            return frozenset(self.convert(field, item) for item in value)
+        if isinstance(value, tuple):
+            return tuple(self.convert(field, item) for item in value)
+        return self.convert(field, value)
+
+    def coerce_literals(self, root: Node) -> Node:
+        """
+        Validate a rule and convert its literals to the types of their fields.
+
+        The input tree is not modified, shared subtrees stay shared.
+
+        Args:
+            root (Node): The root node of the rule.
+
+        Returns:
+            Node: The root node of the converted rule.
+
+        Raises:
+            ValueError: If the rule references an unknown field, holds a
+                literal of the wrong type, or orders booleans.
+        """
+        copies: Dict[int, Node] = {}
+        for node in _postorder(root):
+            if id(node) in copies:
+                continue
+            if node.node_type == 'operand':
+                condition = node.value
+                if self.fields.get(condition.lvariable) == 'bool' and \
+                        condition.comparison_type in _ORDERING_COMPARISONS:
+                    raise ValueError(f"Field {condition.lvariable!r} is bool and can not be ordered")
+                value = Condition(
+                    condition.lvariable,
+                    self.convert_literal(condition.lvariable, condition.rvalue),
+                    condition.comparison_type
+                )
+                copy = Node(node.node_type, value=value)
+            else:
+                copy = Node(
+                    node.node_type,
+                    left=copies.get(id(node.left)),
+                    right=copies.get(id(node.right)),
+                    value=node.value
+                )
+            copies[id(node)] = copy
+        return copies.get(id(root))
+
+    def validate(self, root: Node) -> None:
+        """
+        Check that a rule only compares fields with literals of their type.
+
+        Args:
+            root (Node): The root node of the rule.
+
+        Raises:
+            ValueError: If the rule does not fit the schema.
+        """
+        self.coerce_literals(root)
+
+    def coerce_record(self, data: Dict) -> Dict:
+        """
+        Convert the values of a record to the types of their fields.
+
+        Fields absent from the record or the schema are left as they are.
+
+        Args:
+            data (Dict): The record.
+
+        Returns:
+            Dict: The record with converted values, the record itself if
+                every value already has its type.
+
+        Raises:
+            ValueError: If a value can not be converted.
+        """
+        coerced = data
+        types = self._types
+        for field, value in data.items():
+            expected = types.get(field)
+            if expected is not None and value is not None and type(value) is not expected:
+                if coerced is data:
+                    coerced = dict(data)
+                coerced[field] = self.convert(field, value)
+        return coerced
+
+    def bind(self, evaluate: Callable[[Dict], bool]) -> Callable[[Dict], bool]:
+        """
+        Wrap a compiled rule so that records are converted before evaluation.
+
+        Args:
+            evaluate (Callable[[Dict], bool]): The compiled rule.
+
+        Returns:
+            Callable[[Dict], bool]: The wrapped function.
+        """
+        coerce = self.coerce_record
+        return lambda data: evaluate(coerce(data))
+
+    def to_dict(self) -> Dict[str, str]:
+        """Return the type name of each field."""
+        return dict(self.fields)
+
+
+def _postorder(root: Node):
+    """List the nodes of a tree, children before their parent, without recursion."""
+    order = []
+    stack = [root] if root is not None else []
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        if node.node_type == 'operator':
+            stack.extend(child for child in (node.left, node.right) if child is not None)
+    order.reverse()
+    return order
+
+
+def schema_from_env() -> Optional[Schema]:
+    """
+    Load the schema named by the RULE_SCHEMA environment variable.
+
+    Returns:
+        Optional[Schema]: The schema, or None if RULE_SCHEMA is not set.
+    """
+    path = os.getenv('RULE_SCHEMA')
+    return Schema.from_file(path) if path else None
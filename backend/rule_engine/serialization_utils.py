@@ -0,0 +1,540 @@
+"""
+Compact binary serialization of rule ASTs.
+
+This module encodes an AST as a versioned postfix bytecode. The encoding
+starts with a header and two interned string tables, for field names and
+comparison types, followed by one instruction per node in postfix order:
+
+    header       b'RAST' magic, format version (1 byte)
+    fields       varint count, then varint length + UTF-8 bytes per name
+    comparisons  varint count, then varint length + UTF-8 bytes per type
+    code         varint instruction count, then the instructions:
+                   CONDITION  opcode, varint field index,
+                              varint comparison index, tagged literal
+                   AND / OR   opcode, combining the two topmost nodes
+                   NOT        opcode, negating the topmost node
+
+Literals are tagged with their type so that they round-trip losslessly.
+The values of 'in'/'not_in' conditions are encoded as a set literal, a
+varint count followed by the tagged values in a stable order, and the
+bounds of 'between' conditions as a pair literal.
+Both encoding and decoding are iterative, so trees of any depth are
+supported.
+
+The JSON representation stored alongside it is produced by root_to_json
+and read back by json_to_root, which are iterative as well.
+"""
+
+import json
+import re
+import struct
+from typing import Any, Dict, List, Tuple
+from rule_engine.ast_utils import (Node, Condition, ANDOperator, OROperator, NOTOperator, Operator,
+                                   normalize_comparison)
+
+MAGIC = b'RAST'
+VERSION = 1
+
+OP_CONDITION = 0x01
+OP_AND = 0x02
+OP_OR = 0x03
+OP_NOT = 0x04
+
+TAG_NONE = 0x00
+TAG_FALSE = 0x01
+TAG_TRUE = 0x02
+TAG_INT = 0x03
+TAG_FLOAT = 0x04
+TAG_STR = 0x05
+TAG_SET = 0x06
+TAG_PAIR = 0x07
+
+_DOUBLE = struct.Struct('<d')
+
+# Operators of the JSON representation, by name.
+_OPERATORS = {cls.__name__: cls for cls in (ANDOperator, OROperator, NOTOperator)}
+
+# A JSON token after optional whitespace: punctuation or a scalar.
+_JSON_TOKEN = re.compile(
+    r'[ \t\n\r]*(?:([{}\[\]:,])|("(?:[^"\\]|\\.)*"'
+    r'|-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?|true|false|null|NaN|-?Infinity))'
+)
+
+
+def root_to_bytes(root: Node) -> bytes:
+    """
+    Encode an AST root node into the compact binary format.
+
+    Args:
+        root (Node): The root node of the AST, or None for an empty tree.
+
+    Returns:
+        bytes: The encoded AST.
+
+    Raises:
+        ValueError: If the tree holds an operator or literal that can not
+            be encoded.
+    """
+    fields: Dict[str, int] = {}
+    comparisons: Dict[str, int] = {}
+    code = bytearray()
+    count = 0
+
+    for node in _postfix(root):
+        count += 1
+        if node.node_type == 'operand':
+            condition = node.value
+            code.append(OP_CONDITION)
+            _write_varint(code, fields.setdefault(condition.lvariable, len(fields)))
+            _write_varint(code, comparisons.setdefault(condition.comparison_type, len(comparisons)))
+            _write_literal(code, condition.rvalue)
+        elif isinstance(node.value, ANDOperator):
+            code.append(OP_AND)
+        elif isinstance(node.value, OROperator):
+            code.append(OP_OR)
+        elif isinstance(node.value, NOTOperator):
+            code.append(OP_NOT)
+        else:
+            raise ValueError(f"Can not encode operator {type(node.value).__name__}")
+
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    for table in (fields, comparisons):
+        _write_varint(out, len(table))
+        for name in table:
+            _write_string(out, name)
+    _write_varint(out, count)
+    out += code
+    return bytes(out)
+
+
+def bytes_to_root(data: bytes) -> Node:
+    """
+    Decode an AST root node from the compact binary format.
+
+    Args:
+        data (bytes): The encoded AST.
+
+    Returns:
+        Node: The root node of the AST, or None for an empty tree.
+
+    Raises:
+        ValueError: If the data is not a valid encoded AST.
+    """
+    data = memoryview(data)
+    if bytes(data[:4]) != MAGIC or len(data) < 5:
+        raise ValueError("Not an encoded AST")
+    if data[4] != VERSION:
+        raise ValueError(f"Unsupported AST encoding version {data[4]}")
+    try:
+        return _decode(data, 5)
+    except IndexError:
+        raise ValueError("Truncated AST encoding") from None
+
+
+def root_to_json(root: Node) -> str:
+    """
+    Convert an AST root node to JSON.
+
+    Trees too deep for json.dumps are written by _dumps_deep, with the
+    same output.
+
+    Args:
+        root (Node): The root node of the AST.
+
+    Returns:
+        str: The JSON representation of the AST.
+    """
+    if root is None:
+        return ""
+    try:
+        return json.dumps(root, default=_to_json_value)
+    except RecursionError:
+        return _dumps_deep(root)
+
+
+def _dumps_deep(root: Node) -> str:
+    """
+    Write the JSON representation of a tree without recursion, operator
+    nodes piece by piece and leaves with json.dumps.
+    """
+    parts = []
+    # Nodes still to write, interleaved with the text following them.
+    stack = [root]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+        elif item is None:
+            parts.append('null')
+        elif item.left is None and item.right is None:
+            parts.append(json.dumps(item, default=_to_json_value))
+        else:
+            parts.append(f'{{"node_type": {json.dumps(item.node_type)}, "left": ')
+            stack.append(f', "value": {json.dumps(item.value, default=_to_json_value)}}}')
+            stack.append(item.right)
+            stack.append(', "right": ')
+            stack.append(item.left)
+    return ''.join(parts)
+
+
+def json_to_root(text: str) -> Node:
+    """
+    Convert the JSON representation of an AST back to its root node.
+
+    Trees too deep for json.loads are read by an iterative parser.
+
+    Args:
+        text (str): The JSON representation, as produced by root_to_json.
+
+    Returns:
+        Node: The root node of the AST.
+
+    Raises:
+        ValueError: If the text is not valid JSON.
+    """
+    try:
+        data = json.loads(text)
+    except RecursionError:
+        data = _loads_deep(text)
+    return dict_to_root(data)
+
+
+def dict_to_root(data: Dict) -> Node:
+    """
+    Convert a decoded JSON representation of an AST to its root node,
+    without recursion.
+
+    Comparison types are normalized and set and range literals restored.
+    Unknown operators get no value.
+
+    Args:
+        data (Dict): The dictionary representing the root node, or None.
+
+    Returns:
+        Node: The root node of the AST.
+    """
+    if data is None:
+        return None
+    operators = _OPERATORS
+    root = None
+    # Dictionaries still to convert, with the node to attach them to and
+    # whether as its left child.
+    stack = [(data, None, True)]
+    while stack:
+        item, parent, is_left = stack.pop()
+        value = item['value']
+        if item['node_type'] == 'operand':
+            comparison_type = normalize_comparison(value['comparison_type'])
+            value = Condition(
+                lvariable=value['lvariable'],
+                rvalue=json_to_literal(comparison_type, value['rvalue']),
+                comparison_type=comparison_type
+            )
+        else:
+            if isinstance(value, dict):
+                value = value.get('operator')
+            operator_class = operators.get(value)
+            value = operator_class() if operator_class is not None else None
+        node = Node(item['node_type'], value=value)
+        if parent is None:
+            root = node
+        elif is_left:
+            parent.left = node
+        else:
+            parent.right = node
+        if item['node_type'] != 'operand':
+            right, left = item.get('right'), item.get('left')
+            if right is not None:
+                stack.append((right, node, False))
+            if left is not None:
+                stack.append((left, node, True))
+    return root
+
+
+def _to_json_value(obj) -> Any:
+    """
+    Serialize nodes and conditions by their attributes, operators by name
+    and sets of values as sorted lists.
+    """
+    if isinstance(obj, Node):
+        return {"node_type": obj.node_type, "left": obj.left, "right": obj.right, "value": obj.value}
+    if isinstance(obj, Condition):
+        return {"lvariable": obj.lvariable, "rvalue": obj.rvalue, "comparison_type": obj.comparison_type}
+    if isinstance(obj, Operator):
+        return {"operator": type(obj).__name__}
+    if isinstance(obj, frozenset):
+        return sorted(obj, key=_literal_order)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def json_to_literal(comparison_type: str, rvalue: Any) -> Any:
+    """
+    Restore the literal of a condition read from JSON.
+
+    JSON has no sets or tuples, so the values of 'in'/'not_in' conditions
+    are converted back to a frozenset and the bounds of 'between'
+    conditions to a pair.
+
+    Args:
+        comparison_type (str): The comparison type of the condition.
+        rvalue (Any): The literal, as read from JSON.
+
+    Returns:
+        Any: The literal.
+    """
+    if comparison_type in ('in', 'not_in') and isinstance(rvalue, list):
+        return frozenset(rvalue)
+    if comparison_type == 'between' and isinstance(rvalue, list):
+        return tuple(rvalue)
+    return rvalue
+
+
+def _loads_deep(text: str) -> Any:
+    """
+    Decode JSON without recursion, for documents nested too deeply for
+    json.loads. Scalars are decoded by json.loads.
+    """
+    containers: List[Any] = []
+    keys: List[Any] = []
+    result = None
+    expect = 'value'
+    pos = 0
+    while True:
+        match = _JSON_TOKEN.match(text, pos)
+        if match is None:
+            if expect == 'end' and not text[pos:].strip(' \t\n\r'):
+                return result
+            raise json.JSONDecodeError("Invalid JSON", text, pos)
+        start, pos = match.start(match.lastindex), match.end()
+        punctuation = match.group(1)
+        value = closed = None
+        if expect in ('value', 'value_or_close'):
+            if punctuation == '{':
+                containers.append({})
+                keys.append(None)
+                expect = 'key_or_close'
+                continue
+            if punctuation == '[':
+                containers.append([])
+                keys.append(None)
+                expect = 'value_or_close'
+                continue
+            if punctuation == ']' and expect == 'value_or_close':
+                closed = True
+            elif punctuation is None:
+                value = json.loads(match.group(2))
+            else:
+                raise json.JSONDecodeError("Expecting value", text, start)
+        elif expect in ('key', 'key_or_close'):
+            if punctuation == '}' and expect == 'key_or_close':
+                closed = True
+            elif punctuation is None and match.group(2).startswith('"'):
+                keys[-1] = json.loads(match.group(2))
+                expect = 'colon'
+                continue
+            else:
+                raise json.JSONDecodeError("Expecting property name", text, start)
+        elif expect == 'colon':
+            if punctuation != ':':
+                raise json.JSONDecodeError("Expecting ':' delimiter", text, start)
+            expect = 'value'
+            continue
+        elif expect == 'comma_or_close':
+            is_dict = isinstance(containers[-1], dict)
+            if punctuation == ',':
+                expect = 'key' if is_dict else 'value'
+                continue
+            if punctuation != ('}' if is_dict else ']'):
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, start)
+            closed = True
+        else:
+            raise json.JSONDecodeError("Extra data", text, start)
+
+        if closed:
+            value = containers.pop()
+            keys.pop()
+        if not containers:
+            result = value
+            expect = 'end'
+        else:
+            if isinstance(containers[-1], dict):
+                containers[-1][keys[-1]] = value
+            else:
+                containers[-1].append(value)
+            expect = 'comma_or_close'
+
+
+def _literal_order(value: Any) -> Tuple[str, Any]:
+    """Sort key giving the values of a set a stable order."""
+    return (type(value).__name__, value)
+
+
+def _decode(data: memoryview, pos: int) -> Node:
+    """
+    Decode the tables and code of an encoded AST.
+
+    Args:
+        data (memoryview): The encoded AST.
+        pos (int): The position following the header.
+
+    Returns:
+        Node: The root node of the AST, or None for an empty tree.
+    """
+    tables = []
+    for _ in range(2):
+        size, pos = _read_varint(data, pos)
+        table = []
+        for _ in range(size):
+            name, pos = _read_string(data, pos)
+            table.append(name)
+        tables.append(table)
+    fields, comparisons = tables
+
+    count, pos = _read_varint(data, pos)
+    stack: List[Node] = []
+    for _ in range(count):
+        opcode = data[pos]
+        pos += 1
+        if opcode == OP_CONDITION:
+            field, pos = _read_varint(data, pos)
+            comparison, pos = _read_varint(data, pos)
+            rvalue, pos = _read_literal(data, pos)
+            condition = Condition(fields[field], rvalue, normalize_comparison(comparisons[comparison]))
+            stack.append(Node("operand", value=condition))
+        elif opcode in (OP_AND, OP_OR):
+            if len(stack) < 2:
+                raise ValueError("Malformed AST encoding")
+            right = stack.pop()
+            left = stack.pop()
+            operator = ANDOperator() if opcode == OP_AND else OROperator()
+            stack.append(Node("operator", left=left, right=right, value=operator))
+        elif opcode == OP_NOT:
+            if not stack:
+                raise ValueError("Malformed AST encoding")
+            stack.append(Node("operator", left=stack.pop(), value=NOTOperator()))
+        else:
+            raise ValueError(f"Unknown opcode {opcode}")
+
+    if pos != len(data) or len(stack) > 1:
+        raise ValueError("Malformed AST encoding")
+    return stack[0] if stack else None
+
+
+def _postfix(root: Node) -> List[Node]:
+    """
+    List the nodes of a tree in postfix order, without recursion.
+
+    Args:
+        root (Node): The root node of the tree.
+
+    Returns:
+        List[Node]: The nodes, children before their parent.
+    """
+    order = []
+    stack = [root] if root is not None else []
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        if node.node_type == 'operator':
+            stack.append(node.left)
+            if node.right is not None:
+                stack.append(node.right)
+    order.reverse()
+    return order
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    """Append an unsigned LEB128 varint."""
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: memoryview, pos: int) -> Tuple[int, int]:
+    """Read an unsigned LEB128 varint, returning it and the next position."""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _write_string(out: bytearray, value: str) -> None:
+    """Append a length-prefixed UTF-8 string."""
+    encoded = value.encode('utf-8')
+    _write_varint(out, len(encoded))
+    out += encoded
+
+
+def _read_string(data: memoryview, pos: int) -> Tuple[str, int]:
+    """Read a length-prefixed UTF-8 string, returning it and the next position."""
+    size, pos = _read_varint(data, pos)
+    return str(data[pos:pos + size], 'utf-8'), pos + size
+
+
+def _write_literal(out: bytearray, value: Any) -> None:
+    """Append a type-tagged literal."""
+    if value is None:
+        out.append(TAG_NONE)
+    elif value is False:
+        out.append(TAG_FALSE)
+    elif value is True:
+        out.append(TAG_TRUE)
+    elif isinstance(value, int):
+        out.append(TAG_INT)
+        # Zigzag encoding, for integers of any size.
+        _write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+    elif isinstance(value, float):
+        out.append(TAG_FLOAT)
+        out += _DOUBLE.pack(value)
+    elif isinstance(value, str):
+        out.append(TAG_STR)
+        _write_string(out, value)
+    elif isinstance(value, frozenset):
+        out.append(TAG_SET)
+        _write_varint(out, len(value))
+        for item in sorted(value, key=_literal_order):
+            _write_literal(out, item)
+    elif isinstance(value, tuple) and len(value) == 2:
+        out.append(TAG_PAIR)
+        _write_literal(out, value[0])
+        _write_literal(out, value[1])
+    else:
+        raise ValueError(f"Can not encode literal of type {type(value).__name__}")
+
+
+def _read_literal(data: memoryview, pos: int) -> Tuple[Any, int]:
+    """Read a type-tagged literal, returning it and the next position."""
+    tag = data[pos]
+    pos += 1
+    if tag == TAG_NONE:
+        return None, pos
+    if tag == TAG_FALSE:
+        return False, pos
+    if tag == TAG_TRUE:
+        return True, pos
+    if tag == TAG_INT:
+        value, pos = _read_varint(data, pos)
+        return (value >> 1) if not value & 1 else -((value + 1) >> 1), pos
+    if tag == TAG_FLOAT:
+        return _DOUBLE.unpack_from(data, pos)[0], pos + _DOUBLE.size
+    if tag == TAG_STR:
+        return _read_string(data, pos)
+    if tag == TAG_SET:
+        size, pos = _read_varint(data, pos)
+        values = []
+        for _ in range(size):
+            value, pos = _read_literal(data, pos)
+            values.append(value)
+        return frozenset(values), pos
+    if tag == TAG_PAIR:
+        low, pos = _read_literal(data, pos)
+        high, pos = _read_literal(data, pos)
+        return (low, high), pos
+    raise ValueError(f"Unknown literal tag {tag}")
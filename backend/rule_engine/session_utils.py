@@ -0,0 +1,360 @@
+"""
+Incremental evaluation of rules over entities receiving field updates.
+
+An EvaluationSession keeps, for every entity, its current record and the
+last result of every node of every rule. When fields of an entity change,
+only the conditions referencing those fields are evaluated again, and new
+results are propagated up through the affected AND, OR and NOT ancestors,
+stopping at the first one whose result does not change. The work done per
+update is therefore proportional to the change, not to the size of the
+rules. A MatchEvent is emitted whenever a rule starts or stops matching an
+entity.
+
+Missing fields are handled as in RuleSet: a condition on a field the
+entity does not have is false, and so is a NOT over a subtree referencing
+one. A new entity has no fields, so every node starts out false.
+"""
+
+from array import array
+from typing import Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+from rule_engine.ast_utils import AST, Condition, compile_condition
+from rule_engine.compact_utils import CompactTree, KIND_AND, KIND_OR, KIND_NOT, KIND_PREDICATE
+
+
+class MatchEvent(NamedTuple):
+    """A rule starting (matched) or stopping (unmatched) to match an entity."""
+    entity_id: Hashable
+    rule_id: Hashable
+    matched: bool
+
+
+class _SessionRule:
+    """
+    A rule of a session, as a CompactTree over its own conditions.
+
+    Attributes:
+        tree (CompactTree): The rule, with one predicate node per condition.
+        parents (array): The parent of each node, -1 for the root.
+        predicates (Tuple[Callable, ...]): The compiled conditions, by slot.
+        fields (Tuple[str, ...]): The field of each condition, by slot.
+        has_negation (bool): Whether the rule holds a NOT node.
+    """
+    __slots__ = ('tree', 'parents', 'predicates', 'fields', 'has_negation')
+
+    def __init__(self, ast: AST):
+        conditions: List[Condition] = []
+
+        def acquire(condition):
+            conditions.append(condition)
+            return len(conditions) - 1
+
+        self.tree = CompactTree.from_root(ast.root, predicate_slot=acquire)
+        self.predicates = tuple(compile_condition(condition) for condition in conditions)
+        self.fields = tuple(condition.lvariable for condition in conditions)
+        kinds, rights = self.tree.kinds, self.tree.rights
+        self.parents = array('i', [-1]) * len(kinds)
+        for index, kind in enumerate(kinds):
+            if kind != KIND_PREDICATE:
+                self.parents[index + 1] = index
+                if kind != KIND_NOT:
+                    self.parents[rights[index]] = index
+        self.has_negation = KIND_NOT in kinds
+
+    def references(self) -> Iterable[Tuple[str, int]]:
+        """List the field and node index of every condition."""
+        constants = self.tree.constants
+        for index, kind in enumerate(self.tree.kinds):
+            if kind == KIND_PREDICATE:
+                yield self.fields[constants[index]], index
+
+    def evaluate_node(self, index: int, record: Dict, results: bytearray) -> bool:
+        """
+        Evaluate one node from the current results of its children.
+
+        Args:
+            index (int): The node.
+            record (Dict): The record of the entity.
+            results (bytearray): The results of the nodes for the entity.
+
+        Returns:
+            bool: The result of the node.
+        """
+        tree = self.tree
+        kind = tree.kinds[index]
+        if kind == KIND_PREDICATE:
+            try:
+                return bool(self.predicates[tree.constants[index]](record))
+            except KeyError:
+                return False
+        if kind == KIND_NOT:
+            return not results[index + 1] and record.keys() >= tree.constant_values[tree.constants[index]]
+        if kind == KIND_AND:
+            return bool(results[index + 1] and results[tree.rights[index]])
+        return bool(results[index + 1] or results[tree.rights[index]])
+
+    def evaluate(self, record: Dict) -> bytearray:
+        """
+        Evaluate every node of the rule for a record.
+
+        Args:
+            record (Dict): The record of the entity.
+
+        Returns:
+            bytearray: The result of each node.
+        """
+        results = bytearray(len(self.tree))
+        # Children have higher indices than their parent.
+        for index in range(len(results) - 1, -1, -1):
+            results[index] = self.evaluate_node(index, record, results)
+        return results
+
+
+def _matched(results: bytearray) -> bool:
+    """Whether a rule matches, given the results of its nodes."""
+    return bool(results[0]) if results else True
+
+
+class _Entity:
+    """The record of an entity and the results of every rule's nodes for it."""
+    __slots__ = ('record', 'results')
+
+    def __init__(self, record: Dict, results: Dict[Hashable, bytearray]):
+        self.record = record
+        self.results = results
+
+
+class EvaluationSession:
+    """
+    Incremental evaluation of rules over entities, see the module docstring.
+
+    Attributes:
+        coerce (Optional[Callable[[Dict], Dict]]): Converts the changed
+            fields of an update before they are applied, e.g.
+            Schema.coerce_record.
+    """
+    def __init__(self, rules: Iterable[Tuple[Hashable, AST]] = (),
+                 coerce: Optional[Callable[[Dict], Dict]] = None):
+        self.coerce = coerce
+        self._rules: Dict[Hashable, _SessionRule] = {}
+        # The rules referencing each field, with the node indices of their
+        # conditions on it.
+        self._references: Dict[str, Dict[Hashable, Tuple[_SessionRule, List[int]]]] = {}
+        self._entities: Dict[Hashable, _Entity] = {}
+        for rule_id, ast in rules:
+            self.add_rule(rule_id, ast)
+
+    def add_rule(self, rule_id: Hashable, ast: AST) -> List[MatchEvent]:
+        """
+        Add a rule to the session, replacing any rule with the same id.
+
+        The rule is evaluated in full for every known entity.
+
+        Args:
+            rule_id (Hashable): The ID of the rule.
+            ast (AST): The AST of the rule.
+
+        Returns:
+            List[MatchEvent]: The entities the rule now matches, or no
+                longer matches if it replaced a previous version.
+
+        Raises:
+            ValueError: If the rule holds an unsupported operator.
+        """
+        rule = _SessionRule(ast)
+        previous_rule = self._rules.get(rule_id)
+        if previous_rule is not None:
+            self._drop_references(rule_id, previous_rule)
+        self._rules[rule_id] = rule
+        for field, index in rule.references():
+            references = self._references.setdefault(field, {})
+            if rule_id not in references:
+                references[rule_id] = (rule, [])
+            references[rule_id][1].append(index)
+
+        events = []
+        for entity_id, entity in self._entities.items():
+            previous = entity.results.get(rule_id)
+            results = entity.results[rule_id] = rule.evaluate(entity.record)
+            matched = _matched(results)
+            if matched != (previous is not None and _matched(previous)):
+                events.append(MatchEvent(entity_id, rule_id, matched))
+        return events
+
+    def remove_rule(self, rule_id: Hashable) -> List[MatchEvent]:
+        """
+        Remove a rule from the session.
+
+        Args:
+            rule_id (Hashable): The ID of the rule.
+
+        Returns:
+            List[MatchEvent]: The entities the rule no longer matches.
+        """
+        rule = self._rules.pop(rule_id, None)
+        if rule is None:
+            return []
+        self._drop_references(rule_id, rule)
+        events = []
+        for entity_id, entity in self._entities.items():
+            if _matched(entity.results.pop(rule_id)):
+                events.append(MatchEvent(entity_id, rule_id, False))
+        return events
+
+    def update(self, entity_id: Hashable, changes: Dict, removed: Iterable[str] = ()) -> List[MatchEvent]:
+        """
+        Apply changed and removed fields to an entity, creating it if new.
+
+        Only the conditions referencing a field whose value or presence
+        changed are evaluated again.
+
+        Args:
+            entity_id (Hashable): The ID of the entity.
+            changes (Dict): The new values of the changed fields.
+            removed (Iterable[str]): The fields the entity no longer has.
+
+        Returns:
+            List[MatchEvent]: The rules the entity started or stopped matching.
+        """
+        events = []
+        entity = self._entities.get(entity_id)
+        if entity is None:
+            entity = self._new_entity(entity_id, events)
+        if self.coerce is not None:
+            changes = self.coerce(changes)
+
+        # The changed fields, and whether their presence changed.
+        record = entity.record
+        changed: List[Tuple[str, bool]] = []
+        for field, value in changes.items():
+            if field in record:
+                old = record[field]
+                if old is value or (type(old) is type(value) and old == value):
+                    continue
+                changed.append((field, False))
+            else:
+                changed.append((field, True))
+            record[field] = value
+        for field in removed:
+            if field in record:
+                del record[field]
+                changed.append((field, True))
+
+        # The root result of each rule referencing a changed field, before
+        # the update. Such rules have nodes, the root being node 0.
+        before: Dict[Hashable, int] = {}
+        all_results = entity.results
+        for field, presence_changed in changed:
+            for rule_id, (rule, indices) in self._references.get(field, {}).items():
+                results = all_results[rule_id]
+                if rule_id not in before:
+                    before[rule_id] = results[0]
+                self._propagate(rule, indices, presence_changed, record, results)
+        for rule_id, matched in before.items():
+            if all_results[rule_id][0] != matched:
+                events.append(MatchEvent(entity_id, rule_id, not matched))
+        return events
+
+    def remove_entity(self, entity_id: Hashable) -> List[MatchEvent]:
+        """
+        Forget an entity.
+
+        Args:
+            entity_id (Hashable): The ID of the entity.
+
+        Returns:
+            List[MatchEvent]: The rules the entity no longer matches.
+        """
+        entity = self._entities.pop(entity_id, None)
+        if entity is None:
+            return []
+        return [
+            MatchEvent(entity_id, rule_id, False)
+            for rule_id, results in entity.results.items() if _matched(results)
+        ]
+
+    def matches(self, entity_id: Hashable) -> List[Hashable]:
+        """
+        List the rules an entity currently matches.
+
+        Args:
+            entity_id (Hashable): The ID of the entity.
+
+        Returns:
+            List[Hashable]: The IDs of the matching rules, in the order the
+                rules were added. Unknown entities match nothing.
+        """
+        entity = self._entities.get(entity_id)
+        if entity is None:
+            return []
+        return [rule_id for rule_id, results in entity.results.items() if _matched(results)]
+
+    def record(self, entity_id: Hashable) -> Optional[Dict]:
+        """
+        Return a copy of the current record of an entity.
+
+        Args:
+            entity_id (Hashable): The ID of the entity.
+
+        Returns:
+            Optional[Dict]: The record, or None for an unknown entity.
+        """
+        entity = self._entities.get(entity_id)
+        return dict(entity.record) if entity is not None else None
+
+    def _new_entity(self, entity_id: Hashable, events: List[MatchEvent]) -> _Entity:
+        """Register an entity without fields, recording the rules it matches."""
+        entity = self._entities[entity_id] = _Entity({}, {
+            rule_id: bytearray(len(rule.tree)) for rule_id, rule in self._rules.items()
+        })
+        for rule_id, results in entity.results.items():
+            if not results:
+                events.append(MatchEvent(entity_id, rule_id, True))
+        return entity
+
+    def _drop_references(self, rule_id: Hashable, rule: _SessionRule) -> None:
+        """Remove the conditions of a rule from the field references."""
+        for field in set(rule.fields):
+            references = self._references[field]
+            del references[rule_id]
+            if not references:
+                del self._references[field]
+
+    @staticmethod
+    def _propagate(rule: _SessionRule, indices: List[int], presence_changed: bool, record: Dict,
+                   results: bytearray) -> None:
+        """
+        Evaluate conditions again and propagate their changes to the root.
+
+        Each condition is followed up to the first ancestor whose result does
+        not change, or up to the root if the presence of its field changed,
+        which a NOT ancestor checks for. Following one condition at a time
+        keeps every node consistent with its children after each walk.
+
+        Args:
+            rule (_SessionRule): The rule.
+            indices (List[int]): The conditions on a changed field.
+            presence_changed (bool): Whether the field was added or removed.
+            record (Dict): The updated record of the entity.
+            results (bytearray): The results of the nodes, updated in place.
+        """
+        tree = rule.tree
+        kinds, rights, constants = tree.kinds, tree.rights, tree.constants
+        parents, predicates = rule.parents, rule.predicates
+        force = presence_changed and rule.has_negation
+        for index in indices:
+            try:
+                result = bool(predicates[constants[index]](record))
+            except KeyError:
+                result = False
+            while result != results[index] or force:
+                results[index] = result
+                index = parents[index]
+                if index < 0:
+                    break
+                kind = kinds[index]
+                if kind == KIND_AND:
+                    result = bool(results[index + 1] and results[rights[index]])
+                elif kind == KIND_OR:
+                    result = bool(results[index + 1] or results[rights[index]])
+                else:
+                    result = not results[index + 1] and record.keys() >= tree.constant_values[constants[index]]
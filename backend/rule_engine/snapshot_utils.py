@@ -0,0 +1,327 @@
+"""
+Snapshot files of compiled rules, evaluated in place through mmap.
+
+A snapshot holds many rules as CompactTree arrays in a single file. Opening
+it maps the file and reads its header. Looking up a rule is a binary search
+over the mapped rule IDs, and its arrays are views of the mapped buffer
+rather than copies, so a process can serve every rule of the snapshot right
+after starting, without querying the database or decoding rule trees. Only
+the field names and literals of a rule are decoded, on first lookup.
+
+The file is laid out as follows, in the byte order of the machine writing
+it, which is recorded in the header:
+
+    header     b'RSNP' magic, format version (2 bytes), byte order
+               (1 byte, 0 little, 1 big), padding, rule count (4 bytes),
+               snapshot version (8 bytes), directory offset (8 bytes)
+    rules      per rule, 8 byte aligned:
+                 kinds       one byte per node, padded to 4 bytes
+                 rights, fields, constants
+                             4 bytes per node each
+                 tables      varint field count, length-prefixed UTF-8
+                             field names, varint literal count, tagged
+                             literals, as in serialization_utils
+    directory  the rule IDs (8 bytes each), in ascending order, then per
+               rule its version (8 bytes), node count and table size
+               (4 bytes each) and offset (8 bytes)
+
+Snapshots are written to a temporary file that then replaces the previous
+snapshot in one rename, so readers only ever see a complete file. A process
+that mapped the previous snapshot keeps reading it until it opens the new
+one, which is a cheap way to swap snapshots under load.
+"""
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Optional, Set, Tuple
+from rule_engine.ast_utils import AST, Node
+from rule_engine.compact_utils import CompactTree
+from rule_engine.serialization_utils import (_read_literal, _read_string, _read_varint, _write_literal,
+                                             _write_string, _write_varint)
+
+MAGIC = b'RSNP'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('=4sHBxIQQ')
+_ENTRY = struct.Struct('=qIIQ')
+_BYTE_ORDERS = {'little': 0, 'big': 1}
+_ALIGNMENT = 8
+
+
+def write_snapshot(path: str, rules: Iterable[Tuple[int, int, Node]], version: Optional[int] = None) -> int:
+    """
+    Write rules to a snapshot file, atomically replacing any previous one.
+
+    Args:
+        path (str): The snapshot file.
+        rules (Iterable[Tuple[int, int, Node]]): The ID, version and root
+            node of each rule, in ascending ID order.
+        version (Optional[int]): The version of the snapshot, by default one
+            more than the version of the snapshot it replaces, or 1.
+
+    Returns:
+        int: The version of the snapshot.
+
+    Raises:
+        ValueError: If the rule IDs are not ascending, or a rule holds an
+            operator or literal that can not be encoded.
+    """
+    if version is None:
+        version = _previous_version(path) + 1
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(descriptor, 'wb') as output:
+            output.write(bytes(_HEADER.size))
+            offset = _HEADER.size
+            rule_ids = array('q')
+            entries = bytearray()
+            for rule_id, rule_version, root in rules:
+                if rule_ids and rule_id <= rule_ids[-1]:
+                    raise ValueError(f"Rule IDs must be ascending, got {rule_id} after {rule_ids[-1]}")
+                tree = CompactTree.from_root(root)
+                tables = bytearray()
+                _write_varint(tables, len(tree.field_names))
+                for name in tree.field_names:
+                    _write_string(tables, name)
+                _write_varint(tables, len(tree.constant_values))
+                for value in tree.constant_values:
+                    _write_literal(tables, value)
+
+                padding = -offset % _ALIGNMENT
+                data = bytearray(padding)
+                data += tree.kinds.tobytes()
+                data += bytes(-len(tree) % 4)
+                for values in (tree.rights, tree.fields, tree.constants):
+                    data += values.tobytes()
+                data += tables
+                output.write(data)
+
+                rule_ids.append(rule_id)
+                entries += _ENTRY.pack(rule_version, len(tree), len(tables), offset + padding)
+                offset += len(data)
+
+            padding = -offset % _ALIGNMENT
+            output.write(bytes(padding))
+            output.write(rule_ids.tobytes())
+            output.write(entries)
+            output.seek(0)
+            output.write(_HEADER.pack(MAGIC, FORMAT_VERSION, _BYTE_ORDERS[sys.byteorder], len(rule_ids),
+                                      version, offset + padding))
+            output.flush()
+            os.fsync(output.fileno())
+        # Temporary files are only readable by their owner.
+        os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+    return version
+
+
+def _previous_version(path: str) -> int:
+    """Read the version of an existing snapshot, 0 if there is none."""
+    try:
+        with open(path, 'rb') as snapshot:
+            header = snapshot.read(_HEADER.size)
+    except FileNotFoundError:
+        return 0
+    if len(header) < _HEADER.size or header[:4] != MAGIC:
+        return 0
+    return _HEADER.unpack(header)[4]
+
+
+class RuleSnapshot:
+    """
+    A mapped snapshot file, see the module docstring.
+
+    Rules can be discarded, e.g. once updated in the database, after which
+    lookups no longer find them.
+
+    Attributes:
+        path (str): The snapshot file.
+        version (int): The version of the snapshot.
+    """
+    def __init__(self, path: str, buffer: mmap.mmap):
+        self.path = path
+        self._buffer = buffer
+        view = memoryview(buffer)
+        if len(view) < _HEADER.size or bytes(view[:4]) != MAGIC:
+            raise ValueError(f"{path} is not a rule snapshot")
+        magic, format_version, byte_order, count, self.version, directory = _HEADER.unpack_from(view)
+        if format_version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format version {format_version}")
+        if byte_order != _BYTE_ORDERS[sys.byteorder]:
+            raise ValueError("The snapshot was written on a machine of another byte order")
+        self._entries = directory + 8 * count
+        if self._entries + _ENTRY.size * count > len(view):
+            raise ValueError(f"Truncated rule snapshot {path}")
+        self._view = view
+        self._rule_ids = view[directory:self._entries].cast('q')
+        self._discarded: Set[int] = set()
+
+    @classmethod
+    def open(cls, path: str) -> 'RuleSnapshot':
+        """
+        Map a snapshot file.
+
+        Args:
+            path (str): The snapshot file.
+
+        Returns:
+            RuleSnapshot: The snapshot.
+
+        Raises:
+            ValueError: If the file is not a valid snapshot.
+        """
+        with open(path, 'rb') as snapshot:
+            if os.fstat(snapshot.fileno()).st_size == 0:
+                raise ValueError(f"{path} is not a rule snapshot")
+            # The mapping stays valid after the file is closed or replaced.
+            buffer = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(path, buffer)
+
+    def get(self, rule_id: int) -> Optional[Tuple[CompactTree, int]]:
+        """
+        Look up a rule.
+
+        Args:
+            rule_id (int): The ID of the rule.
+
+        Returns:
+            Optional[Tuple[CompactTree, int]]: The rule, evaluated from the
+                mapped buffer, and its version, or None if the snapshot does
+                not hold it or it was discarded.
+        """
+        position = self._position(rule_id)
+        if position < 0:
+            return None
+        view = self._view
+        rule_version, nodes, table_size, offset = _ENTRY.unpack_from(view, self._entries + _ENTRY.size * position)
+        kinds = view[offset:offset + nodes]
+        offset += nodes + -nodes % 4
+        rights, fields, constants = (view[offset + 4 * nodes * index:offset + 4 * nodes * (index + 1)].cast('i')
+                                     for index in range(3))
+        field_names, constant_values = _read_tables(view[offset + 12 * nodes:offset + 12 * nodes + table_size])
+        return CompactTree(kinds, rights, fields, constants, field_names, constant_values), rule_version
+
+    def version_of(self, rule_id: int) -> Optional[int]:
+        """
+        Return the version of a rule in the snapshot.
+
+        Args:
+            rule_id (int): The ID of the rule.
+
+        Returns:
+            Optional[int]: The version, or None if the snapshot does not hold
+                the rule or it was discarded.
+        """
+        position = self._position(rule_id)
+        if position < 0:
+            return None
+        return _ENTRY.unpack_from(self._view, self._entries + _ENTRY.size * position)[0]
+
+    def discard(self, rule_id: int) -> None:
+        """
+        Stop serving a rule, e.g. because a newer version exists.
+
+        Args:
+            rule_id (int): The ID of the rule.
+        """
+        if self._position(rule_id) >= 0:
+            self._discarded.add(rule_id)
+
+    def discard_stale(self, versions: Dict[int, int]) -> int:
+        """
+        Discard the rules whose version differs from the current one.
+
+        Args:
+            versions (Dict[int, int]): The current version of every rule.
+                Rules missing from it are discarded too.
+
+        Returns:
+            int: The number of rules discarded.
+        """
+        stale = 0
+        for position, rule_id in enumerate(self._rule_ids):
+            rule_version = _ENTRY.unpack_from(self._view, self._entries + _ENTRY.size * position)[0]
+            if rule_id not in self._discarded and versions.get(rule_id) != rule_version:
+                self._discarded.add(rule_id)
+                stale += 1
+        return stale
+
+    def close(self) -> None:
+        """
+        Unmap the snapshot, unless rules looked up from it are still in use,
+        in which case it is unmapped once they are garbage collected.
+        """
+        self._rule_ids.release()
+        self._view.release()
+        try:
+            self._buffer.close()
+        except BufferError:
+            pass
+
+    def _position(self, rule_id: int) -> int:
+        """Find a rule in the directory, -1 if absent or discarded."""
+        if rule_id in self._discarded:
+            return -1
+        rule_ids = self._rule_ids
+        position = bisect_left(rule_ids, rule_id)
+        if position == len(rule_ids) or rule_ids[position] != rule_id:
+            return -1
+        return position
+
+    def __contains__(self, rule_id: int) -> bool:
+        return self._position(rule_id) >= 0
+
+    def __len__(self) -> int:
+        return len(self._rule_ids) - len(self._discarded)
+
+
+def _read_tables(data: memoryview) -> Tuple[Tuple[str, ...], Tuple]:
+    """Read the field names and literals of a rule."""
+    count, pos = _read_varint(data, 0)
+    field_names = []
+    for _ in range(count):
+        name, pos = _read_string(data, pos)
+        field_names.append(name)
+    count, pos = _read_varint(data, pos)
+    constant_values = []
+    for _ in range(count):
+        value, pos = _read_literal(data, pos)
+        constant_values.append(value)
+    return tuple(field_names), tuple(constant_values)
+
+
+class MappedAST(AST):
+    """
+    An AST evaluated by a CompactTree, such as one looked up from a
+    snapshot. Its nodes are only decoded if its root is accessed.
+
+    Attributes:
+        tree (CompactTree): The rule.
+    """
+    def __init__(self, tree: CompactTree):
+        self.tree = tree
+        self._root = None
+        self._decoded = False
+        self.compiled = tree.evaluate
+
+    @property
+    def root(self) -> Node:
+        """The root node, decoded from the tree on first access."""
+        if not self._decoded:
+            self._root = self.tree.to_root()
+            self._decoded = True
+        return self._root
+
+    @root.setter
+    def root(self, root: Node) -> None:
+        self._root = root
+        self._decoded = True
@@ -0,0 +1,84 @@
+import asyncio
+import unittest
+import httpx
+from fastapi import FastAPI
+from rule_engine.admission_utils import AdmissionController, AdmissionMiddleware
+
+def slow_app(controller, delay=0.05):
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, controller=controller, exempt_paths=("/metrics",))
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(delay)
+        return {"ok": True}
+
+    @app.get("/metrics")
+    async def metrics():
+        return controller.stats()
+    return app
+
+async def send_concurrently(app, path, count):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = await asyncio.gather(*(client.get(path) for _ in range(count)))
+    return sorted(response.status_code for response in responses)
+
+class TestAdmissionControl(unittest.TestCase):
+    def test_acquire_release(self):
+        async def scenario():
+            controller = AdmissionController(max_in_flight=2, queue_timeout=0.05)
+            self.assertTrue(await controller.acquire())
+            self.assertTrue(await controller.acquire())
+            # Waits for the timeout, then is rejected.
+            self.assertFalse(await controller.acquire())
+            # Waits until a slot is handed over.
+            waiting = asyncio.ensure_future(controller.acquire())
+            await asyncio.sleep(0)
+            self.assertEqual(controller.queued, 1)
+            controller.release()
+            self.assertTrue(await waiting)
+            self.assertEqual(controller.in_flight, 2)
+            controller.release()
+            controller.release()
+            return controller.stats()
+
+        self.assertEqual(asyncio.run(scenario()), {
+            "max_in_flight": 2, "in_flight": 0, "queued": 0, "admitted": 3, "rejected": 1,
+        })
+        with self.assertRaises(ValueError):
+            AdmissionController(max_in_flight=-1)
+
+    def test_cancelled_waiter(self):
+        async def scenario():
+            controller = AdmissionController(max_in_flight=1, queue_timeout=1)
+            await controller.acquire()
+            waiting = asyncio.ensure_future(controller.acquire())
+            await asyncio.sleep(0)
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+            # The slot is not handed over to the cancelled waiter.
+            controller.release()
+            return controller.in_flight, controller.queued
+
+        self.assertEqual(asyncio.run(scenario()), (0, 0))
+
+    def test_middleware_rejects_overload(self):
+        controller = AdmissionController(max_in_flight=2)
+        app = slow_app(controller)
+        self.assertEqual(asyncio.run(send_concurrently(app, "/slow", 5)), [200, 200, 429, 429, 429])
+        # Exempt paths are never rejected.
+        self.assertEqual(asyncio.run(send_concurrently(app, "/metrics", 5)), [200] * 5)
+        self.assertEqual(controller.in_flight, 0)
+
+        # With a queue timeout longer than the requests, all are served.
+        controller = AdmissionController(max_in_flight=2, queue_timeout=1)
+        self.assertEqual(asyncio.run(send_concurrently(slow_app(controller), "/slow", 5)), [200] * 5)
+        self.assertEqual(controller.stats()["rejected"], 0)
+
+        # Without a limit, nothing is rejected.
+        self.assertEqual(asyncio.run(send_concurrently(slow_app(AdmissionController()), "/slow", 5)), [200] * 5)
+
+if __name__ == '__main__':
+    unittest.main()
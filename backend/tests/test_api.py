@@ -0,0 +1,87 @@
+import asyncio
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import httpx
+from rule_engine.ast_utils import AST
+from rule_engine.parser_utils import parse_rule
+from rule_engine.serialization_utils import json_to_root
+
+# Too deep for the recursion limit of Python when walked recursively.
+DEEP_RULES = [
+    "NOT (" * 1500 + "age > 1" + ")" * 1500,
+    "".join(f"age > {i} OR (age > {i + 1} AND (" for i in range(1200)) + "age > 0" + "))" * 1200,
+]
+
+def _import_main():
+    """Import the API, falling back to an in-memory SQLite database."""
+    with mock.patch.dict(os.environ, {"DATABASE_URL": os.getenv("DATABASE_URL") or "sqlite://"}):
+        from rule_engine import main
+    return main
+
+async def post_all(app, requests):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return [await client.post(path, json=body) for path, body in requests]
+
+@unittest.skipIf(importlib.util.find_spec("aiosqlite") is None, "aiosqlite is not installed")
+class TestDeepRules(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from sqlalchemy import create_engine
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.pool import NullPool
+
+        cls.main = _import_main()
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "rules.db")
+        engine = create_engine(f"sqlite:///{path}")
+        cls.addClassCleanup(engine.dispose)
+        cls.main.models.Base.metadata.create_all(bind=engine)
+        cls.sessions = sessionmaker(bind=engine)
+
+        # Every request gets its own connection, as each test runs its own event loop.
+        async_sessions = async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool),
+                                            expire_on_commit=False)
+
+        async def get_async_db():
+            async with async_sessions() as db:
+                yield db
+
+        cls.main.app.dependency_overrides[cls.main.get_async_db] = get_async_db
+        cls.addClassCleanup(cls.main.app.dependency_overrides.pop, cls.main.get_async_db)
+        cls.addClassCleanup(cls.main.rule_cache.clear)
+
+    def test_create_and_evaluate(self):
+        created = asyncio.run(post_all(self.main.app, [
+            ("/create_rule", {"rule": rule, "name": f"deep{index}"}) for index, rule in enumerate(DEEP_RULES)
+        ]))
+        self.assertEqual([response.status_code for response in created], [200] * len(DEEP_RULES))
+        with self.sessions() as db:
+            rule_ids = sorted(self.main.database.get_rule_versions(db))[-len(DEEP_RULES):]
+
+        for data in ({"age": 0}, {"age": 5}):
+            responses = asyncio.run(post_all(self.main.app, [
+                ("/evaluate_rule", {"rule_id": rule_id, "data": data}) for rule_id in rule_ids
+            ] + [("/match_rules", {"data": data})]))
+            expected = [AST(parse_rule(rule)).evaluate_rule(data) for rule in DEEP_RULES]
+            self.assertEqual([response.json() for response in responses[:-1]],
+                             [{"result": result} for result in expected])
+            matched = set(responses[-1].json()["rule_ids"]) & set(rule_ids)
+            self.assertEqual(matched, {rule_id for rule_id, result in zip(rule_ids, expected) if result})
+
+    def test_combine(self):
+        response, = asyncio.run(post_all(self.main.app, [("/combine_rules", {"rules": DEEP_RULES + DEEP_RULES})]))
+        self.assertEqual(response.status_code, 200)
+        combined = AST(json_to_root(response.json()))
+        for data in ({"age": 0}, {"age": 5}):
+            expected = all(AST(parse_rule(rule)).evaluate_rule(data) for rule in DEEP_RULES)
+            self.assertEqual(combined.evaluate_rule(data), expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from benchmarks.corpus import CorpusSpec, generate_corpus
+from benchmarks.suite import compare, measure
+from rule_engine.parser_utils import parse_rule
+from rule_engine.ast_utils import AST
+
+class TestBenchmarks(unittest.TestCase):
+    def test_generate_corpus(self):
+        spec = CorpusSpec("test", depth=2, width=3, num_fields=6, num_rules=5, num_records=7)
+        corpus = generate_corpus(spec)
+        self.assertEqual(corpus, generate_corpus(spec))
+        self.assertNotEqual(corpus, generate_corpus(spec, seed=1))
+        self.assertEqual(len(corpus["rules"]), 5)
+        self.assertEqual(len(corpus["records"]), 7)
+        for rule in corpus["rules"]:
+            ast = AST(parse_rule(rule))
+            self.assertEqual(rule.count("f"), 9)
+            for data in corpus["records"]:
+                ast.evaluate_rule(data)
+
+    def test_measure(self):
+        result = measure(lambda: sum(range(100)), items=100, repeat=1)
+        self.assertGreater(result["items_per_second"], 0)
+        self.assertEqual(result["items"], 100)
+
+    def test_compare(self):
+        baseline = {"a": {"seconds_per_item": 1.0}, "b": {"seconds_per_item": 1.0}}
+        results = {
+            "a": {"seconds_per_item": 1.1},
+            "b": {"seconds_per_item": 1.5},
+            "c": {"seconds_per_item": 9.0},
+        }
+        self.assertEqual(compare(results, baseline, threshold=0.2), [("b", 1.5)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import asyncio
+import base64
+import json
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from rule_engine.bulk_utils import (encode_line, encode_lines, encode_lines_parallel, numbered_chunks, rule_to_ndjson,
+                                    stream_chunks)
+from rule_engine.serialization_utils import bytes_to_root
+
+class TestBulkImport(unittest.TestCase):
+    def test_encode_line(self):
+        row = encode_line(1, json.dumps({"name": "r", "rule": "age > 30"}))
+        self.assertEqual(row["name"], "r")
+        self.assertEqual(json.loads(row["ast_json"])["value"]["lvariable"], "age")
+        self.assertEqual(bytes_to_root(row["ast_binary"]).value.rvalue, 30)
+
+        line = json.dumps({"name": "copy", "ast_binary": base64.b64encode(row["ast_binary"]).decode()})
+        self.assertEqual(encode_line(2, line)["ast_binary"], row["ast_binary"])
+
+    def test_export_line(self):
+        row = encode_line(1, json.dumps({"name": "r", "rule": "age > 30"}))
+        # Rules stored before the binary encoding only hold their JSON.
+        rule = SimpleNamespace(id=4, name="r", ast_json=row["ast_json"], ast_binary=None)
+        line = rule_to_ndjson(rule)
+        self.assertEqual(json.loads(line)["id"], 4)
+        self.assertEqual(encode_line(1, line), row)
+
+    def test_encode_line_errors(self):
+        for line in ('{"name": "r", "rule": "age >"}', '{"rule": "age > 1"}', 'not json', '{"name": "r"}'):
+            with self.assertRaisesRegex(ValueError, "^Line 7: "):
+                encode_line(7, line)
+
+    def test_encode_lines_parallel_keeps_order(self):
+        lines = [(i + 1, json.dumps({"name": f"r{i}", "rule": f"age > {i}"})) for i in range(600)]
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            rows = encode_lines_parallel(lines, executor)
+        self.assertEqual(rows, encode_lines(lines))
+
+    def test_chunks(self):
+        lines = ["a", "", "b", "c", "  ", "d"]
+        expected = [[(1, "a"), (3, "b")], [(4, "c"), (6, "d")]]
+        self.assertEqual(list(numbered_chunks(lines, chunk_size=2)), expected)
+
+        async def collect():
+            async def stream():
+                for data in (b"a\n\nb", b"\nc\n", b"  \nd"):
+                    yield data
+            return [chunk async for chunk in stream_chunks(stream(), chunk_size=2)]
+
+        self.assertEqual(asyncio.run(collect()), expected)
+
+    def test_invalid_utf8(self):
+        async def collect(data):
+            async def stream():
+                yield data
+            return [chunk async for chunk in stream_chunks(stream())]
+
+        with self.assertRaisesRegex(ValueError, "Line 2: invalid UTF-8"):
+            asyncio.run(collect(b'a > 1\n\xff\xfe > 2\n'))
+        with self.assertRaisesRegex(ValueError, "Line 2: invalid UTF-8"):
+            asyncio.run(collect(b'a > 1\n\xff\xfe > 2'))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import time
+import unittest
+from rule_engine.ast_utils import AST
+from rule_engine.cache_utils import RuleCache
+
+class TestRuleCache(unittest.TestCase):
+    def test_hit_and_miss(self):
+        cache = RuleCache(max_size=2)
+        ast = AST()
+        self.assertIsNone(cache.get(1))
+        cache.put(1, ast)
+        self.assertIs(cache.get(1), ast)
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["size"], 1)
+
+    def test_lru_eviction(self):
+        cache = RuleCache(max_size=2)
+        cache.put(1, AST())
+        cache.put(2, AST())
+        cache.get(1)
+        cache.put(3, AST())
+        self.assertIsNone(cache.get(2))
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNotNone(cache.get(3))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_ttl_expiry(self):
+        cache = RuleCache(max_size=2, ttl=0.01)
+        cache.put(1, AST())
+        time.sleep(0.02)
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate(self):
+        cache = RuleCache()
+        cache.put(1, AST())
+        self.assertTrue(cache.invalidate(1))
+        self.assertFalse(cache.invalidate(1))
+        self.assertIsNone(cache.get(1))
+
+    def test_versions(self):
+        cache = RuleCache()
+        old, new = AST(), AST()
+        self.assertTrue(cache.put(1, old, version=1))
+        self.assertTrue(cache.invalidate(1, version=2))
+        self.assertIsNone(cache.get(1))
+        # A request that loaded version 1 before the update can not cache it back.
+        self.assertFalse(cache.put(1, old, version=1))
+        self.assertIsNone(cache.get(1))
+        self.assertTrue(cache.put(1, new, version=2))
+        self.assertIs(cache.get(1), new)
+        self.assertFalse(cache.put(1, old, version=1))
+        self.assertFalse(cache.invalidate(1, version=1))
+        self.assertIs(cache.get(1), new)
+
+    def test_compiled_evaluation(self):
+        ast = AST()
+        ast.create_rule("age > 30")
+        ast.compile()
+        self.assertIsNotNone(ast.compiled)
+        ast.create_rule("age < 30")
+        self.assertIsNone(ast.compiled)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import sys
+import unittest
+from unittest import mock
+from rule_engine.ast_utils import Node, AST, Condition, ANDOperator, OROperator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestColumnarEvaluation(unittest.TestCase):
+    def setUp(self):
+        age_condition = Condition("age", 30, 'gt')
+        department_condition = Condition("department", "Sales", 'eq')
+        and_node = Node("operator", left=Node("operand", value=age_condition), right=Node("operand", value=department_condition), value=ANDOperator())
+        salary_condition = Condition("salary", 50000, 'lt')
+        root = Node("operator", left=and_node, right=Node("operand", value=salary_condition), value=OROperator())
+        self.ast = AST(root)
+        self.records = [
+            {"age": 35, "department": "Sales", "salary": 60000},
+            {"age": 25, "department": "Sales", "salary": 60000},
+            {"age": 25, "department": "HR", "salary": 40000},
+            {"age": 40, "department": "HR", "salary": 70000},
+        ]
+
+    def test_matches_row_evaluation(self):
+        columns = {
+            "age": np.array([r["age"] for r in self.records]),
+            "department": np.array([r["department"] for r in self.records]),
+            "salary": np.array([r["salary"] for r in self.records]),
+        }
+        mask = self.ast.evaluate_columns(columns)
+        self.assertEqual(mask.dtype, bool)
+        self.assertEqual(mask.tolist(), self.ast.evaluate_many(self.records))
+
+    def test_accepts_lists(self):
+        mask = AST(Node("operand", value=Condition("age", 30, 'gt'))).evaluate_columns({"age": [20, 40]})
+        self.assertEqual(mask.tolist(), [False, True])
+
+    def test_unsupported_comparison(self):
+        mask = AST(Node("operand", value=Condition("age", 30, '>'))).evaluate_columns({"age": [20, 40]})
+        self.assertEqual(mask.tolist(), [False, False])
+
+    def test_rich_operators(self):
+        from rule_engine.parser_utils import parse_rule
+
+        ast = AST(parse_rule("NOT (age BETWEEN 25 AND 35) OR department IN ('HR', 'IT') AND salary != 40000"))
+        columns = {field: [r[field] for r in self.records] for field in ("age", "department", "salary")}
+        self.assertEqual(ast.evaluate_columns(columns).tolist(), ast.evaluate_many(self.records))
+        ast = AST(parse_rule("age >= 35 AND salary <= 60000 AND department NOT IN ('HR')"))
+        self.assertEqual(ast.evaluate_columns(columns).tolist(), [True, False, False, False])
+
+    def test_deep_tree(self):
+        from rule_engine.parser_utils import parse_rule
+
+        rule = "".join(f"age > {i} OR (salary < {i} AND (" for i in range(1500)) + "age > 0" + "))" * 1500
+        ast = AST(parse_rule(rule))
+        columns = {field: [r[field] for r in self.records] for field in ("age", "salary")}
+        self.assertEqual(ast.evaluate_columns(columns).tolist(), ast.evaluate_many(self.records))
+
+    def test_empty_root(self):
+        self.assertEqual(AST().evaluate_columns({"age": [1, 2, 3]}).tolist(), [True, True, True])
+
+    def test_mismatched_lengths(self):
+        with self.assertRaises(ValueError):
+            self.ast.evaluate_columns({"age": [1, 2], "department": ["HR"], "salary": [1, 2]})
+
+class TestColumnarWithoutNumpy(unittest.TestCase):
+    def test_names_extra(self):
+        # A None entry makes importing the module fail, as if not installed.
+        with mock.patch.dict(sys.modules, {"numpy": None}):
+            sys.modules.pop("rule_engine.columnar_utils", None)
+            with self.assertRaisesRegex(ImportError, r"rule-engine\[columnar\]"):
+                AST(Node("operand", value=Condition("age", 30, 'gt'))).evaluate_columns({"age": [20, 40]})
+
+if __name__ == '__main__':
+    unittest.main()
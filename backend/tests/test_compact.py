@@ -0,0 +1,64 @@
+import random
+import unittest
+from rule_engine.ast_utils import Node, AST, Condition, ANDOperator, OROperator, NOTOperator
+from rule_engine.compact_utils import CompactTree
+from rule_engine.parser_utils import parse_rule
+from rule_engine.serialization_utils import root_to_json
+
+def random_tree(rng, depth):
+    if depth == 0 or rng.random() < 0.3:
+        field = rng.choice(["age", "salary", "department"])
+        if field == "department":
+            comparison_type = rng.choice(["eq", "ne", "in", "not_in"])
+            rvalue = rng.choice(["Sales", "HR"])
+            if comparison_type in ("in", "not_in"):
+                rvalue = frozenset([rvalue, "IT"])
+        else:
+            comparison_type = rng.choice(["gt", "lt", "ge", "le", "between", "lteq"])
+            rvalue = (rng.randint(0, 5), rng.randint(5, 10)) if comparison_type == "between" else rng.randint(0, 10)
+        return Node("operand", value=Condition(field, rvalue, comparison_type))
+    if rng.random() < 0.15:
+        return Node("operator", left=random_tree(rng, depth - 1), value=NOTOperator())
+    operator = ANDOperator() if rng.random() < 0.5 else OROperator()
+    return Node("operator", left=random_tree(rng, depth - 1), right=random_tree(rng, depth - 1), value=operator)
+
+class TestCompactTree(unittest.TestCase):
+    def test_matches_ast(self):
+        rng = random.Random(11)
+        for _ in range(200):
+            root = random_tree(rng, 5)
+            tree = CompactTree.from_root(root)
+            self.assertEqual(root_to_json(tree.to_root()), root_to_json(root))
+            for _ in range(10):
+                data = {"age": rng.randint(0, 10), "salary": rng.randint(0, 10), "department": rng.choice(["Sales", "HR", "IT"])}
+                self.assertEqual(tree.evaluate(data), AST(root).compile()(data))
+
+    def test_layout(self):
+        tree = CompactTree.from_root(parse_rule("(age > 30 AND department = 'Sales') OR age < 30"))
+        self.assertEqual(len(tree), 5)
+        self.assertEqual(tree.rights.tolist(), [4, 3, -1, -1, -1])
+        self.assertEqual(tree.field_names, ("age", "department"))
+        self.assertEqual(tree.constant_values, (30, "Sales"))
+        self.assertEqual(tree.nbytes, 5 * (1 + 3 * tree.rights.itemsize))
+
+    def test_short_circuit_and_missing_fields(self):
+        tree = CompactTree.from_root(parse_rule("age > 30 OR salary > 50000"))
+        self.assertTrue(tree.evaluate({"age": 35}))
+        with self.assertRaises(KeyError):
+            tree.evaluate({"age": 25})
+
+    def test_deep_tree(self):
+        root = Node("operand", value=Condition("age", 0, 'gt'))
+        for i in range(1, 20000):
+            root = Node("operator", left=root, right=Node("operand", value=Condition("age", i + 1, 'lt')), value=ANDOperator())
+        tree = CompactTree.from_root(root)
+        self.assertTrue(tree.evaluate({"age": 1}))
+        self.assertFalse(tree.evaluate({"age": 0}))
+
+    def test_empty_tree(self):
+        tree = CompactTree.from_root(None)
+        self.assertTrue(tree.evaluate({}))
+        self.assertIsNone(tree.to_root())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import importlib.util
+import os
+import unittest
+from unittest import mock
+
+def _import_models():
+    """Import the models, falling back to an in-memory SQLite database."""
+    with mock.patch.dict(os.environ, {"DATABASE_URL": os.getenv("DATABASE_URL") or "sqlite://"}):
+        from rule_engine import models
+    return models
+
+class TestDatabaseConfig(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.models = _import_models()
+
+    def test_async_database_url(self):
+        self.assertEqual(
+            self.models.async_database_url("postgresql://u:p@host:5432/db"),
+            "postgresql+asyncpg://u:p@host:5432/db"
+        )
+        self.assertEqual(
+            self.models.async_database_url("postgresql+psycopg2://host/db"),
+            "postgresql+asyncpg://host/db"
+        )
+        self.assertEqual(self.models.async_database_url("sqlite:///rules.db"), "sqlite+aiosqlite:///rules.db")
+
+    def test_pool_options(self):
+        env = {"DB_POOL_SIZE": "20", "DB_MAX_OVERFLOW": "5", "DB_POOL_PRE_PING": "true"}
+        with mock.patch.dict(os.environ, env):
+            options = self.models.pool_options("postgresql://host/db")
+            self.assertEqual(options["pool_size"], 20)
+            self.assertEqual(options["max_overflow"], 5)
+            self.assertTrue(options["pool_pre_ping"])
+            self.assertEqual(self.models.pool_options("sqlite://"), {"pool_pre_ping": True})
+
+class TestBulkDatabase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.models = _import_models()
+
+    def test_create_and_iter_rules(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from rule_engine import database
+
+        engine = create_engine("sqlite://")
+        self.models.Base.metadata.create_all(bind=engine)
+        rows = ({"name": f"r{i}", "ast_json": "{}", "ast_binary": bytes([i])} for i in range(25))
+        with sessionmaker(bind=engine)() as db:
+            self.assertEqual(database.create_rules(db, rows, chunk_size=10), 25)
+            rules = list(database.iter_rules(db, batch_size=4))
+        self.assertEqual([rule.name for rule in rules], [f"r{i}" for i in range(25)])
+        self.assertEqual(rules[-1].ast_binary, bytes([24]))
+
+    def test_update_rule(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from rule_engine import database
+
+        engine = create_engine("sqlite://")
+        self.models.Base.metadata.create_all(bind=engine)
+        with sessionmaker(bind=engine)() as db:
+            rule = database.create_rule(db, "rule", "{}")
+            self.assertEqual(rule.version, 1)
+            updated = database.update_rule(db, rule.id, '{"v": 2}', b"RAST", expected_version=1)
+            self.assertEqual((updated.version, updated.name, updated.ast_json), (2, "rule", '{"v": 2}'))
+            self.assertIsNone(database.update_rule(db, rule.id, "{}", expected_version=1))
+            self.assertIsNone(database.update_rule(db, rule.id + 1, "{}"))
+            updated = database.update_rule(db, rule.id, "{}", rule_name="renamed")
+            self.assertEqual((updated.version, updated.name), (3, "renamed"))
+            self.assertEqual(database.get_rule_versions(db), {rule.id: 3})
+
+@unittest.skipIf(importlib.util.find_spec("aiosqlite") is None, "aiosqlite is not installed")
+class TestAsyncDatabase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.models = _import_models()
+
+    def test_create_and_get_rule(self):
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        from rule_engine import database
+
+        async def run():
+            engine = create_async_engine("sqlite+aiosqlite://")
+            async with engine.begin() as conn:
+                await conn.run_sync(self.models.Base.metadata.create_all)
+            async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+                created = await database.create_rule_async(db, "rule", "{}", b"RAST")
+                fetched = await database.get_rule_async(db, created.id)
+                missing = await database.get_rule_async(db, created.id + 1)
+            await engine.dispose()
+            return created, fetched, missing
+
+        created, fetched, missing = asyncio.run(run())
+        self.assertEqual(fetched.id, created.id)
+        self.assertEqual(fetched.name, "rule")
+        self.assertEqual(fetched.ast_binary, b"RAST")
+        self.assertIsNone(missing)
+
+if __name__ == "__main__":
+    unittest.main()
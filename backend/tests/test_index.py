@@ -0,0 +1,109 @@
+import random
+import unittest
+from rule_engine.ast_utils import Node, AST, Condition, ANDOperator, OROperator, NOTOperator
+from rule_engine.index_utils import PredicateIndex, IndexedRuleSet
+from rule_engine.ruleset_utils import RuleSet
+
+FIELDS = {
+    "age": lambda rng: rng.randint(18, 70),
+    "salary": lambda rng: rng.choice([rng.randint(20000, 120000), rng.random() * 100000]),
+    "department": lambda rng: rng.choice(["Sales", "Marketing", "HR", "Engineering"]),
+}
+
+def random_condition(rng):
+    field = rng.choice(list(FIELDS))
+    comparison_type = rng.choice(['gt', 'lt', 'eq', 'lteq', 'ge', 'le', 'ne', 'in', 'not_in', 'between'])
+    if comparison_type in ('in', 'not_in'):
+        return Condition(field, frozenset(FIELDS[field](rng) for _ in range(3)), comparison_type)
+    if comparison_type == 'between':
+        return Condition(field, tuple(sorted(FIELDS[field](rng) for _ in range(2))), comparison_type)
+    return Condition(field, FIELDS[field](rng), comparison_type)
+
+def random_tree(rng, depth):
+    if depth == 0 or rng.random() < 0.3:
+        return Node("operand", value=random_condition(rng))
+    if rng.random() < 0.1:
+        return Node("operator", left=random_tree(rng, depth - 1), value=NOTOperator())
+    operator = ANDOperator() if rng.random() < 0.5 else OROperator()
+    return Node("operator", left=random_tree(rng, depth - 1), right=random_tree(rng, depth - 1), value=operator)
+
+class TestPredicateIndex(unittest.TestCase):
+    def test_lookup(self):
+        index = PredicateIndex()
+        index.add(0, Condition("age", 30, 'gt'))
+        index.add(1, Condition("age", 40, 'gt'))
+        index.add(2, Condition("age", 40, 'lt'))
+        index.add(3, Condition("department", "Sales", 'eq'))
+        self.assertEqual(index.lookup({"age": 35, "department": "Sales"}), {0, 2, 3})
+        self.assertEqual(index.lookup({"age": 45}), {0, 1})
+        self.assertEqual(index.lookup({"age": "45", "department": ["Sales"]}), set())
+
+        index.remove(0, Condition("age", 30, 'gt'))
+        self.assertEqual(index.lookup({"age": 35}), {2})
+
+    def test_lookup_sets_and_inclusive_ranges(self):
+        index = PredicateIndex()
+        departments = frozenset(f"Department {i}" for i in range(500))
+        index.add(0, Condition("department", departments, 'in'))
+        index.add(1, Condition("department", "Department 7", 'eq'))
+        index.add(2, Condition("age", 30, 'ge'))
+        index.add(3, Condition("age", 30, 'le'))
+        self.assertEqual(index.lookup({"department": "Department 7", "age": 30}), {0, 1, 2, 3})
+        self.assertEqual(index.lookup({"department": "Department 8", "age": 31}), {0, 2})
+        self.assertEqual(index.lookup({"department": "Sales", "age": 29}), {3})
+
+        index.remove(0, Condition("department", departments, 'in'))
+        self.assertEqual(index.lookup({"department": "Department 7"}), {1})
+
+    def test_is_indexable(self):
+        self.assertTrue(PredicateIndex.is_indexable(Condition("age", 30, 'gt')))
+        self.assertFalse(PredicateIndex.is_indexable(Condition("age", 30, '>')))
+        self.assertFalse(PredicateIndex.is_indexable(Condition("age", [30], 'eq')))
+        self.assertTrue(PredicateIndex.is_indexable(Condition("age", frozenset({30}), 'in')))
+        self.assertFalse(PredicateIndex.is_indexable(Condition("age", frozenset({30}), 'not_in')))
+        self.assertFalse(PredicateIndex.is_indexable(Condition("age", (20, 30), 'between')))
+
+class TestIndexedRuleSet(unittest.TestCase):
+    def test_matches_rule_set(self):
+        rng = random.Random(7)
+        rules = [(rule_id, AST(random_tree(rng, 3))) for rule_id in range(300)]
+        rules.append((300, AST()))
+        plain, indexed = RuleSet.from_rules(rules), IndexedRuleSet.from_rules(rules)
+        roots = {rule_id: ast.root for rule_id, ast in rules}
+
+        for rule_id in range(0, 300, 3):
+            plain.remove_rule(rule_id)
+            indexed.remove_rule(rule_id)
+            del roots[rule_id]
+        for rule_id in range(1, 300, 7):
+            ast = AST(random_tree(rng, 3))
+            plain.add_rule(rule_id, ast)
+            indexed.add_rule(rule_id, ast)
+            roots[rule_id] = ast.root
+
+        compact = IndexedRuleSet.from_rules(
+            ((rule_id, AST(root)) for rule_id, root in roots.items()), compact=True
+        )
+        for _ in range(200):
+            data = {field: generate(rng) for field, generate in FIELDS.items() if rng.random() < 0.9}
+            self.assertEqual(indexed.match(data), plain.match(data))
+            self.assertEqual(compact.match(data), plain.match(data))
+
+    def test_candidates(self):
+        rule_set = IndexedRuleSet.from_rules([
+            (1, AST(Node("operand", value=Condition("age", 30, 'gt')))),
+            (2, AST(Node("operand", value=Condition("department", "Sales", 'eq')))),
+            (3, AST(Node("operand", value=Condition("age", 30, '>')))),
+        ])
+        self.assertEqual(rule_set.candidates(rule_set.index.lookup({"age": 35})), [1, 3])
+        self.assertEqual(rule_set.match({"age": 35, "department": "Sales"}), [1, 2])
+
+    def test_negated_rules_are_candidates(self):
+        negated = Node("operator", left=Node("operand", value=Condition("age", 30, 'gt')), value=NOTOperator())
+        rule_set = IndexedRuleSet.from_rules([(1, AST(negated))])
+        self.assertEqual(rule_set.match({"age": 25}), [1])
+        self.assertEqual(rule_set.match({"age": 35}), [])
+        self.assertEqual(rule_set.match({}), [])
+
+if __name__ == '__main__':
+    unittest.main()
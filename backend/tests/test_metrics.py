@@ -0,0 +1,80 @@
+import unittest
+from rule_engine.ast_utils import AST, Node, Condition, ANDOperator, OROperator
+from rule_engine.ast_utils import NOTOperator
+from rule_engine.metrics_utils import Histogram, MetricsRegistry, RuleProfile, describe_node
+
+def condition(field, value, comparison_type):
+    return Node("operand", value=Condition(field, value, comparison_type))
+
+RECORDS = [
+    {"age": 35, "department": "Sales"},
+    {"age": 35, "department": "Marketing"},
+    {"age": 20, "department": "Sales"},
+    {"age": 20, "department": "Marketing"},
+]
+
+class TestRuleProfile(unittest.TestCase):
+    def setUp(self):
+        # age > 30 AND (department = 'Sales' OR age < 25)
+        self.root = Node(
+            "operator",
+            left=condition("age", 30, "gt"),
+            right=Node(
+                "operator",
+                left=condition("department", "Sales", "eq"),
+                right=condition("age", 25, "lt"),
+                value=OROperator()
+            ),
+            value=ANDOperator()
+        )
+
+    def test_profile_counts(self):
+        profile = RuleProfile(1, self.root)
+        evaluate = profile.compile()
+        results = [evaluate(data) for data in RECORDS]
+        self.assertEqual(results, AST(self.root).evaluate_many(RECORDS))
+
+        summary = {node["description"]: node for node in profile.to_dict()["nodes"]}
+        self.assertEqual(summary["AND"]["evaluations"], 4)
+        self.assertEqual(summary["AND"]["short_circuit_rate"], 0.5)
+        self.assertEqual(summary["AND"]["true_rate"], 0.25)
+        self.assertEqual(summary["OR"]["evaluations"], 2)
+        self.assertEqual(summary["OR"]["short_circuit_rate"], 0.5)
+        self.assertEqual(summary["age gt 30"]["true_rate"], 0.5)
+        self.assertEqual(summary["age lt 25"]["evaluations"], 1)
+        self.assertEqual(summary["age lt 25"]["true_rate"], 0.0)
+        self.assertEqual(profile.latency.count, 4)
+
+    def test_negation_and_sets(self):
+        root = Node("operator", left=condition("department", frozenset({"Sales", "HR"}), "in"), value=NOTOperator())
+        profile = RuleProfile(1, root)
+        evaluate = profile.compile()
+        self.assertEqual([evaluate(data) for data in RECORDS], [False, True, False, True])
+        self.assertEqual(describe_node(root.left), "department in ['HR', 'Sales']")
+        nodes = profile.to_dict()["nodes"]
+        self.assertEqual((nodes[0]["description"], nodes[0]["true_rate"]), ("NOT", 0.5))
+        self.assertNotIn("short_circuit_rate", nodes[0])
+
+    def test_histogram(self):
+        histogram = Histogram(bounds=(1.0, 2.0))
+        for value in (0.5, 1.0, 1.5, 3.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [("1.0", 2), ("2.0", 3), ("+Inf", 4)])
+        self.assertEqual(histogram.sum, 6.0)
+
+    def test_prometheus(self):
+        registry = MetricsRegistry(enabled=True)
+        evaluate = registry.compile(7, self.root)
+        evaluate(RECORDS[0])
+        text = registry.to_prometheus({"up": ("gauge", "Up.", 1)})
+        self.assertIn("up 1\n", text)
+        self.assertIn('rule_evaluation_seconds_count{rule_id="7"} 1\n', text)
+        self.assertIn('rule_evaluation_seconds_bucket{rule_id="7",le="+Inf"} 1\n', text)
+        self.assertIn('rule_node_evaluations_total{rule_id="7",node="0"} 1\n', text)
+        self.assertNotIn('rule_node_short_circuits_total{rule_id="7",node="1"}', text)
+        self.assertIs(registry.get(7).rule_id, 7)
+        registry.clear()
+        self.assertIsNone(registry.get(7))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+import random
+import unittest
+from rule_engine.ast_utils import Node, AST, Condition, ANDOperator, OROperator, NOTOperator
+from rule_engine.optimizer_utils import SelectivityStats, keep_original_order, reorder, simplify
+from rule_engine.serialization_utils import root_to_json
+
+def operand(lvariable, rvalue, comparison_type):
+    return Node("operand", value=Condition(lvariable, rvalue, comparison_type))
+
+def chain(operator_class, *nodes):
+    root = nodes[0]
+    for node in nodes[1:]:
+        root = Node("operator", left=root, right=node, value=operator_class())
+    return root
+
+def negate(node):
+    return Node("operator", left=node, value=NOTOperator())
+
+def leaves(node):
+    if node.node_type == 'operand':
+        return [(node.value.lvariable, node.value.rvalue)]
+    if isinstance(node.value, NOTOperator):
+        return leaves(node.left)
+    return leaves(node.left) + leaves(node.right)
+
+class TestReorder(unittest.TestCase):
+    def test_static_cost_order(self):
+        root = chain(ANDOperator, operand("department", "Engineering", 'eq'), operand("age", 30, 'gt'), operand("salary", 50000, 'eq'))
+        reordered = reorder(root)
+        self.assertEqual(leaves(reordered), [("salary", 50000), ("department", "Engineering"), ("age", 30)])
+        self.assertEqual(leaves(root), [("department", "Engineering"), ("age", 30), ("salary", 50000)])
+
+    def test_observed_selectivity(self):
+        root = chain(OROperator, operand("age", 30, 'gt'), operand("salary", 50000, 'gt'))
+        stats = SelectivityStats()
+        stats.observe(root, [{"age": 20, "salary": 60000}] * 9 + [{"age": 40, "salary": 10000}])
+        self.assertAlmostEqual(stats.selectivity(Condition("salary", 50000, 'gt')), 0.9)
+        self.assertIsNone(stats.selectivity(Condition("salary", 1, 'gt')))
+        self.assertEqual(leaves(reorder(root, stats)), [("salary", 50000), ("age", 30)])
+
+        stats = SelectivityStats()
+        stats.observe(root, [{"age": 20, "salary": 60000}] * 9 + [{"age": 40, "salary": 10000}])
+        self.assertEqual(leaves(reorder(chain(ANDOperator, root.left, root.right), stats)), [("age", 30), ("salary", 50000)])
+
+    def test_nested_operators_keep_structure(self):
+        inner = chain(OROperator, operand("department", "Sales", 'eq'), operand("age", 30, 'gt'))
+        root = chain(ANDOperator, inner, operand("salary", 50000, 'gt'))
+        reordered = reorder(root)
+        self.assertIsInstance(reordered.value, ANDOperator)
+        self.assertEqual(leaves(reordered), [("salary", 50000), ("age", 30), ("department", "Sales")])
+
+    def test_negation(self):
+        # NOT department = 'Sales' is likely true, so it goes last under AND.
+        root = chain(ANDOperator, negate(operand("department", "Sales", 'eq')), operand("age", 30, 'gt'))
+        reordered = reorder(root)
+        self.assertEqual(leaves(reordered), [("age", 30), ("department", "Sales")])
+        self.assertIsInstance(reordered.right.value, NOTOperator)
+
+    def test_results_unchanged(self):
+        rng = random.Random(3)
+
+        def random_tree(depth):
+            if depth == 0 or rng.random() < 0.3:
+                field = rng.choice(["age", "salary", "department"])
+                rvalue = rng.choice(["Sales", "HR"]) if field == "department" else rng.randint(0, 100)
+                return operand(field, rvalue, rng.choice(['gt', 'lt', 'eq']))
+            operator_class = rng.choice([ANDOperator, OROperator])
+            return chain(operator_class, random_tree(depth - 1), random_tree(depth - 1))
+
+        for _ in range(50):
+            root = random_tree(4)
+            records = [{"age": rng.randint(0, 100), "salary": rng.randint(0, 100), "department": rng.choice(["Sales", "HR"])} for _ in range(20)]
+            self.assertEqual(AST(reorder(root)).evaluate_many(records), AST(root).evaluate_many(records))
+
+    def test_sparse_records(self):
+        root = chain(ANDOperator, operand("age", 30, 'gt'), operand("department", "Sales", 'eq'))
+        reordered = reorder(root)
+        self.assertEqual(leaves(reordered), [("department", "Sales"), ("age", 30)])
+        evaluate = keep_original_order(AST(reordered).compile(), root)
+        self.assertFalse(evaluate({"age": 20}))
+        self.assertTrue(evaluate({"age": 40, "department": "Sales"}))
+        with self.assertRaises(KeyError):
+            evaluate({"age": 40})
+
+        # A mistyped field the original order short-circuits past.
+        root = chain(ANDOperator, operand("department", (1, 3), 'between'), operand("age", 5, 'gt'))
+        reordered = reorder(root)
+        self.assertEqual(leaves(reordered), [("age", 5), ("department", (1, 3))])
+        evaluate = keep_original_order(AST(reordered).compile(), root)
+        self.assertFalse(evaluate({"department": 0, "age": "x"}))
+        with self.assertRaises(TypeError):
+            evaluate({"department": 2, "age": "x"})
+
+        rng = random.Random(5)
+        fields = ["age", "salary", "department"]
+
+        def random_tree(depth):
+            if depth == 0 or rng.random() < 0.3:
+                return operand(rng.choice(fields), rng.randint(0, 100), rng.choice(['gt', 'lt', 'eq']))
+            if rng.random() < 0.2:
+                return negate(random_tree(depth - 1))
+            return chain(rng.choice([ANDOperator, OROperator]), random_tree(depth - 1), random_tree(depth - 1))
+
+        for _ in range(50):
+            root = random_tree(4)
+            evaluate = keep_original_order(AST(reorder(root)).compile(), root)
+            for _ in range(20):
+                record = {field: rng.randint(0, 100) for field in fields if rng.random() < 0.6}
+                try:
+                    expected = AST(root).evaluate_rule(record)
+                except KeyError:
+                    continue
+                self.assertEqual(evaluate(record), expected)
+
+    def test_deep_tree(self):
+        # NOT NOT ... (age > 1999 OR (department = 'Sales' AND (age > 1998 OR ...))), too deep to recurse.
+        root = operand("age", 0, 'gt')
+        for i in range(1, 2000):
+            inner = chain(ANDOperator, operand("department", "Sales", 'eq'), root)
+            root = chain(OROperator, operand("age", i, 'gt'), inner)
+        for _ in range(2000):
+            root = negate(root)
+        reordered = reorder(root)
+        for data in ({"age": 0, "department": "Sales"}, {"age": 1, "department": "HR"}, {"age": 5000, "department": "HR"}):
+            self.assertEqual(AST(reordered).evaluate_rule(data), AST(root).evaluate_rule(data))
+
+    def test_empty_tree(self):
+        self.assertIsNone(reorder(None))
+class TestSimplify(unittest.TestCase):
+    def test_duplicate_conjuncts(self):
+        first = chain(ANDOperator, operand("age", 30, 'gt'), operand("department", "Sales", 'eq'))
+        second = chain(ANDOperator, operand("age", 30, 'gt'), operand("salary", 50000, 'gt'))
+        root = simplify(chain(ANDOperator, first, second))
+        self.assertEqual(leaves(root), [("age", 30), ("department", "Sales"), ("salary", 50000)])
+
+    def test_fold_ranges(self):
+        root = chain(ANDOperator, operand("age", 30, 'gt'), operand("age", 40, 'gt'), operand("age", 60, 'lt'), operand("age", 50, 'lt'))
+        self.assertEqual(leaves(simplify(root)), [("age", 40), ("age", 50)])
+
+        root = chain(OROperator, operand("age", 30, 'gt'), operand("age", 40, 'gt'))
+        self.assertEqual(leaves(simplify(root)), [("age", 30)])
+
+        root = chain(ANDOperator, operand("age", 30, 'gt'), operand("age", "30", 'gt'))
+        self.assertEqual(leaves(simplify(root)), [("age", 30), ("age", "30")])
+
+    def test_factor_common_operands(self):
+        first = chain(ANDOperator, operand("age", 30, 'gt'), operand("department", "Sales", 'eq'))
+        second = chain(ANDOperator, operand("salary", 50000, 'gt'), operand("age", 30, 'gt'))
+        root = simplify(chain(OROperator, first, second))
+        self.assertIsInstance(root.value, ANDOperator)
+        self.assertEqual(leaves(root), [("age", 30), ("department", "Sales"), ("salary", 50000)])
+        self.assertIsInstance(root.right.value, OROperator)
+
+    def test_absorption(self):
+        root = chain(ANDOperator, operand("age", 30, 'gt'), chain(OROperator, operand("salary", 50000, 'gt'), operand("age", 30, 'gt')))
+        self.assertEqual(leaves(simplify(root)), [("age", 30)])
+
+    def test_negation(self):
+        self.assertEqual(leaves(simplify(negate(negate(operand("age", 30, 'gt'))))), [("age", 30)])
+        root = simplify(chain(ANDOperator, negate(operand("age", 30, 'gt')), negate(operand("age", 30, 'gt'))))
+        self.assertIsInstance(root.value, NOTOperator)
+
+    def test_hash_consing(self):
+        left = chain(OROperator, chain(ANDOperator, operand("a", 1, 'eq'), operand("b", 1, 'eq')), operand("c", 1, 'eq'))
+        right = chain(OROperator, chain(ANDOperator, operand("b", 1, 'eq'), operand("a", 1, 'eq')), operand("d", 1, 'eq'))
+        root = simplify(chain(OROperator, chain(ANDOperator, operand("x", 1, 'eq'), left), chain(ANDOperator, operand("y", 1, 'eq'), right)))
+        self.assertIs(root.left.right.left, root.right.right.left)
+        self.assertEqual(leaves(root.left.right.left), [("a", 1), ("b", 1)])
+
+    def test_results_unchanged(self):
+        rng = random.Random(5)
+
+        def random_tree(depth):
+            if depth == 0 or rng.random() < 0.3:
+                field = rng.choice(["age", "salary", "department"])
+                rvalue = rng.choice(["Sales", "HR"]) if field == "department" else rng.randint(0, 10)
+                return operand(field, rvalue, rng.choice(['gt', 'lt', 'eq', 'ge', 'ne']))
+            if rng.random() < 0.1:
+                return negate(random_tree(depth - 1))
+            operator_class = rng.choice([ANDOperator, OROperator])
+            return chain(operator_class, random_tree(depth - 1), random_tree(depth - 1))
+
+        for _ in range(200):
+            root = random_tree(5)
+            records = [{"age": rng.randint(0, 10), "salary": rng.randint(0, 10), "department": rng.choice(["Sales", "HR"])} for _ in range(30)]
+            self.assertEqual(AST(simplify(root)).evaluate_many(records), AST(root).evaluate_many(records))
+
+    def test_deep_tree(self):
+        # age > 1999 OR (age < 1999 AND (age > 1998 OR ...)), ANDed with itself.
+        def deep_rule():
+            root = operand("age", 0, 'gt')
+            for i in range(1, 2000):
+                root = chain(OROperator, operand("age", i, 'gt'), chain(ANDOperator, operand("age", i, 'lt'), root))
+            return root
+
+        root = deep_rule()
+        simplified = simplify(chain(ANDOperator, root, deep_rule()))
+        self.assertIsInstance(simplified.value, OROperator)
+        for age in (0, 1, 1000, 5000):
+            self.assertEqual(AST(simplified).evaluate_rule({"age": age}), AST(root).evaluate_rule({"age": age}))
+        # The duplicate rule is dropped, and the double negation removed.
+        self.assertEqual(root_to_json(simplified), root_to_json(simplify(negate(negate(root)))))
+
+    def test_empty_tree(self):
+        self.assertIsNone(simplify(None))
+
+if __name__ == '__main__':
+    unittest.main()
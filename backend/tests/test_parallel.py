@@ -0,0 +1,62 @@
+import importlib.util
+import unittest
+from rule_engine.ast_utils import AST, Node, Condition, ANDOperator, OROperator
+from rule_engine.index_utils import IndexedRuleSet
+from rule_engine.parallel_utils import ParallelEvaluator
+
+def condition(field, value, comparison_type):
+    return Node("operand", value=Condition(field, value, comparison_type))
+
+RECORDS = [
+    {"age": age, "department": department, "salary": salary}
+    for age in (20, 35, 50)
+    for department in ("Sales", "Marketing")
+    for salary in (10000, 60000)
+] * 5
+
+class TestParallelEvaluator(unittest.TestCase):
+    def setUp(self):
+        self.ast = AST(Node(
+            "operator",
+            left=condition("age", 30, "gt"),
+            right=Node(
+                "operator",
+                left=condition("department", "Sales", "eq"),
+                right=condition("salary", 50000, "gt"),
+                value=OROperator()
+            ),
+            value=ANDOperator()
+        ))
+
+    def test_map_keeps_order(self):
+        with ParallelEvaluator(self.ast, workers=2, chunk_size=7) as evaluator:
+            self.assertEqual(list(evaluator.map(RECORDS)), self.ast.evaluate_many(RECORDS))
+            self.assertEqual(list(evaluator.map(iter(RECORDS[:3]))), self.ast.evaluate_many(RECORDS[:3]))
+            self.assertEqual(list(evaluator.map([])), [])
+
+    def test_map_missing_field(self):
+        with ParallelEvaluator(self.ast, workers=2, chunk_size=2) as evaluator:
+            with self.assertRaises(KeyError):
+                list(evaluator.map([{"age": 40, "department": "Sales"}, {"age": 40}]))
+
+    def test_rule_set(self):
+        rules = [(1, self.ast), (2, AST(condition("salary", 50000, "lt"))), (3, AST())]
+        expected = [IndexedRuleSet.from_rules(rules).match(data) for data in RECORDS]
+        with ParallelEvaluator(rules, workers=2, chunk_size=4) as evaluator:
+            self.assertEqual(list(evaluator.map(RECORDS)), expected)
+            with self.assertRaises(ValueError):
+                evaluator.evaluate_columns({"age": [1]})
+
+    @unittest.skipIf(importlib.util.find_spec("numpy") is None, "numpy is not installed")
+    def test_evaluate_columns(self):
+        columns = {
+            "age": [data["age"] for data in RECORDS],
+            "department": [data["department"] for data in RECORDS],
+            "salary": [float(data["salary"]) for data in RECORDS],
+        }
+        with ParallelEvaluator(self.ast, workers=2, chunk_size=8) as evaluator:
+            mask = evaluator.evaluate_columns(columns)
+        self.assertEqual(mask.tolist(), self.ast.evaluate_many(RECORDS))
+
+if __name__ == "__main__":
+    unittest.main()
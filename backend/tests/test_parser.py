@@ -1,5 +1,5 @@
 import unittest
-from rule_engine.parser_utils import tokenize, Parser
+from rule_engine.parser_utils import tokenize, scan, parse_rule, Parser
 from rule_engine.ast_utils import Node, AST
 
 class TestParser(unittest.TestCase):
@@ -23,13 +23,71 @@ class TestParser(unittest.TestCase):
         ast = AST()
         ast.create_rule(rule)
         json_data = {"age": 35, "department": "Sales", "salary": 60000, "experience": 3}
-        self.assertFalse(ast.evaluate_rule(json_data))
+        self.assertTrue(ast.evaluate_rule(json_data))
 
         json_data = {"age": 22, "department": "Sales", "salary": 45000, "experience": 6}
-        self.assertFalse(ast.evaluate_rule(json_data))
+        self.assertTrue(ast.evaluate_rule(json_data))
 
         json_data = {"age": 40, "department": "HR", "salary": 40000, "experience": 4}
         self.assertFalse(ast.evaluate_rule(json_data))
 
+    def test_scanner(self):
+        tokens = scan("(age >= 30 AND name != 'New York') || score < -1.5 ;")
+        self.assertEqual([(token.kind, token.value) for token in tokens], [
+            ('LPAREN', '('), ('NAME', 'age'), ('COMPARISON', '>='), ('NUMBER', 30), ('AND', 'AND'),
+            ('NAME', 'name'), ('COMPARISON', '!='), ('STRING', 'New York'), ('RPAREN', ')'),
+            ('OR', '||'), ('NAME', 'score'), ('COMPARISON', '<'), ('NUMBER', -1.5), ('ERROR', ';'),
+        ])
+        self.assertEqual([token.pos for token in tokens[:3]], [0, 1, 5])
+        self.assertEqual([(token.kind, token.value) for token in scan("a > -5 - 30abc")], [
+            ('NAME', 'a'), ('COMPARISON', '>'), ('NUMBER', -5), ('ERROR', '-'), ('NAME', '30abc'),
+        ])
+
+    def test_parse_rule_matches_parser(self):
+        rule = "((age > 30 AND department = 'Sales') OR (age < 25 AND department = 'Marketing')) AND (salary > 50000 OR experience > 5)"
+
+        def describe(node):
+            if node.node_type == 'operand':
+                return (node.value.lvariable, node.value.comparison_type, node.value.rvalue)
+            return (type(node.value).__name__, describe(node.left), describe(node.right))
+
+        self.assertEqual(describe(parse_rule(rule)), describe(Parser(tokenize(rule)).parse()))
+        self.assertEqual(describe(parse_rule("a = ''")), ("a", "eq", ""))
+        self.assertEqual(describe(parse_rule("((a > 1))")), ("a", "gt", 1))
+        self.assertEqual(describe(parse_rule("a >= 1")), ("a", "ge", 1))
+        self.assertEqual(describe(parse_rule("a != 'x'")), ("a", "ne", "x"))
+        self.assertEqual(describe(parse_rule("a IN (1, 'x', 1)")), ("a", "in", frozenset({1, "x"})))
+        self.assertEqual(describe(parse_rule("a NOT IN (2)")), ("a", "not_in", frozenset({2})))
+        self.assertEqual(describe(parse_rule("a BETWEEN 1 AND 5 OR b = 2")),
+                         ("OROperator", ("a", "between", (1, 5)), ("b", "eq", 2)))
+
+    def test_rich_operators(self):
+        rule = "NOT (age BETWEEN 25 AND 30) AND department IN ('Sales', 'Marketing') AND salary >= 50000 AND ! level != 3"
+        ast = AST()
+        ast.create_rule(rule)
+        for data, expected in (
+            ({"age": 35, "department": "Sales", "salary": 50000, "level": 3}, True),
+            ({"age": 30, "department": "Sales", "salary": 50000, "level": 3}, False),
+            ({"age": 35, "department": "HR", "salary": 50000, "level": 3}, False),
+            ({"age": 35, "department": "Marketing", "salary": 49999, "level": 3}, False),
+            ({"age": 35, "department": "Marketing", "salary": 60000, "level": 4}, False),
+        ):
+            self.assertEqual(ast.evaluate_rule(data), expected)
+            self.assertEqual(AST(ast.root).compile()(data), expected)
+        self.assertTrue(AST(parse_rule("tags NOT IN ('a')")).evaluate_rule({"tags": ["a"]}))
+
+    def test_parse_rule_errors(self):
+        for rule, position in (("age >", 5), ("(age > 30", 9), ("age > 30)", 8), ("age 30", 4), ("AND > 1", 0), ("a > 1 b", 6),
+                               ("a IN ()", 6), ("a IN (1 2)", 8), ("a BETWEEN 1 OR 2", 12), ("IN = 1", 0), ("a ! 1", 2)):
+            with self.assertRaises(ValueError) as context:
+                parse_rule(rule)
+            self.assertIn(f"position {position}", str(context.exception))
+        with self.assertRaises(ValueError):
+            parse_rule("  ")
+
+    def test_parse_rule_cache(self):
+        rule = "age > 30 AND salary > 50000 AND department = 'Sales'"
+        self.assertIs(parse_rule(rule), parse_rule(rule))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from rule_engine.ast_utils import Node, AST, Condition, ANDOperator, OROperator
+from rule_engine.ruleset_utils import RuleSet
+
+def and_rule(left, right):
+    return AST(Node("operator", left=Node("operand", value=left), right=Node("operand", value=right), value=ANDOperator()))
+
+def or_rule(left, right):
+    return AST(Node("operator", left=Node("operand", value=left), right=Node("operand", value=right), value=OROperator()))
+
+class TestRuleSet(unittest.TestCase):
+    def setUp(self):
+        self.rule_set = RuleSet.from_rules([
+            (1, and_rule(Condition("age", 30, 'gt'), Condition("department", "Sales", 'eq'))),
+            (2, and_rule(Condition("age", 30, 'gt'), Condition("salary", 50000, 'gt'))),
+            (3, or_rule(Condition("age", 25, 'lt'), Condition("department", "Sales", 'eq'))),
+        ])
+
+    def test_shared_predicates(self):
+        self.assertEqual(len(self.rule_set.predicates), 4)
+
+    def test_match(self):
+        self.assertEqual(self.rule_set.match({"age": 35, "department": "Sales", "salary": 60000}), [1, 2, 3])
+        self.assertEqual(self.rule_set.match({"age": 35, "department": "HR", "salary": 60000}), [2])
+        self.assertEqual(self.rule_set.match({"age": 20, "department": "HR", "salary": 60000}), [3])
+
+    def test_missing_field_does_not_match(self):
+        self.assertEqual(self.rule_set.match({"age": 35, "department": "Sales"}), [1, 3])
+
+    def test_literal_type_is_part_of_key(self):
+        rule_set = RuleSet.from_rules([
+            (1, AST(Node("operand", value=Condition("flag", 1, 'eq')))),
+            (2, AST(Node("operand", value=Condition("flag", True, 'eq')))),
+        ])
+        self.assertEqual(len(rule_set.predicates), 2)
+
+    def test_remove_and_replace_rule(self):
+        self.assertTrue(self.rule_set.remove_rule(1))
+        self.assertFalse(self.rule_set.remove_rule(1))
+        self.assertNotIn(1, self.rule_set)
+        self.assertEqual(self.rule_set.match({"age": 35, "department": "Sales", "salary": 60000}), [2, 3])
+
+        self.rule_set.add_rule(2, AST(Node("operand", value=Condition("age", 50, 'gt'))))
+        self.assertEqual(len(self.rule_set), 2)
+        self.assertEqual(self.rule_set.match({"age": 35, "department": "HR", "salary": 60000}), [])
+        self.assertEqual(self.rule_set.match({"age": 55, "department": "HR", "salary": 60000}), [2])
+
+    def test_replace_rule_in_place(self):
+        slots = dict(self.rule_set._predicate_slots)
+        age_slot = slots[("age", "gt", "int", 30)]
+        removed = []
+        self.rule_set._predicate_removed = removed.append
+        self.rule_set.add_rule(1, and_rule(Condition("age", 30, 'gt'), Condition("department", "HR", 'eq')))
+
+        self.assertEqual(self.rule_set._predicate_slots[("age", "gt", "int", 30)], age_slot)
+        self.assertEqual(removed, [])
+        self.assertEqual(len(self.rule_set), 3)
+        self.assertEqual(self.rule_set.match({"age": 35, "department": "HR", "salary": 60000}), [1, 2])
+
+        self.rule_set.add_rule(3, and_rule(Condition("age", 30, 'gt'), Condition("salary", 50000, 'gt')))
+        # Only the conditions no rule uses any more are removed.
+        self.assertEqual(sorted(removed), sorted([
+            slots[("age", "lt", "int", 25)], slots[("department", "eq", "str", "Sales")]
+        ]))
+        self.assertEqual(self.rule_set.match({"age": 35, "department": "HR", "salary": 60000}), [1, 2, 3])
+
+    def test_predicate_evaluated_once(self):
+        rule_set = RuleSet()
+        for rule_id in range(100):
+            rule_set.add_rule(rule_id, and_rule(Condition("age", 30, 'gt'), Condition("rule", rule_id, 'eq')))
+        self.assertEqual(len(rule_set.predicates), 101)
+
+        calls = []
+        predicate = rule_set._predicate_fns[0]
+        rule_set._predicate_fns[0] = lambda data: calls.append(1) or predicate(data)
+        for rule_id in range(100):
+            rule_set.add_rule(rule_id, and_rule(Condition("age", 30, 'gt'), Condition("rule", rule_id, 'eq')))
+        self.assertEqual(rule_set.match({"age": 35, "rule": 7}), [7])
+        self.assertEqual(len(calls), 1)
+
+if __name__ == '__main__':
+    unittest.main()
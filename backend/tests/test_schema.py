@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+import unittest
+from rule_engine.ast_utils import AST, Node, Condition, ANDOperator, OROperator
+from rule_engine.schema_utils import Schema
+
+def condition(field, value, comparison_type):
+    return Node("operand", value=Condition(field, value, comparison_type))
+
+class TestSchema(unittest.TestCase):
+    def setUp(self):
+        self.schema = Schema({"age": "int", "salary": "float", "department": "str", "active": "bool"})
+
+    def test_convert(self):
+        self.assertEqual(self.schema.convert("age", "35"), 35)
+        self.assertEqual(self.schema.convert("age", 35.0), 35)
+        self.assertEqual(self.schema.convert("salary", "1e3"), 1000.0)
+        self.assertEqual(self.schema.convert("department", 7), "7")
+        self.assertIs(self.schema.convert("active", "yes"), True)
+        self.assertIsNone(self.schema.convert("age", None))
+        for field, value in (("age", "abc"), ("age", 35.5), ("age", True), ("active", "maybe"), ("unknown", 1)):
+            with self.assertRaises(ValueError):
+                self.schema.convert(field, value)
+
+    def test_unknown_type(self):
+        with self.assertRaises(ValueError):
+            Schema({"age": "decimal"})
+
+    def test_coerce_literals(self):
+        shared = condition("age", "30", "gt")
+        root = Node(
+            "operator",
+            left=Node("operator", left=shared, right=condition("department", "Sales", "eq"), value=ANDOperator()),
+            right=shared,
+            value=OROperator()
+        )
+        coerced = self.schema.coerce_literals(root)
+        self.assertEqual(coerced.right.value.rvalue, 30)
+        self.assertIs(coerced.left.left, coerced.right)
+        # The input tree is left as it was.
+        self.assertEqual(shared.value.rvalue, "30")
+
+    def test_invalid_rules(self):
+        for root in (condition("salaryy", 1, "gt"), condition("age", "thirty", "eq"),
+                     condition("active", True, "gt")):
+            with self.assertRaises(ValueError):
+                self.schema.validate(root)
+        self.schema.validate(condition("active", "true", "eq"))
+
+    def test_coerce_record(self):
+        data = {"age": 35, "department": "Sales", "extra": "x"}
+        self.assertIs(self.schema.coerce_record(data), data)
+
+        data = {"age": "35", "salary": 10}
+        coerced = self.schema.coerce_record(data)
+        self.assertEqual(coerced, {"age": 35, "salary": 10.0})
+        self.assertEqual(data["age"], "35")
+
+        with self.assertRaises(ValueError):
+            self.schema.coerce_record({"age": "old"})
+
+    def test_coerce_sets_and_ranges(self):
+        root = Node("operator", left=condition("age", frozenset({"30", 40}), "in"),
+                    right=condition("salary", ("1", 2.5), "between"), value=ANDOperator())
+        coerced = self.schema.coerce_literals(root)
+        self.assertEqual(coerced.left.value.rvalue, frozenset({30, 40}))
+        self.assertEqual(coerced.right.value.rvalue, (1.0, 2.5))
+        with self.assertRaises(ValueError):
+            self.schema.validate(condition("active", (False, True), "between"))
+
+    def test_bind(self):
+        ast = AST(self.schema.coerce_literals(condition("age", "30", "gt")))
+        evaluate = self.schema.bind(ast.compile())
+        self.assertTrue(evaluate({"age": "35"}))
+        self.assertFalse(evaluate({"age": "25"}))
+        # Compared as numbers, not as strings.
+        self.assertTrue(evaluate({"age": "100"}))
+
+    def test_from_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "schema.json")
+            with open(path, "w", encoding="utf-8") as schema_file:
+                json.dump({"age": "int"}, schema_file)
+            self.assertEqual(Schema.from_file(path).to_dict(), {"age": "int"})
+
+if __name__ == "__main__":
+    unittest.main()
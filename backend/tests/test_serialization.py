@@ -0,0 +1,89 @@
+import unittest
+import json
+from rule_engine.ast_utils import Node, Condition, ANDOperator, OROperator, NOTOperator, combine_nodes
+from rule_engine.parser_utils import tokenize, parse_rule, Parser
+from rule_engine.serialization_utils import (root_to_bytes, bytes_to_root, root_to_json, json_to_root, dict_to_root,
+                                             json_to_literal)
+
+def describe(node):
+    if node is None:
+        return None
+    if node.node_type == 'operand':
+        condition = node.value
+        return (condition.lvariable, condition.comparison_type, type(condition.rvalue), condition.rvalue)
+    return (type(node.value).__name__, describe(node.left), describe(node.right))
+
+class TestBinarySerialization(unittest.TestCase):
+    def test_round_trip(self):
+        rule = "((age > 30 AND department = 'Sales') OR (age < 25 AND department = 'Marketing')) AND (salary > 50000 OR experience > 5)"
+        root = Parser(tokenize(rule)).parse()
+        self.assertEqual(describe(bytes_to_root(root_to_bytes(root))), describe(root))
+
+    def test_literals(self):
+        literals = [0, -1, 2 ** 70, -(2 ** 70), 1.5, float('-inf'), "", "Sålés", True, False, None]
+        root = combine_nodes([Node("operand", value=Condition("f", value, 'eq')) for value in literals], OROperator)
+        decoded = bytes_to_root(root_to_bytes(root))
+        self.assertEqual(describe(decoded), describe(root))
+
+    def test_rich_operators(self):
+        root = parse_rule("NOT (age BETWEEN 20 AND 30.5) AND department IN ('Sales', 'HR', 3) OR level NOT IN (1) OR x != 2")
+        self.assertEqual(describe(bytes_to_root(root_to_bytes(root))), describe(root))
+        department = json.loads(root_to_json(root))["left"]["left"]["right"]["value"]
+        self.assertEqual(department["rvalue"], [3, "HR", "Sales"])
+        self.assertEqual(json_to_literal("in", department["rvalue"]), frozenset({"Sales", "HR", 3}))
+        self.assertEqual(json_to_literal("between", [20, 30.5]), (20, 30.5))
+        # Sets are encoded in a stable order.
+        self.assertEqual(root_to_bytes(root), root_to_bytes(parse_rule.__wrapped__(
+            "NOT (age BETWEEN 20 AND 30.5) AND department IN (3, 'HR', 'Sales') OR level NOT IN (1) OR x != 2"
+        )))
+
+    def test_symbols_normalized(self):
+        # Rules stored before comparison symbols were normalized.
+        root = Node("operand", value=Condition("age", 30, '>='))
+        self.assertEqual(bytes_to_root(root_to_bytes(root)).value.comparison_type, 'ge')
+
+    def test_empty_tree(self):
+        self.assertIsNone(bytes_to_root(root_to_bytes(None)))
+
+    def test_deep_tree(self):
+        root = Node("operand", value=Condition("age", 0, 'gt'))
+        for i in range(1, 50000):
+            root = Node("operator", left=root, right=Node("operand", value=Condition("age", i, 'gt')), value=ANDOperator())
+        decoded = bytes_to_root(root_to_bytes(root))
+        self.assertEqual(decoded.right.value.rvalue, 49999)
+        self.assertIsInstance(decoded.value, ANDOperator)
+
+    def test_deep_tree_json(self):
+        root = Node("operand", value=Condition("age", 0, 'gt'))
+        for i in range(1, 5000):
+            condition = Node("operand", value=Condition("tags", frozenset({i, "x"}), 'in'))
+            root = Node("operator", left=root, right=condition, value=OROperator() if i % 2 else ANDOperator())
+            if i % 100 == 0:
+                root = Node("operator", left=root, value=NOTOperator())
+        text = root_to_json(root)
+        self.assertEqual(root_to_json(json_to_root(text)), text)
+        self.assertEqual(root_to_bytes(json_to_root(text)), root_to_bytes(root))
+        self.assertEqual(json_to_root(text).right.value.rvalue, frozenset({4999, "x"}))
+
+        small = parse_rule("NOT (age BETWEEN 20 AND 30) AND department IN ('Sales', 'HR') OR x != 2")
+        self.assertEqual(root_to_json(small), json.dumps(json.loads(root_to_json(small))))
+        self.assertEqual(describe(json_to_root(root_to_json(small))), describe(small))
+        self.assertEqual(describe(dict_to_root(json.loads(root_to_json(small)))), describe(small))
+        self.assertIsNone(dict_to_root(None))
+
+        for text in ('[' * 5000, '[' * 5000 + ']' * 4999, '[' * 2500 + '1,' + ']' * 2500):
+            with self.assertRaises(ValueError):
+                json_to_root(text)
+
+    def test_field_names_interned(self):
+        root = combine_nodes([Node("operand", value=Condition("department", i, 'eq')) for i in range(100)], OROperator)
+        self.assertEqual(root_to_bytes(root).count(b"department"), 1)
+
+    def test_invalid_data(self):
+        encoded = root_to_bytes(Node("operand", value=Condition("age", 30, 'gt')))
+        for data in (b"", b"JSON{}", encoded[:-1], encoded[:4] + b"\x09" + encoded[5:], encoded + b"\x00"):
+            with self.assertRaises(ValueError):
+                bytes_to_root(data)
+
+if __name__ == '__main__':
+    unittest.main()
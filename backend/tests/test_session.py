@@ -0,0 +1,98 @@
+import random
+import unittest
+from rule_engine.ast_utils import AST, Node, Condition, ANDOperator, OROperator, NOTOperator
+from rule_engine.parser_utils import parse_rule
+from rule_engine.ruleset_utils import RuleSet
+from rule_engine.schema_utils import Schema
+from rule_engine.session_utils import EvaluationSession, MatchEvent
+
+RULES = {
+    "seniors": "age > 30 AND salary > 50000",
+    "sales": "department = 'Sales' OR department = 'Marketing'",
+    "not_hr": "NOT (department = 'HR')",
+}
+
+def random_tree(rng, depth):
+    if depth == 0 or rng.random() < 0.3:
+        field = rng.choice("abcd")
+        comparison_type = rng.choice(("gt", "lt", "eq", "ne", "in"))
+        value = frozenset(rng.sample(range(5), 2)) if comparison_type == "in" else rng.randrange(5)
+        return Node("operand", value=Condition(field, value, comparison_type))
+    choice = rng.random()
+    if choice < 0.2:
+        return Node("operator", left=random_tree(rng, depth - 1), value=NOTOperator())
+    return Node("operator", left=random_tree(rng, depth - 1), right=random_tree(rng, depth - 1),
+                value=ANDOperator() if choice < 0.6 else OROperator())
+
+class TestEvaluationSession(unittest.TestCase):
+    def setUp(self):
+        self.session = EvaluationSession((rule_id, AST(parse_rule(rule))) for rule_id, rule in RULES.items())
+
+    def test_events(self):
+        session = self.session
+        self.assertEqual(session.update(1, {"age": 40, "salary": 40000, "department": "Sales"}), [
+            MatchEvent(1, "sales", True), MatchEvent(1, "not_hr", True),
+        ])
+        self.assertEqual(session.update(1, {"salary": 60000}), [MatchEvent(1, "seniors", True)])
+        # Unchanged values and unreferenced fields do not emit anything.
+        self.assertEqual(session.update(1, {"salary": 60000, "city": "Paris"}), [])
+        self.assertEqual(session.update(1, {"department": "Marketing"}), [])
+        self.assertEqual(session.update(1, {"department": "HR", "age": 20}), [
+            MatchEvent(1, "sales", False), MatchEvent(1, "not_hr", False), MatchEvent(1, "seniors", False),
+        ])
+        self.assertEqual(session.matches(1), [])
+        self.assertEqual(session.record(1), {"age": 20, "salary": 60000, "department": "HR", "city": "Paris"})
+
+    def test_missing_fields(self):
+        session = self.session
+        self.assertEqual(session.update(2, {"age": 40}), [])
+        self.assertEqual(session.update(2, {"department": "IT"}), [MatchEvent(2, "not_hr", True)])
+        # A NOT over a missing field is false, as in RuleSet.
+        self.assertEqual(session.update(2, {}, removed=["department", "unknown"]), [MatchEvent(2, "not_hr", False)])
+        self.assertEqual(session.update(2, {"department": "HR"}), [])
+        self.assertIsNone(session.record(3))
+        self.assertEqual(session.matches(3), [])
+
+    def test_rule_changes(self):
+        session = self.session
+        session.update(1, {"age": 40, "salary": 60000, "department": "HR"})
+        session.update(2, {"age": 20, "salary": 60000, "department": "Sales"})
+        self.assertEqual(session.add_rule("seniors", AST(parse_rule("age > 18"))), [MatchEvent(2, "seniors", True)])
+        self.assertEqual(session.add_rule("all", AST()), [MatchEvent(1, "all", True), MatchEvent(2, "all", True)])
+        self.assertEqual(session.update(3, {}), [MatchEvent(3, "all", True)])
+        self.assertEqual(session.remove_rule("sales"), [MatchEvent(2, "sales", False)])
+        self.assertEqual(session.remove_rule("sales"), [])
+        self.assertEqual(session.update(2, {"department": "Marketing"}), [])
+        self.assertEqual(session.remove_entity(1), [MatchEvent(1, "seniors", False), MatchEvent(1, "all", False)])
+        self.assertEqual(session.remove_entity(1), [])
+
+    def test_coerce(self):
+        session = EvaluationSession([("seniors", AST(parse_rule(RULES["seniors"])))],
+                                    coerce=Schema({"age": "int", "salary": "int"}).coerce_record)
+        self.assertEqual(session.update(1, {"age": "40", "salary": "60000"}), [MatchEvent(1, "seniors", True)])
+        self.assertEqual(session.update(1, {"age": 40}), [])
+
+    def test_random_updates_match_ruleset(self):
+        rng = random.Random(7)
+        for _ in range(50):
+            rules = [(rule_id, AST(random_tree(rng, 4))) for rule_id in range(5)]
+            rule_set = RuleSet.from_rules(rules)
+            session = EvaluationSession(rules)
+            records = {}
+            matched = {}
+            for _ in range(30):
+                entity_id = rng.randrange(3)
+                record = records.setdefault(entity_id, {})
+                changes = {field: rng.randrange(5) for field in rng.sample("abcd", rng.randrange(3))}
+                removed = [field for field in "abcd" if rng.random() < 0.1]
+                record.update(changes)
+                for field in removed:
+                    record.pop(field, None)
+                current = matched.setdefault(entity_id, set())
+                for event in session.update(entity_id, changes, removed):
+                    (current.add if event.matched else current.remove)(event.rule_id)
+                self.assertEqual(current, set(rule_set.match(record)))
+                self.assertEqual(sorted(session.matches(entity_id)), sorted(current))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from rule_engine.ast_utils import AST
+from rule_engine.parser_utils import parse_rule
+from rule_engine.serialization_utils import root_to_json
+from rule_engine.snapshot_utils import MappedAST, RuleSnapshot, write_snapshot
+
+RULES = [
+    "age > 30 AND (department = 'Sales' OR salary BETWEEN 40000 AND 60000)",
+    "NOT (department IN ('HR', 'IT', 1, 2.5, TRUE))",
+    "experience >= 5 OR name != 'Bob'",
+]
+
+RECORDS = [
+    {"age": 35, "department": "Sales", "salary": 10000, "experience": 1, "name": "Bob"},
+    {"age": 25, "department": "HR", "salary": 50000, "experience": 7, "name": "Alice"},
+    {"age": 45, "department": "Marketing", "salary": 45000, "experience": 2, "name": "Bob"},
+]
+
+class TestRuleSnapshot(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "rules.snapshot")
+        self.rules = [(rule_id, 1, parse_rule(rule)) for rule_id, rule in zip((3, 7, 40), RULES)]
+
+    def test_round_trip(self):
+        self.assertEqual(write_snapshot(self.path, self.rules + [(41, 2, None)]), 1)
+        snapshot = RuleSnapshot.open(self.path)
+        self.addCleanup(snapshot.close)
+        self.assertEqual((snapshot.version, len(snapshot)), (1, 4))
+        for rule_id, version, root in self.rules:
+            tree, rule_version = snapshot.get(rule_id)
+            self.assertEqual(rule_version, version)
+            ast = MappedAST(tree)
+            self.assertEqual([ast.evaluate_rule(data) for data in RECORDS],
+                             [AST(root).evaluate_rule(data) for data in RECORDS])
+            self.assertEqual(root_to_json(ast.root), root_to_json(root))
+        # An empty rule matches everything.
+        self.assertTrue(MappedAST(snapshot.get(41)[0]).evaluate_rule({}))
+        self.assertIsNone(snapshot.get(4))
+        self.assertNotIn(100, snapshot)
+
+    def test_discard(self):
+        write_snapshot(self.path, self.rules)
+        snapshot = RuleSnapshot.open(self.path)
+        self.addCleanup(snapshot.close)
+        snapshot.discard(3)
+        snapshot.discard(5)
+        self.assertIsNone(snapshot.get(3))
+        self.assertEqual(len(snapshot), 2)
+        # Rule 7 was updated and rule 40 deleted since the snapshot.
+        self.assertEqual(snapshot.discard_stale({3: 1, 7: 2}), 2)
+        self.assertEqual(len(snapshot), 0)
+        self.assertIsNone(snapshot.version_of(7))
+
+    def test_replace(self):
+        write_snapshot(self.path, self.rules)
+        previous = RuleSnapshot.open(self.path)
+        self.addCleanup(previous.close)
+        tree = previous.get(3)[0]
+        self.assertEqual(write_snapshot(self.path, self.rules[:1]), 2)
+        self.assertEqual(write_snapshot(self.path, self.rules[:1], version=10), 10)
+        # The previous snapshot stays readable once replaced.
+        self.assertEqual(len(previous), 3)
+        self.assertTrue(tree.evaluate(RECORDS[0]))
+        snapshot = RuleSnapshot.open(self.path)
+        self.addCleanup(snapshot.close)
+        self.assertEqual((snapshot.version, len(snapshot)), (10, 1))
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["rules.snapshot"])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            write_snapshot(self.path, self.rules[::-1])
+        self.assertFalse(os.listdir(os.path.dirname(self.path)))
+        with open(self.path, "wb") as snapshot:
+            snapshot.write(b"RAST" + bytes(40))
+        with self.assertRaises(ValueError):
+            RuleSnapshot.open(self.path)
+        open(self.path, "wb").close()
+        with self.assertRaises(ValueError):
+            RuleSnapshot.open(self.path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import io
+import unittest
+from rule_engine.ast_utils import AST, Node, Condition
+from rule_engine.stream_utils import (RecordWriter, coerce_csv_record, detect_format,
+                                      evaluate_stream, read_records)
+
+def condition(field, value, comparison_type):
+    return AST(Node("operand", value=Condition(field, value, comparison_type)))
+
+RULES = [(1, condition("age", 30, "gt")), (2, condition("name", "b", "eq"))]
+
+class TestStreamEvaluation(unittest.TestCase):
+    def test_read_records(self):
+        ndjson = io.StringIO('{"age": 40}\n\n{"age": 20}\n')
+        self.assertEqual(list(read_records(ndjson, "ndjson")), [{"age": 40}, {"age": 20}])
+        csv_input = io.StringIO("age,name\n40,a\n")
+        self.assertEqual(list(read_records(csv_input, "csv")), [{"age": "40", "name": "a"}])
+        with self.assertRaisesRegex(ValueError, "^Line 2: "):
+            list(read_records(io.StringIO('{}\n{\n'), "ndjson"))
+        self.assertEqual(detect_format("input.CSV"), "csv")
+        self.assertEqual(detect_format("-"), "ndjson")
+
+    def test_coerce_csv_record(self):
+        record = {"age": "40", "rate": "-1.5", "name": "a1", "code": "", "id": "12ab"}
+        self.assertEqual(
+            coerce_csv_record(record),
+            {"age": 40, "rate": -1.5, "name": "a1", "code": "", "id": "12ab"}
+        )
+
+    def test_evaluate_stream(self):
+        records = ({"age": age, "name": name} for age, name in ((40, "a"), (20, "b"), (10, "c")))
+        results = list(evaluate_stream(records, RULES, chunk_size=2))
+        self.assertEqual([matched for _, matched in results], [[1], [2], []])
+
+        csv_records = [{"age": "40"}, {"age": "9"}]
+        results = list(evaluate_stream(csv_records, RULES, coerce=coerce_csv_record))
+        self.assertEqual(results, [({"age": "40"}, [1]), ({"age": "9"}, [])])
+
+    def test_evaluate_stream_workers(self):
+        records = [{"age": age, "name": "b"} for age in range(25, 35)]
+        expected = list(evaluate_stream(records, RULES))
+        self.assertEqual(list(evaluate_stream(records, RULES, chunk_size=3, workers=2)), expected)
+
+    def test_writer(self):
+        output = io.StringIO()
+        writer = RecordWriter(output, "csv", "column", [1, 2])
+        writer.write({"age": "40", "name": "a"}, [1])
+        writer.write({"age": "20", "name": "b"}, [2])
+        self.assertEqual(
+            output.getvalue().splitlines(),
+            ["age,name,rule_1,rule_2", "40,a,True,False", "20,b,False,True"]
+        )
+
+        output = io.StringIO()
+        writer = RecordWriter(output, "ndjson", "filter", [1, 2])
+        writer.write({"age": 40}, [1])
+        writer.write({"age": 20}, [])
+        self.assertEqual(output.getvalue(), '{"age": 40}\n')
+
+        with self.assertRaises(ValueError):
+            RecordWriter(output, "xml", "filter", [1])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
-from rule_engine.ast_utils import Node, AST, Condition, ANDOperator, OROperator
+from rule_engine.ast_utils import Node, AST, Condition, ANDOperator, OROperator, NOTOperator, combine_nodes
+from rule_engine.ruleset_utils import RuleSet
 
 class TestRuleEngine(unittest.TestCase):
     def test_condition_evaluate(self):
@@ -11,6 +12,13 @@ class TestRuleEngine(unittest.TestCase):
         self.assertTrue(condition_eq.evaluate("Sales"))
         self.assertFalse(condition_eq.evaluate("Marketing"))
 
+    def test_compact_objects(self):
+        self.assertIs(ANDOperator(), ANDOperator())
+        self.assertIsNot(ANDOperator(), OROperator())
+        node = Node("operand", value=Condition("age", 30, 'gt'))
+        for obj in (node, node.value, ANDOperator()):
+            self.assertFalse(hasattr(obj, "__dict__"))
+
     def test_and_operator(self):
         left_condition = Condition("age", 30, 'gt')
         right_condition = Condition("salary", 50000, 'gt')
@@ -72,5 +80,100 @@ class TestRuleEngine(unittest.TestCase):
         json_data = {"age": 40, "department": "HR", "salary": 40000, "experience": 4}
         self.assertFalse(ast.evaluate_rule(json_data))
 
+    def test_ast_compile(self):
+        age_condition = Condition("age", 30, 'gt')
+        department_condition = Condition("department", "Sales", 'eq')
+        and_node = Node("operator", left=Node("operand", value=age_condition), right=Node("operand", value=department_condition), value=ANDOperator())
+        salary_condition = Condition("salary", 50000, 'lt')
+        root = Node("operator", left=and_node, right=Node("operand", value=salary_condition), value=OROperator())
+
+        ast = AST(root)
+        compiled = ast.compile()
+
+        records = [
+            {"age": 35, "department": "Sales", "salary": 60000},
+            {"age": 25, "department": "Sales", "salary": 60000},
+            {"age": 25, "department": "HR", "salary": 40000},
+            {"age": 40, "department": "HR", "salary": 70000},
+        ]
+        for data in records:
+            self.assertEqual(compiled(data), ast.evaluate_rule(data))
+
+        self.assertTrue(AST().compile()({}))
+        self.assertFalse(AST(Node("operand", value=Condition("age", 30, '>'))).compile()({"age": 35}))
+        with self.assertRaises(KeyError):
+            compiled({"department": "Sales"})
+
+    def test_deep_tree(self):
+        # age > 0 AND age > 1 ... AND age > 4999, the deepest condition first.
+        root = Node("operand", value=Condition("age", 0, 'gt'))
+        for i in range(1, 5000):
+            root = Node("operator", left=root, right=Node("operand", value=Condition("age", i, 'gt')), value=ANDOperator())
+        negated = Node("operator", left=root, value=NOTOperator())
+        for _ in range(5000):
+            negated = Node("operator", left=Node("operator", left=negated, value=NOTOperator()), value=NOTOperator())
+        either = Node("operator", left=negated, right=Node("operand", value=Condition("vip", True, 'eq')), value=OROperator())
+
+        rule_set = RuleSet()
+        rule_set.add_rule("all", AST(root))
+        rule_set.add_rule("either", AST(either))
+        for data, expected in (({"age": 5000}, True), ({"age": 4999, "vip": False}, False), ({"age": 0}, False)):
+            self.assertEqual(AST(root).evaluate_rule(data), expected)
+            self.assertEqual(AST(root).compile()(data), expected)
+            self.assertEqual(root.evaluate(data), expected)
+            self.assertEqual(AST(either).evaluate_rule(dict(data, vip=True)), True)
+            self.assertEqual(rule_set.match(data), ["all"] if expected else ["either"])
+        with self.assertRaises(KeyError):
+            AST(root).evaluate_rule({})
+
+        # f0 = 0 OR f1 = 1 ... OR f4999 = 4999, only f0 is evaluated.
+        chain = Node("operand", value=Condition("f0", 0, 'eq'))
+        for i in range(1, 5000):
+            chain = Node("operator", left=chain, right=Node("operand", value=Condition(f"f{i}", i, 'eq')), value=OROperator())
+        self.assertTrue(AST(chain).evaluate_rule({"f0": 0}))
+        self.assertTrue(AST(chain).compile()({"f0": 0}))
+        with self.assertRaises(KeyError):
+            AST(chain).evaluate_rule({"f0": 1})
+
+    def test_ast_evaluate_many(self):
+        ast = AST(Node("operand", value=Condition("age", 30, 'gt')))
+        records = [{"age": 35}, {"age": 25}, {"age": 31}]
+        self.assertEqual(ast.evaluate_many(records), [True, False, True])
+        self.assertIsNotNone(ast.compiled)
+        self.assertEqual(ast.evaluate_many([]), [])
+
+    def test_combine_nodes_balanced(self):
+        def depth(node):
+            if node.node_type == 'operand':
+                return 1
+            return 1 + max(depth(node.left), depth(node.right))
+
+        def leaves(node):
+            if node.node_type == 'operand':
+                return [node.value.rvalue]
+            return leaves(node.left) + leaves(node.right)
+
+        chain = Node("operand", value=Condition("age", 0, 'gt'))
+        for i in range(1, 5000):
+            chain = Node("operator", left=chain, right=Node("operand", value=Condition("age", i, 'gt')), value=ANDOperator())
+        nodes = [chain] + [Node("operand", value=Condition("age", i, 'gt')) for i in range(5000, 20000)]
+
+        root = combine_nodes(nodes, ANDOperator)
+        self.assertEqual(depth(root), 16)
+        self.assertEqual(leaves(root), list(range(20000)))
+        self.assertFalse(AST(root).evaluate_rule({"age": 10000}))
+        self.assertTrue(AST(root).evaluate_rule({"age": 20000}))
+
+        or_root = combine_nodes([root, Node("operand", value=Condition("salary", 1, 'gt'))], OROperator)
+        self.assertIs(or_root.left, root)
+        self.assertIsNone(combine_nodes([]))
+
+    def test_ast_combine_rules(self):
+        ast = AST()
+        ast.combine_rules(["age > 30 AND salary > 10", "department = 'Sales'", "experience > 5"])
+        self.assertIsInstance(ast.root.value, ANDOperator)
+        self.assertIsInstance(ast.root.left.value, ANDOperator)
+        self.assertIsInstance(ast.root.right.value, ANDOperator)
+
 if __name__ == '__main__':
     unittest.main()